@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
+import base_agent
 import parser
+import parse_cache
+import regex_registry
 import chrome_convert_agents
 import webview_convert_agents
 import instrumentation_convert_agents
@@ -9,8 +12,12 @@ import content_convert_agents
 
 import logging
 import argparse
+import collections
+import multiprocessing
 import os
+import StringIO
 import sys
+import traceback
 
 _TEST_AGENT_DICT = {
     "chrome-base-test-case": chrome_convert_agents.ChromeActivityBaseCaseAgent,
@@ -49,30 +56,150 @@ _AGENT_DICT.update({"base-class": test_base_convert_agent.BaseCaseAgent})
 
 def ConvertDirectory(directory, java_parser, agent_strings,
                      save_as_new=False, logging_level=logging.WARNING,
-                     use_base_class=False):
-  agent = None
-  for (dirpath, _, filenames) in os.walk(directory):
-    for filename in filenames:
-      whole_path = os.path.join(dirpath, filename)
+                     use_base_class=False, jobs=1):
+  paths = [os.path.join(dirpath, filename)
+           for (dirpath, _, filenames) in os.walk(directory)
+           for filename in filenames]
+  if jobs > 1:
+    results = _ConvertFilesInPool(paths, agent_strings, save_as_new,
+                                  logging_level, use_base_class, jobs)
+  else:
+    results = []
+    for whole_path in paths:
       agent = ConvertFile(
           java_parser, agent_strings, whole_path, save_as_new,
-          previous_agent=agent, logging_level=logging_level,
-          use_base_class=use_base_class)
+          logging_level=logging_level, use_base_class=use_base_class)
+      results.append(_AgentName(agent))
+  PrintSummary(paths, results)
+
+def _AgentName(agent):
+  if agent is None:
+    return None
+  return type(agent).__name__
+
+def PrintSummary(paths, results):
+  converted = collections.OrderedDict()
+  for name in results:
+    if name is not None:
+      converted[name] = converted.get(name, 0) + 1
+  print('Converted %d of %d files' % (sum(converted.values()), len(paths)))
+  for name, count in converted.items():
+    print('%40s: %d' % (name, count))
+  for line in parse_cache.Java8Report():
+    print(line)
+
+def PrintRegexStats():
+  print('Regex patterns by match time:')
+  for line in regex_registry.Report():
+    print(line)
+
+# Per-process state of the --jobs worker pool, set up by _InitWorker.
+_worker_state = {}
+
+def _InitWorker(agent_strings, save_as_new, logging_level, use_base_class,
+                regex_stats):
+  _worker_state.update({
+      'parser': CreateJavaParser(),
+      'agent_strings': agent_strings,
+      'save_as_new': save_as_new,
+      'logging_level': logging_level,
+      'use_base_class': use_base_class,
+      'regex_stats': regex_stats,
+  })
+
+def _ConvertFileInWorker(whole_path):
+  """Convert one file, returning its agent name, captured stdout/stderr,
+  regex stats and the files found to use Java 8 syntax"""
+  if _worker_state['regex_stats']:
+    regex_registry.EnableStats()
+  out, err = StringIO.StringIO(), StringIO.StringIO()
+  sys.stdout, sys.stderr = out, err
+  agent, error = None, None
+  try:
+    agent = ConvertFile(
+        _worker_state['parser'], _worker_state['agent_strings'], whole_path,
+        _worker_state['save_as_new'],
+        logging_level=_worker_state['logging_level'],
+        use_base_class=_worker_state['use_base_class'])
+  except Exception:
+    error = traceback.format_exc()
+  finally:
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+  return (_AgentName(agent), out.getvalue(), err.getvalue(), error,
+          regex_registry.Stats(), parse_cache.Java8Files())
+
+def _ConvertFilesInPool(paths, agent_strings, save_as_new, logging_level,
+                        use_base_class, jobs):
+  pool = multiprocessing.Pool(
+      jobs, initializer=_InitWorker,
+      initargs=(agent_strings, save_as_new, logging_level, use_base_class,
+                regex_registry.StatsEnabled()))
+  results = []
+  try:
+    # imap hands results back in submission order, so the output is replayed
+    # exactly as a serial run would have produced it.
+    for whole_path, (name, out, err, error, regex_stats, java8_files) in zip(
+        paths, pool.imap(_ConvertFileInWorker, paths)):
+      sys.stdout.write(out)
+      sys.stderr.write(err)
+      regex_registry.MergeStats(regex_stats)
+      parse_cache.MergeJava8Files(java8_files)
+      if error is not None:
+        raise Exception('Failed to convert %s:\n%s' % (whole_path, error))
+      results.append(name)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+  return results
+
+# Dispatch indexes keyed by the tuple of agent strings, see _AgentIndex.
+_agent_indexes = {}
+
+def _AgentIndex(agent_strings):
+  """Map super class names to agents, agents without any are fallbacks"""
+  key = tuple(agent_strings)
+  if key not in _agent_indexes:
+    by_super_class = {}
+    fallbacks = []
+    for agent_class in [_AGENT_DICT[i] for i in agent_strings]:
+      names = agent_class.super_class_names()
+      if not names:
+        fallbacks.append(agent_class)
+      for name in names:
+        by_super_class.setdefault(name, agent_class)
+    _agent_indexes[key] = (by_super_class, fallbacks)
+  return _agent_indexes[key]
 
 def ConvertFile(java_parser, agent_strings, whole_path, save_as_new,
-                previous_agent=None, logging_level=logging.WARNING,
-                use_base_class=False):
+                logging_level=logging.WARNING, use_base_class=False):
   logger = SetLogger(logging_level, whole_path)
-  agent = previous_agent
-  for agent_class in [_AGENT_DICT[i] for i in agent_strings if
-                      _AGENT_DICT[i].filename_match(whole_path)]:
-    agent = agent_class(java_parser, whole_path, logger=logger, agent=agent,
-                        save_as_new=save_as_new, use_base_class=use_base_class)
-    if agent._failed_to_parse:
-      continue
-    if use_base_class or not agent.skip():
-      agent.actions()
-      return agent
+  by_super_class, fallbacks = _AgentIndex(agent_strings)
+  candidates = [_AGENT_DICT[i] for i in agent_strings if
+                _AGENT_DICT[i].filename_match(whole_path)]
+  if candidates:
+    # Parse the headers once, then hand them to the one agent picked by the
+    # file's super class. Only files it does not skip are parsed in full.
+    loaded = base_agent.BaseAgent(java_parser, whole_path, logger=logger,
+                                  header_only=True)
+    if not loaded._failed_to_parse:
+      if use_base_class:
+        agent_class = candidates[0]
+      else:
+        agent_class = by_super_class.get(loaded.super_class_name)
+        if agent_class not in candidates:
+          agent_class = next((i for i in fallbacks if i in candidates), None)
+      if agent_class is not None:
+        agent = agent_class(java_parser, whole_path, logger=logger,
+                            agent=loaded, save_as_new=save_as_new,
+                            use_base_class=use_base_class)
+        if use_base_class or not agent.skip():
+          agent.LoadFull()
+          if not agent._failed_to_parse:
+            agent.actions()
+            return agent
   logger.error('Failed to match to any agent')
 
 def SetLogger(logging_level, filepath):
@@ -116,6 +243,18 @@ def main():
   argument_parser.add_argument(
       '-a', '--agent', help='Specify the agent for the current file',
       default='all')
+  argument_parser.add_argument(
+      '--no-parse-cache', default=False, action='store_true',
+      help='Parse every file again instead of using the on-disk parse cache')
+  argument_parser.add_argument(
+      '--parse-cache-dir', default=parse_cache.DEFAULT_CACHE_DIR,
+      help='Directory of the on-disk parse cache')
+  argument_parser.add_argument(
+      '-j', '--jobs', type=int, default=1,
+      help='Number of worker processes used to convert a directory')
+  argument_parser.add_argument(
+      '--regex-stats', default=False, action='store_true',
+      help='Print call counts and match time of the slowest regex patterns')
   arguments = argument_parser.parse_args(sys.argv[1:])
 
   logging_level = logging.INFO
@@ -136,6 +275,11 @@ def main():
     agents = _TEST_AGENT_DICT.keys()
   else:
     agents = [arguments.agent]
+  if not arguments.no_parse_cache:
+    parse_cache.SetDefaultCache(
+        parse_cache.ParseCache(arguments.parse_cache_dir))
+  if arguments.regex_stats:
+    regex_registry.EnableStats()
   java_parser = CreateJavaParser()
   if arguments.java_file:
     ConvertFile(java_parser, agents, arguments.java_file,
@@ -145,7 +289,9 @@ def main():
     ConvertDirectory(
         arguments.directory, java_parser, agents,
         save_as_new=arguments.save_as_new, logging_level=logging_level,
-        use_base_class=arguments.use_base_class)
+        use_base_class=arguments.use_base_class, jobs=arguments.jobs)
+  if arguments.regex_stats:
+    PrintRegexStats()
 
 if __name__ == '__main__':
   main()
@@ -2,11 +2,15 @@
 
 import model
 import parser
+import parse_cache
+import regex_registry
 
 
+import bisect
 import json
 import re
 import logging
+import operator
 import argparse
 import os
 import collections
@@ -14,74 +18,1024 @@ import sys
 
 import codecs
 
-_YEAR_PATTERN = re.compile(r'^(\/\/ Copyright) 2017')
+_YEAR_PATTERN = regex_registry.Register(r'^(\/\/ Copyright) 2017')
 
-_FLOAT_PATTERN = re.compile(r'^\d+?\.\d+f?$')
+_FLOAT_PATTERN = regex_registry.Register(r'^\d+?\.\d+f?$')
 
-def _ReturnReplacement(pattern_string, replacement, string, flags=0, upper=False):
-  pattern = re.compile(pattern_string, flags=flags)
-  res = pattern.findall(string)
-  if pattern_string == r'.*':
+_ALL_PATTERN = regex_registry.Register(r'.*', re.DOTALL)
+
+_FLOAT_TYPES = frozenset(['double', 'float', 'Double', 'Float'])
+
+# Chromium's import groups in order, as in
+# tools/android/eclipse/android.importorder. An import belongs to the group
+# with the longest matching prefix, static imports go on top.
+_IMPORT_GROUPS = ('android', 'com', 'dalvik', 'junit', 'org',
+                  'com.google.android.apps.chrome', 'org.chromium', 'java',
+                  'javax')
+
+_IMPORT_STATEMENT_PATTERN = regex_registry.Register(
+    r'\s*import\s+(static\s+)?[\w.]+(\s*\.\s*\*)?\s*;')
+
+def _WarnIfFoundMoreThanOnce(pattern, string):
+  res = regex_registry.FindAll(pattern, string)
+  if pattern.pattern == r'.*':
     res.remove('')
   if len(res) > 1:
     logging.warn('"%s" pattern is found more than once (%d) in "%s"' % (
-      pattern_string, len(res), string if len(string) < 100
+      pattern.pattern, len(res), string if len(string) < 100
       else string[:100]+'...'))
+
+
+def _ReturnReplacement(pattern_string, replacement, string, flags=0, upper=False):
+  pattern = regex_registry.Compile(pattern_string, flags)
+  _WarnIfFoundMoreThanOnce(pattern, string)
   if upper:
-    return pattern.sub(replacement, string, count=1).upper()
-  return pattern.sub(replacement, string, count=1)
+    return regex_registry.Sub(pattern, replacement, string, count=1).upper()
+  return regex_registry.Sub(pattern, replacement, string, count=1)
 
 
-def _TraverseTree(tree):
-  stack = [tree]
+class _BinaryIndexedTree(object):
+  """Fenwick tree over a fixed number of integer slots"""
+
+  def __init__(self, values):
+    size = len(values) + 1
+    tree = [0] + list(values)
+    if any(values):
+      for i in xrange(1, size):
+        parent = i + (i & -i)
+        if parent < size:
+          tree[parent] += tree[i]
+    self._tree = tree
+    self._mask = 1
+    while self._mask * 2 < size:
+      self._mask *= 2
+
+  def __len__(self):
+    return len(self._tree) - 1
+
+  def Add(self, index, delta):
+    if index < 0:
+      raise ValueError('Negative slot %d' % index)
+    i = index + 1
+    while i < len(self._tree):
+      self._tree[i] += delta
+      i += i & -i
+
+  def Sum(self, index):
+    """Return the sum of slots 0 to index, inclusive"""
+    i = min(index + 1, len(self._tree) - 1)
+    total = 0
+    while i > 0:
+      total += self._tree[i]
+      i -= i & -i
+    return total
+
+  def Find(self, value):
+    """Return the number of leading slots whose sum is <= value
+
+    Only valid while every slot is non-negative.
+    """
+    index, mask = 0, self._mask
+    while mask:
+      if index + mask < len(self._tree) and self._tree[index + mask] <= value:
+        index += mask
+        value -= self._tree[index]
+      mask //= 2
+    return index
+
+
+class _OffsetTable(object):
+  """Offsets keyed by original lexpos, backed by a binary indexed tree
+
+  Reads and writes behave like the defaultdict(int) this replaces, Sum(lex)
+  returns the total offset of every key <= lex in O(log n). Elements without
+  a position have lexpos -1, negative keys share slot 0 of the tree.
+  """
+
+  def __init__(self, size=0):
+    self._values = {}
+    self._tree = _BinaryIndexedTree([0] * (size + 1))
+    # Called with (lex, delta) whenever the offset at lex changes.
+    self.on_change = None
+
+  def __getitem__(self, lex):
+    return self._values.get(lex, 0)
+
+  def __setitem__(self, lex, value):
+    delta = value - self._values.get(lex, 0)
+    self._values[lex] = value
+    if lex >= len(self._tree):
+      values = [0] * max(lex + 1, 2 * len(self._tree))
+      for i, j in self._values.iteritems():
+        values[max(i, 0)] += j
+      self._tree = _BinaryIndexedTree(values)
+    elif delta:
+      self._tree.Add(max(lex, 0), delta)
+    if delta and self.on_change is not None:
+      self.on_change(lex, delta)
+
+  def items(self):
+    return self._values.items()
+
+  def Sum(self, lex):
+    if lex < 0:
+      return sum(j for i, j in self._values.iteritems() if i <= lex)
+    return self._tree.Sum(lex)
+
+
+class _ElementLocations(object):
+  """Current location of every element of a lexpos sorted element list
+
+  An offset at lex moves every element from lex on, so the locations are
+  kept in a max segment tree with suffix adds. That finds the first element
+  past a location in O(log n), without assuming locations are still sorted
+  after overlapping edits.
+  """
+
+  def __init__(self, lexposes):
+    self._lexposes = lexposes
+    size = 1
+    while size < len(lexposes):
+      size *= 2
+    self._size = size
+    self._max = [float('-inf')] * (2 * size)
+    self._max[size:size + len(lexposes)] = lexposes
+    for i in xrange(size - 1, 0, -1):
+      self._max[i] = max(self._max[2 * i], self._max[2 * i + 1])
+    # Pending adds of whole subtrees, already included in their _max.
+    self._added = [0] * (2 * size)
+
+  def Add(self, lex, delta):
+    """Move every element with lexpos >= lex by delta"""
+    first = bisect.bisect_left(self._lexposes, lex)
+    if first == len(self._lexposes):
+      return
+    i, j = first + self._size, 2 * self._size
+    while i < j:
+      if i & 1:
+        self._max[i] += delta
+        self._added[i] += delta
+        i += 1
+      i //= 2
+      j //= 2
+    i = (first + self._size) // 2
+    while i:
+      self._max[i] = (max(self._max[2 * i], self._max[2 * i + 1]) +
+                      self._added[i])
+      i //= 2
+
+  def FirstAfter(self, loc):
+    """Return the index of the first element located after loc, or None"""
+    if self._max[1] <= loc:
+      return None
+    i = 1
+    while i < self._size:
+      loc -= self._added[i]
+      i *= 2
+      if self._max[i] <= loc:
+        i += 1
+    return i - self._size
+
+
+class _EditBuffer(object):
+  """Text of a java file being edited, stored as fixed size chunks
+
+  A binary indexed tree over the chunk lengths maps a position to its chunk
+  in O(log n), so an edit only copies the chunks it touches instead of the
+  whole file. Indexing and slicing work like they do on the string, which
+  is only built when Text() is called.
+
+  A second tree over the number of newlines in each chunk, built on the
+  first line lookup and kept up to date by Replace, finds the line of a
+  position and the start and end of a line in O(log n) as well.
+  """
+
+  _CHUNK_SIZE = 512
+
+  def __init__(self, text=u''):
+    self._Reset(text)
+
+  def _Reset(self, text):
+    size = self._CHUNK_SIZE
+    self._chunks = [text[i:i+size] for i in xrange(0, len(text), size)]
+    if not self._chunks:
+      self._chunks = [text]
+    self._lengths = _BinaryIndexedTree([len(i) for i in self._chunks])
+    self._length = len(text)
+    self._text = text
+    self._cached_chunk = (0, 0)
+    self._line_counts = None
+    # Offsets of the newlines in each chunk, None until looked up.
+    self._newlines = None
+
+  def __len__(self):
+    return self._length
+
+  def _Locate(self, pos):
+    """Return (chunk index, chunk start) of the chunk holding pos"""
+    index, start = self._cached_chunk
+    if start <= pos < start + len(self._chunks[index]):
+      return index, start
+    if pos >= self._length:
+      index = len(self._chunks) - 1
+      return index, self._length - len(self._chunks[index])
+    index = self._lengths.Find(pos)
+    start = self._lengths.Sum(index - 1)
+    self._cached_chunk = (index, start)
+    return index, start
+
+  def __getitem__(self, key):
+    if self._text is not None:
+      return self._text[key]
+    if isinstance(key, slice):
+      start, stop, step = key.indices(self._length)
+      if step != 1:
+        return self.Text()[key]
+      return self._Slice(start, stop)
+    if key < 0:
+      key += self._length
+    if not 0 <= key < self._length:
+      raise IndexError('buffer index out of range')
+    index, start = self._Locate(key)
+    return self._chunks[index][key - start]
+
+  def _Slice(self, start, stop):
+    if stop <= start:
+      return self._chunks[0][:0]
+    first, first_start = self._Locate(start)
+    last, last_start = self._Locate(stop - 1)
+    if first == last:
+      return self._chunks[first][start - first_start:stop - first_start]
+    pieces = [self._chunks[first][start - first_start:]]
+    pieces.extend(self._chunks[first + 1:last])
+    pieces.append(self._chunks[last][:stop - last_start])
+    return pieces[0][:0].join(pieces)
+
+  def Replace(self, start, end, text):
+    """Replace [start, end) with text, clamped like string slicing"""
+    start = max(0, min(start, self._length))
+    end = max(start, min(end, self._length))
+    first, first_start = self._Locate(start)
+    last, last_start = self._Locate(end)
+    chunk = (self._chunks[first][:start - first_start] + text
+             + self._chunks[last][end - last_start:])
+    line_counts = self._line_counts
+    for i in xrange(first + 1, last + 1):
+      self._lengths.Add(i, -len(self._chunks[i]))
+      if line_counts is not None:
+        line_counts.Add(i, -self._chunks[i].count('\n'))
+        self._newlines[i] = []
+      self._chunks[i] = chunk[:0]
+    self._lengths.Add(first, len(chunk) - len(self._chunks[first]))
+    if line_counts is not None:
+      line_counts.Add(
+          first, chunk.count('\n') - self._chunks[first].count('\n'))
+      self._newlines[first] = None
+    self._chunks[first] = chunk
+    self._length += len(text) - (end - start)
+    self._text = None
+    self._cached_chunk = (0, 0)
+    if len(chunk) > 8 * self._CHUNK_SIZE:
+      self._Reset(self.Text())
+
+  def _LineCounts(self):
+    if self._line_counts is None:
+      self._line_counts = _BinaryIndexedTree(
+          [i.count('\n') for i in self._chunks])
+      self._newlines = [None] * len(self._chunks)
+    return self._line_counts
+
+  def _ChunkNewlines(self, index):
+    newlines = self._newlines[index]
+    if newlines is None:
+      chunk = self._chunks[index]
+      newlines = []
+      i = chunk.find('\n')
+      while i >= 0:
+        newlines.append(i)
+        i = chunk.find('\n', i + 1)
+      self._newlines[index] = newlines
+    return newlines
+
+  def _NewlinesBefore(self, pos):
+    pos = max(0, min(pos, self._length))
+    line_counts = self._LineCounts()
+    index, start = self._Locate(pos)
+    return line_counts.Sum(index - 1) + bisect.bisect_left(
+        self._ChunkNewlines(index), pos - start)
+
+  def _NewlinePosition(self, n):
+    """Return the position of newline n, counting from 0"""
+    line_counts = self._LineCounts()
+    index = line_counts.Find(n)
+    start = self._lengths.Sum(index - 1)
+    return start + self._ChunkNewlines(index)[n - line_counts.Sum(index - 1)]
+
+  def LineStart(self, pos):
+    """Return the position of the first character on the line of pos"""
+    n = self._NewlinesBefore(pos)
+    if n == 0:
+      return 0
+    return self._NewlinePosition(n - 1) + 1
+
+  def LineEnd(self, pos):
+    """Return the position of the newline ending the line of pos
+
+    The length of the buffer is returned for a last line without one.
+    """
+    n = self._NewlinesBefore(pos)
+    if n == self._LineCounts().Sum(len(self._chunks) - 1):
+      return self._length
+    return self._NewlinePosition(n)
+
+  def LineAndColumn(self, pos):
+    """Return the line and column of pos, both counting from 1"""
+    n = self._NewlinesBefore(pos)
+    line_start = 0 if n == 0 else self._NewlinePosition(n - 1) + 1
+    return n + 1, pos - line_start + 1
+
+  def Indentation(self, pos):
+    """Return the number of spaces the line of pos starts with"""
+    leading = self[self.LineStart(pos):pos]
+    return len(leading) - len(leading.lstrip(' '))
+
+  def Text(self):
+    if self._text is None:
+      self._text = self._chunks[0][:0].join(self._chunks)
+    return self._text
+
+  def __unicode__(self):
+    return unicode(self.Text())
+
+  def __str__(self):
+    return str(self.Text())
+
+  def __eq__(self, other):
+    if isinstance(other, _EditBuffer):
+      other = other.Text()
+    return self.Text() == other
+
+  def __ne__(self, other):
+    return not self == other
+
+
+class _SourceSpan(object):
+  """A [start, end) span of the original text, see _EditScript"""
+
+  def __init__(self, start, end):
+    self.start = start
+    self.end = end
+
+
+class _EditScript(object):
+  """Edits recorded against the original text of a file
+
+  Every edit replaces a [start, end) span of the original text, insertions
+  have start == end. Render() applies all of them in one pass. A
+  replacement may contain _SourceSpans, which are rendered with the edits
+  recorded inside them, so moved code keeps later changes.
+
+  Overlaps are resolved by position: of two overlapping edits the one that
+  starts first wins, and at the same start the widest one, so a removed
+  element drops every edit inside it. Insertions at the same position are
+  kept in recording order, or reverse order for the prepended ones.
+  """
+
+  def __init__(self, text):
+    self._text = text
+    self._edits = []
+    # End of the widest removal starting at each position.
+    self._removal_ends = {}
+
+  def __len__(self):
+    return len(self._edits)
+
+  def Replace(self, start, end, pieces, prepend=False):
+    if not isinstance(pieces, list):
+      pieces = [pieces]
+    if start == end and not any(pieces):
+      return
+    seq = len(self._edits)
+    self._edits.append((start, 0 if start == end else 1, -end,
+                        -seq if prepend else seq, seq, end, pieces))
+    if start != end and not any(pieces):
+      self._removal_ends[start] = max(end, self._removal_ends.get(start, end))
+
+  def RemovalEnd(self, start):
+    """Return the end of the widest removal starting at start, or None"""
+    return self._removal_ends.get(start)
+
+  def Render(self, start=0, end=None, excluded=frozenset(), unchanged=None):
+    """Return the edited text of [start, end)
+
+    If unchanged is a list, (rendered_start, start, size) is appended to it
+    for every stretch of the original text copied to the output as is.
+    """
+    if end is None:
+      end = len(self._text)
+    output = []
+    length = 0
+    cursor = start
+    for edit in sorted(self._edits):
+      edit_start, edit_end, seq, pieces = edit[0], edit[5], edit[4], edit[6]
+      if edit_start < start or edit_end > end or seq in excluded:
+        continue
+      if edit_start < cursor:
+        logging.debug('Dropping edit at %d overlapped by an earlier edit',
+                      edit_start)
+        continue
+      if unchanged is not None and edit_start > cursor:
+        unchanged.append((length, cursor, edit_start - cursor))
+      output.append(self._text[cursor:edit_start])
+      length += edit_start - cursor
+      for piece in pieces:
+        if isinstance(piece, _SourceSpan):
+          piece = self.Render(piece.start, piece.end, excluded | {seq})
+        output.append(piece)
+        length += len(piece)
+      cursor = edit_end
+    if unchanged is not None and end > cursor:
+      unchanged.append((length, cursor, end - cursor))
+    output.append(self._text[cursor:end])
+    return self._text[:0].join(output)
+
+
+def _UnchangedSpans(length, edits):
+  """Return the (new_start, old_start, size) stretches of a text of length
+  chars left untouched by edits
+
+  edits are (start, end, size) tuples in the order they were applied, each
+  replacing [start, end) of the text at that time with size chars.
+  """
+  spans = [(0, 0, length)]
+  for start, end, size in edits:
+    delta = size - (end - start)
+    result = []
+    for new_start, old_start, span_size in spans:
+      new_end = new_start + span_size
+      if new_end <= start:
+        result.append((new_start, old_start, span_size))
+      elif new_start >= end:
+        result.append((new_start + delta, old_start, span_size))
+      else:
+        if new_start < start:
+          result.append((new_start, old_start, start - new_start))
+        if new_end > end:
+          result.append((end + delta, old_start + end - new_start,
+                         new_end - end))
+    spans = result
+  return spans
+
+
+# Members are only reused when they start with a modifier, otherwise PLY
+# places the start of the empty modifier list after the first token.
+_REUSABLE_MEMBER_TYPES = (
+    model.FieldDeclaration, model.MethodDeclaration,
+    model.ConstructorDeclaration, model.ClassDeclaration,
+    model.InterfaceDeclaration)
+
+_BLANK = ''.join(chr(i) if chr(i) == '\n' else ' ' for i in range(256))
+
+
+def _Blank(text):
+  """Return a comment as long as text, with its newlines"""
+  if '\n' in text[:2] or '\n' in text[-2:]:
+    return text.translate(_BLANK)
+  # A comment is skipped in one go, unlike spaces which PLY skips one by one.
+  return '/*' + text[2:-2].translate(_BLANK) + '*/'
+
+
+def _ElementPositions(element_list, element_table):
+  """Map id(element) to its index in element_list and in its element_table
+  list, so neighbours are found without comparing elements"""
+  positions = dict((id(e), [i, None]) for i, e in enumerate(element_list))
+  for element_type, elements in element_table.iteritems():
+    for i, e in enumerate(elements):
+      if type(e) is element_type:
+        positions[id(e)][1] = i
+  return positions
+
+
+def _ShiftElement(element, lex_delta, line_delta):
+  """Move element, not its children, by lex_delta and line_delta"""
+  if element.lexpos >= 0:
+    element.lexpos += lex_delta
+  start, end = element.lexspan
+  if start >= 0:
+    element.lexspan = (start + lex_delta, end + lex_delta)
+  if element.lineno >= 0:
+    element.lineno += line_delta
+
+
+def _IsReusableMember(member, old_text):
+  if not isinstance(member, _REUSABLE_MEMBER_TYPES) or not member.modifiers:
+    return False
+  start, end = member.lexpos - 2, member.lexend - 2
+  first = member.modifiers[0]
+  if isinstance(first, model.Annotation):
+    first = '@'
+  return (0 <= start <= end < len(old_text) and old_text[end] in '};'
+          and old_text.startswith(first, start))
+
+
+def _ReparseMembers(java_parser, tree, old_text, new_text, unchanged):
+  """Parse new_text reusing the members of tree left unchanged
+
+  unchanged holds the (new_start, old_start, size) stretches of old_text
+  that new_text still contains, in order. The members of top level types
+  inside them are blanked out of new_text, which keeps every position, and
+  the rest is parsed. The old members are then moved to their new
+  position and spliced back in.
+
+  Returns the new tree and the shifts to pass to _TraverseTree for the
+  children of the old members, or None if the whole file has to be parsed
+  instead.
+  """
+  if not isinstance(tree, model.CompilationUnit) or not unchanged:
+    return None
+  try:
+    old_text = old_text.encode('ascii')
+    new_text = new_text.encode('ascii')
+  except UnicodeError:
+    # _Blank only translates byte strings, keep it simple.
+    return None
+  old_starts = [span[1] for span in unchanged]
+  reused = []
+  for declaration in tree.type_declarations:
+    if not isinstance(
+        declaration, (model.ClassDeclaration, model.InterfaceDeclaration)):
+      continue
+    for member in declaration.body:
+      if not _IsReusableMember(member, old_text):
+        continue
+      start, end = member.lexpos - 2, member.lexend - 1
+      index = bisect.bisect_right(old_starts, start) - 1
+      if index < 0:
+        continue
+      new_start, old_start, size = unchanged[index]
+      if end > old_start + size:
+        continue
+      reused.append((new_start + start - old_start, start, end, member))
+  if not reused:
+    return None
+  reused.sort()
+
+  skeleton = []
+  cursor = 0
+  for new_start, start, end, _ in reused:
+    skeleton.append(new_text[cursor:new_start])
+    skeleton.append(_Blank(new_text[new_start:new_start + end - start]))
+    cursor = new_start + end - start
+  skeleton.append(new_text[cursor:])
+  new_tree = java_parser.parse_string(''.join(skeleton))
+  if not isinstance(new_tree, model.CompilationUnit):
+    return None
+
+  old_line, old_cursor, new_line, new_cursor = 0, 0, 0, 0
+  members = []
+  shifts = {}
+  for new_start, start, _, member in reused:
+    old_line += old_text.count('\n', old_cursor, start)
+    new_line += new_text.count('\n', new_cursor, new_start)
+    old_cursor, new_cursor = start, new_start
+    shift = (new_start - start, new_line - old_line)
+    # A lazy body would be parsed from the old text, parse it before the
+    # member moves.
+    model.parse_bodies(member)
+    _ShiftElement(member, *shift)
+    shifts[id(member)] = shift
+    members.append(member)
+
+  for declaration in new_tree.type_declarations:
+    if not members:
+      break
+    if not isinstance(
+        declaration, (model.ClassDeclaration, model.InterfaceDeclaration)):
+      continue
+    inside = [m for m in members if declaration.lexpos < m.lexpos and
+              m.lexend < declaration.lexend]
+    if not inside:
+      continue
+    placed = set(id(m) for m in inside)
+    members = [m for m in members if id(m) not in placed]
+    body = []
+    for member in declaration.body:
+      while inside and 0 <= member.lexpos and inside[0].lexpos < member.lexpos:
+        body.append(inside.pop(0))
+      body.append(member)
+    declaration.body = body + inside
+  if members:
+    return None
+  return new_tree, shifts
+
+
+# Getter for the fields of each model class, made from its first instance.
+# lexpos is added so that attrgetter, which gives a bare value for a single
+# name, returns a tuple. Ints are skipped anyway.
+_FIELD_GETTERS = {}
+
+
+# The same for _TraverseTree(parsed_only=True), where the getters of the
+# classes with lazy bodies leave out the bodies not parsed yet.
+_PARSED_FIELD_GETTERS = {}
+
+_LAZY_BODY_TYPES = frozenset(
+    [model.MethodDeclaration, model.ConstructorDeclaration])
+
+
+def _NoFields(element):
+  """Getter for the classes without fields, e.g. model.Empty"""
+  return ()
+
+
+def _ParsedFieldsGetter(fields):
+  def getter(element):
+    return tuple(getattr(element, f) for f in fields
+                 if model.is_parsed(element, f))
+  return getter
+
+_CLASS_TYPES = frozenset([model.ClassDeclaration, model.InterfaceDeclaration])
+
+# Field value types that are never elements, cheaper to rule out first.
+_LEAF_TYPES = frozenset([type(None), str, unicode, bool, int])
+
+_BY_LEXPOS = operator.attrgetter('lexpos')
+
+
+def _MergeByLexpos(elements, late):
+  """Merge the lexpos sorted late into the lexpos sorted elements
+
+  Elements of the same lexpos keep elements first.
+  """
+  merged = []
+  i = 0
+  for element in late:
+    while i < len(elements) and elements[i].lexpos <= element.lexpos:
+      merged.append(elements[i])
+      i += 1
+    merged.append(element)
+  merged.extend(elements[i:])
+  return merged
+
+
+def _MergeIntoTable(element_table, late):
+  by_type = collections.defaultdict(list)
+  for element in late:
+    by_type[type(element)].append(element)
+  for element_type, elements in by_type.iteritems():
+    element_table[element_type] = _MergeByLexpos(
+        element_table[element_type], elements)
+
+
+def _TraverseTree(tree, shifts=None, parsed_only=False):
+  """Return the elements of tree and the ones of its main class
+
+  Returns the element list, the element table keyed by type, and the same
+  two for the elements inside exactly one class or interface, leaving out
+  those without a position. Everything is ordered by lexpos, elements of the
+  same lexpos parent first.
+
+  Children are visited in lexpos order, with their parent placed among them,
+  so the lists come out sorted. PLY gives a few elements a lexpos out of
+  source order, e.g. from an empty modifiers_opt or -1 for nodes without a
+  position. Those are merged in at the end.
+
+  shifts maps id(element) to the (lex_delta, line_delta) its descendants
+  are moved by on the way, see _ReparseMembers.
+
+  With parsed_only, lazy bodies that are not parsed yet are left out
+  rather than parsed, along with everything inside them.
+  """
   element_list = []
   element_table = collections.defaultdict(list)
+  main_element_list = []
+  main_element_table = collections.defaultdict(list)
+  late = []
+  last = -1
+  # Number of classes around the current element.
+  depth = 0
+  # Move of the children of the current element.
+  shift = None
+  # Besides elements, the stack holds (element,) for an element to add once
+  # the children placed before it are done, () where a class ends and
+  # (None, shift) where a shifted element ends.
+  stack = [tree] if isinstance(tree, model.SourceElement) else []
+  pop, push = stack.pop, stack.append
+  source_element = model.SourceElement
+  field_getters = _PARSED_FIELD_GETTERS if parsed_only else _FIELD_GETTERS
+  while stack:
+    current = pop()
+    element_type = type(current)
+    if element_type is tuple:
+      if not current:
+        depth -= 1
+        continue
+      if len(current) == 2:
+        shift = current[1]
+        continue
+      current = current[0]
+      element_type = type(current)
+    else:
+      if element_type in _CLASS_TYPES:
+        depth += 1
+        push(())
+      if shifts and id(current) in shifts:
+        push((None, shift))
+        shift = shifts[id(current)]
+      getter = field_getters.get(element_type)
+      if getter is None:
+        fields = current._fields
+        if parsed_only and element_type in _LAZY_BODY_TYPES:
+          getter = _ParsedFieldsGetter(fields)
+        elif fields:
+          getter = operator.attrgetter(*(fields + ('lexpos',)))
+        else:
+          getter = _NoFields
+        field_getters[element_type] = getter
+      children = []
+      for value in getter(current):
+        if type(value) is list:
+          if value:
+            children.extend(
+                [i for i in value if isinstance(i, source_element)])
+        elif (type(value) not in _LEAF_TYPES and
+              isinstance(value, source_element)):
+          children.append(value)
+      if children:
+        if shift is not None:
+          lex_delta, line_delta = shift
+          for child in children:
+            # _ShiftElement inlined, this runs for most of a reloaded file.
+            if child.lexpos >= 0:
+              child.lexpos += lex_delta
+            start, end = child.lexspan
+            if start >= 0:
+              child.lexspan = (start + lex_delta, end + lex_delta)
+            if child.lineno >= 0:
+              child.lineno += line_delta
+        # Pushed last to first, children placed before current go last.
+        if len(children) > 1:
+          children.sort(key=_BY_LEXPOS, reverse=True)
+        lexpos = current.lexpos
+        smallest = children[-1].lexpos
+        if smallest < lexpos and (smallest >= 0 or any(
+            0 <= child.lexpos < lexpos for child in children)):
+          before = []
+          for child in children:
+            if 0 <= child.lexpos < lexpos:
+              before.append(child)
+            else:
+              push(child)
+          push((current,))
+          stack.extend(before)
+          continue
+        stack.extend(children)
+    lexpos = current.lexpos
+    if lexpos < last:
+      late.append((current, depth))
+      continue
+    last = lexpos
+    element_list.append(current)
+    element_table[element_type].append(current)
+    if depth == 1 and lexpos >= 0:
+      main_element_list.append(current)
+      main_element_table[element_type].append(current)
+
+  if late:
+    late.sort(key=lambda x: x[0].lexpos)
+    main_late = [e for e, depth in late if depth == 1 and e.lexpos >= 0]
+    late = [e for e, _ in late]
+    element_list = _MergeByLexpos(element_list, late)
+    _MergeIntoTable(element_table, late)
+    main_element_list = _MergeByLexpos(main_element_list, main_late)
+    _MergeIntoTable(main_element_table, main_late)
+
+  classes = element_table.get(model.ClassDeclaration, [])
+  interfaces = element_table.get(model.InterfaceDeclaration, [])
+  single_class = len(classes) + len(interfaces) == 1
+  if classes:
+    # Class lookups have always seen the interfaces too.
+    element_table[model.ClassDeclaration] = _MergeByLexpos(
+        classes, interfaces)
+  element_table = dict(element_table)
+  if single_class:
+    # With a single class the main list and table are the whole file.
+    return element_list, element_table, element_list, element_table
+  return (element_list, element_table, main_element_list,
+          dict(main_element_table))
+
+
+class _SpanIndex(object):
+  """Index over the (lexpos, lexend) spans of a list of elements"""
+
+  def __init__(self, elements):
+    self._elements = sorted(elements, key=lambda x: (x.lexpos, -x.lexend))
+    self._starts = [e.lexpos for e in self._elements]
+    # Index of the innermost element around each one, spans of AST nodes
+    # never partially overlap.
+    self._parents = []
+    stack = []
+    for i, e in enumerate(self._elements):
+      while stack and self._elements[stack[-1]].lexend < e.lexend:
+        stack.pop()
+      self._parents.append(stack[-1] if stack else None)
+      stack.append(i)
+
+  def Enclosing(self, element, strict=False):
+    """Return the innermost indexed element around element, or None
+
+    With strict the span has to start before and end after element.
+    """
+    if strict:
+      i = bisect.bisect_left(self._starts, element.lexpos) - 1
+    else:
+      i = bisect.bisect_right(self._starts, element.lexpos) - 1
+    while i is not None and i >= 0:
+      end = self._elements[i].lexend
+      if end > element.lexend or (not strict and end == element.lexend):
+        return self._elements[i]
+      i = self._parents[i]
+
+
+def _ParseImport(package):
+  """Return (static, name) for an _addImport argument"""
+  if package.startswith('static '):
+    return True, package[len('static '):].strip()
+  return False, package.strip()
+
+
+def _DeclaredImport(declaration):
+  """Return (static, name) for a parsed ImportDeclaration"""
+  name = declaration.name.value
+  if declaration.on_demand:
+    name += '.*'
+  return declaration.static, name
+
+
+def _ImportMatches(name, import_name):
+  """Whether an import of name is removed by _removeImport(import_name)"""
+  return name == import_name or name.endswith('.' + import_name)
+
+
+def _ImportGroup(name):
+  group, prefix_length = len(_IMPORT_GROUPS), 0
+  for i, prefix in enumerate(_IMPORT_GROUPS):
+    if len(prefix) > prefix_length and (
+        name == prefix or name.startswith(prefix + '.')):
+      group, prefix_length = i, len(prefix)
+  return group
+
+
+def _ImportSortKey(import_pair):
+  static, name = import_pair
+  return not static, _ImportGroup(name), name
+
+
+def _FormatImports(imports):
+  """Return the import block for (static, name) pairs in Chromium's order
+
+  Groups are separated by an empty line.
+  """
+  lines = []
+  previous_group = None
+  for static, name in sorted(imports, key=_ImportSortKey):
+    group = (static, _ImportGroup(name))
+    if previous_group is not None and group != previous_group:
+      lines.append('')
+    previous_group = group
+    lines.append('import %s%s;' % ('static ' if static else '', name))
+  return '\n'.join(lines)
+
+
+class _SymbolIndex(object):
+  """Names a file declares or imports, for set lookups while converting"""
+
+  def __init__(self, element_table, main_element_table):
+    # Methods declared by the main class.
+    self.declared_methods = frozenset(
+        m.name for m in main_element_table.get(model.MethodDeclaration, []))
+    # Simple name of every import to its fully qualified name, the first
+    # import wins.
+    self.imports = {}
+    for i in element_table.get(model.ImportDeclaration, []):
+      self.imports.setdefault(i.name.value.split('.')[-1], i.name.value)
+    # First variable of every field declaration in the file.
+    self.field_names = frozenset(
+        f.variable_declarators[0].variable.name
+        for f in element_table.get(model.FieldDeclaration, []))
+
+
+def _TypeName(declared_type):
+  """Return the name of a parsed type, e.g. 'float', 'Double' or 'int[]'"""
+  if not isinstance(declared_type, model.Type):
+    return declared_type
+  name = declared_type.name
+  if isinstance(name, model.Name):
+    name = name.value
+  return name + '[]' * declared_type.dimensions
+
+
+class _Scope(object):
+  def __init__(self, parent):
+    self.parent = parent
+    # Variable name to [(lexpos it is declared at, type)], a lexpos of None
+    # for variables visible in the whole scope.
+    self.variables = {}
 
-  while len(stack) != 0:
+  def Declare(self, name, declared_type, lexpos=None):
+    self.variables.setdefault(name, []).append((lexpos, declared_type))
+
+
+# Elements that start a new scope for their children, the ones after
+# ClassDeclaration see their variables everywhere.
+_SCOPE_TYPES = (
+    model.ClassDeclaration, model.InterfaceDeclaration, model.EnumDeclaration,
+    model.MethodDeclaration, model.ConstructorDeclaration, model.Block,
+    model.For, model.ForEach, model.Switch, model.Try, model.Catch)
+
+
+class _ScopeTable(object):
+  """Lexical scopes of a tree, to find the declared type of a name"""
+
+  def __init__(self, tree):
+    # id(Name) to the innermost scope around it.
+    self._name_scopes = {}
+    # Method name to the return types it is declared with anywhere.
+    self.return_types = collections.defaultdict(list)
+    stack = [(tree, _Scope(None))]
+    while stack:
+      current, scope = stack.pop()
+      if type(current) == list:
+        stack.extend((i, scope) for i in current)
+        continue
+      if not isinstance(current, model.SourceElement):
+        continue
+      self._Declare(current, scope)
+      if isinstance(current, _SCOPE_TYPES):
+        scope = _Scope(scope)
+        if isinstance(current, model.ForEach):
+          scope.Declare(current.variable.name, current.type)
+        elif isinstance(current, model.Catch) and len(current.types) == 1:
+          scope.Declare(current.variable.name, current.types[0])
+      elif isinstance(current, model.Name):
+        self._name_scopes[id(current)] = scope
+      for f in current._fields:
+        child_scope = scope
+        if isinstance(current, model.InstanceCreation) and f == 'body':
+          # Only the members of an anonymous class see its fields.
+          child_scope = _Scope(scope)
+        stack.append((getattr(current, f), child_scope))
+
+  def _Declare(self, element, scope):
+    if isinstance(element, model.VariableDeclaration):
+      for declarator in element.variable_declarators:
+        scope.Declare(
+            declarator.variable.name, element.type, element.lexpos)
+    elif isinstance(element, model.FieldDeclaration):
+      for declarator in element.variable_declarators:
+        scope.Declare(declarator.variable.name, element.type)
+    elif isinstance(element, model.FormalParameter):
+      scope.Declare(element.variable.name,
+                    None if element.vararg else element.type)
+    elif isinstance(element, model.Resource):
+      scope.Declare(element.variable.name, element.type)
+    elif isinstance(element, model.MethodDeclaration):
+      self.return_types[element.name].append(element.return_type)
+
+  def TypeOf(self, name):
+    """Return the declared type of the variable name refers to, or None"""
+    scope = self._name_scopes.get(id(name))
+    while scope is not None:
+      # The last declaration before name, or one visible in the whole scope.
+      declarations = scope.variables.get(name.value, [])
+      visible = [(-1 if lexpos is None else lexpos, declared_type)
+                 for lexpos, declared_type in declarations
+                 if lexpos is None or lexpos < name.lexpos]
+      if visible:
+        return max(visible, key=operator.itemgetter(0))[1]
+      scope = scope.parent
+    return None
+
+
+def _DeclaredClasses(tree):
+  """Return the ClassDeclaration table entry of tree without parsing bodies
+
+  Like the element table, interfaces are only included along with classes.
+  """
+  classes = []
+  stack = [tree]
+  while stack:
     current = stack.pop()
-    if type(current) == list and len(current) > 0 and (any(
-        isinstance(i, model.SourceElement) for i in current)):
+    if type(current) is list:
       stack.extend(current)
     elif isinstance(current, model.SourceElement):
-      element_list.append(current)
-      element_table[type(current)].append(current)
-      if getattr(current, '_fields'):
-        for f in getattr(current, '_fields'):
-          stack.append(getattr(current, f))
-  main_element_list, main_element_table = _GetMainListAndTable(element_list,
-      element_table)
-  return _SortListAndTable(
-      element_list, element_table, main_element_list, main_element_table)
-
-
-def _GetMainListAndTable(element_list, element_table):
-  all_classes = element_table.get(model.ClassDeclaration, [])
-  all_classes.extend(element_table.get(model.InterfaceDeclaration, []))
-  if len(all_classes) == 1:
-    return element_list, element_table
-  else:
-    main_element_list = []
-    main_element_table = collections.defaultdict(list)
-    for i in element_list:
-      if len(
-          [e for e in all_classes if i.lexpos >= e.lexpos
-           and i.lexend <= e.lexend]) == 1:
-        main_element_list.append(i)
-        main_element_table[type(i)].append(i)
-    return main_element_list, main_element_table
-
-
-def _SortListAndTable(ls, tb, pls, ptb):
-  sorted_element_list = sorted(ls, key=lambda x : x.lexpos)
-  sorted_main_element_list = sorted(pls, key=lambda x: x.lexpos)
-  sorted_element_table = {}
-  sorted_main_element_table = {}
-  for k, v in tb.iteritems():
-    sorted_element_table[k] = sorted(v, key=lambda x: x.lexpos)
-  for k, v in ptb.iteritems():
-    sorted_main_element_table[k] = sorted(v, key=lambda x: x.lexpos)
-  return (sorted_element_list, sorted_element_table,
-          sorted_main_element_list, sorted_main_element_table)
+      if type(current) in _CLASS_TYPES:
+        classes.append(current)
+      stack.extend(getattr(current, f) for f in current._fields
+                   if model.is_parsed(current, f))
+  if not any(type(i) is model.ClassDeclaration for i in classes):
+    return {}
+  return {model.ClassDeclaration: classes}
 
 
 def _GetMainClassAndSuperClassName(element_table):
@@ -97,29 +1051,51 @@ def _GetMainClassAndSuperClassName(element_table):
 class BaseAgent(object):
   """Basic agent for all java file, provide basic method"""
 
+  # When set, edits are recorded as an _EditScript against the original
+  # source and applied once on Save. Positions then always refer to the
+  # original source, so actions do not need to SaveAndReload between edits.
+  use_edit_script = False
+
+  # When set, method and constructor bodies are parsed the first time they
+  # are read, see parser.Parser._parse_lazily. The element tables, which
+  # need every body, are then only built on first use, declarations can be
+  # looked up without them through parsedElementTables.
+  lazy_bodies = False
+
   def __init__(self, java_parser, filepath, logger=logging.getLogger(),
-      agent=None, **kwargs):
+      agent=None, header_only=False, **kwargs):
     if agent != None and agent.filepath == filepath:
+      if agent._shifts is not None:
+        # Traversing moves the shifted members of the shared tree, do it
+        # once.
+        agent._traverseTree()
+      self._header_only = agent._header_only
       self._tree = agent._tree
       self._filepath = agent._filepath
-      self._content = agent.content
+      self._source = agent._source
+      self._content = _EditBuffer(agent.content.Text())
       self._main_element_list = agent._main_element_list
       self._main_element_table = agent._main_element_table
       self._element_list = agent._element_list
       self._element_table = agent._element_table
+      self._element_positions = agent._element_positions
+      self._shifts = agent._shifts
+      self._span_indexes = agent._span_indexes
+      self._symbol_index = agent._symbol_index
+      self._scope_table = agent._scope_table
       self.main_class = agent.main_class
       self.super_class_name = agent.super_class_name
       self._failed_to_parse = agent._failed_to_parse
 
+    elif header_only:
+      self.LoadHeader(java_parser, filepath)
     else:
       self.Load(java_parser, filepath)
 
-    self.offset_table = collections.defaultdict(int)
-    self.offset_table[0] = -2
+    self._resetEdits()
     self.logger = logger
     self.parser = java_parser
     self.kwargs = kwargs
-    self._added_imports = []
 
   def actions(self):
     """Implement this to define the actions needed for a Java refactoring"""
@@ -153,24 +1129,98 @@ class BaseAgent(object):
   @content.setter
   def content(self, value):
     self._content_is_change = True
-    self._content = value
+    if isinstance(value, _EditBuffer):
+      value = value.Text()
+    if self._edit_script is not None:
+      self._edit_script.Replace(0, len(self._content), value)
+    else:
+      self._edit_log.append((0, len(self._content), len(value)))
+      self._content = _EditBuffer(value)
+
+  def _resetEdits(self):
+    self._content_is_change = False
+    self.offset_table = _OffsetTable(len(self._content))
+    self._element_locations = None
+    if self._element_list is not None:
+      self._locations()
+    self.offset_table[0] = -2
+    self._edit_script = None
+    self._edit_log = []
+    # Imports to add and remove, applied in one go by _rewriteImports.
+    self._import_additions = set()
+    self._import_removals = set()
+    if self.use_edit_script:
+      self._edit_script = _EditScript(self._content.Text())
+
+  def _replaceContent(self, start, end, text, prepend=False):
+    self._content_is_change = True
+    if self.logger.isEnabledFor(logging.DEBUG):
+      line, column = self._content.LineAndColumn(start)
+      self.logger.debug('%s:%d:%d: replace %d characters with %r',
+                        self._filepath, line, column, end - start, text)
+    if self._edit_script is not None:
+      self._edit_script.Replace(start, end, text, prepend=prepend)
+    else:
+      self._edit_log.append((start, end, len(text)))
+      self._content.Replace(start, end, text)
+
+  def _copyContent(self, start, end):
+    """Return content[start:end] to be pasted elsewhere
+
+    With an edit script this is a _SourceSpan, so edits recorded inside the
+    span later on are pasted along with it.
+    """
+    if self._edit_script is not None:
+      return _SourceSpan(start, end)
+    return self.content[start:end]
+
+  def _modifiedContent(self):
+    self._rewriteImports()
+    if self._edit_script is not None:
+      return self._edit_script.Render()
+    return self.content.Text()
+
+  def _modifiedContentAndUnchangedSpans(self):
+    self._rewriteImports()
+    if self._edit_script is not None:
+      unchanged = []
+      return self._edit_script.Render(unchanged=unchanged), unchanged
+    return self.content.Text(), _UnchangedSpans(
+        len(self._source), self._edit_log)
 
   @property
   def element_table(self):
+    self._traverseTree()
     return self._element_table
 
   @property
   def element_list(self):
+    self._traverseTree()
     return self._element_list
 
   @property
   def main_element_list(self):
+    self._traverseTree()
     return self._main_element_list
 
   @property
   def main_element_table(self):
+    self._traverseTree()
     return self._main_element_table
 
+  def parsedElementTables(self):
+    """Return the element table and main element table of what is parsed
+
+    Unlike element_table, lazy bodies are not parsed for this, the elements
+    inside them are left out. The class and member declarations outside
+    bodies are all there.
+    """
+    if self._element_table is None and self._shifts is None:
+      _, element_table, _, main_element_table = _TraverseTree(
+          self._tree, parsed_only=True)
+      return element_table, main_element_table
+    return self.element_table, self.main_element_table
+
   @property
   def filepath(self):
     return self._filepath
@@ -208,60 +1258,147 @@ class BaseAgent(object):
         main_table=main_table, action=action)
 
   def Load(self, java_parser, filepath):
-    with open(filepath) as f:
-      self._tree = java_parser.parse_file(f)
+    # The file is read once, the tree positions index into its text.
+    tree, source = parse_cache.LoadFile(
+        java_parser, filepath, lazy_bodies=self.lazy_bodies)
     self._filepath = filepath #the filepath to the javafile
-    with codecs.open(filepath, encoding='utf-8', mode='r') as f:
-      self._content = f.read() #content string of original java file
-    self._content_is_change = False
-    self._element_list, self._element_table, self._main_element_list, \
-        self._main_element_table = _TraverseTree(self._tree)
-    if len(self._element_list) <= 0:
+    self._header_only = False
+    self._setTree(tree, source)
+
+  def LoadHeader(self, java_parser, filepath):
+    """Load only the package, imports and type headers of filepath
+
+    Type bodies are left empty, which is enough for skip() and the super
+    class. Call LoadFull before anything looks at the members. Files the
+    header parse fails on are loaded in full.
+    """
+    tree, source = parse_cache.LoadFile(java_parser, filepath, header=True)
+    self._filepath = filepath
+    self._header_only = isinstance(tree, model.CompilationUnit)
+    # LoadFile scanned the text for Java 8 syntax, it is not scanned again.
+    if (not self._header_only and source is not None and
+        not parse_cache.IsJava8File(filepath)):
+      tree = parse_cache.ParseSource(
+          java_parser, source, lazy_bodies=self.lazy_bodies)
+    self._setTree(tree, source)
+
+  def LoadFull(self):
+    """Parse the whole file if only its header was loaded
+
+    The text loaded with the header is parsed, the file is not read or
+    scanned for Java 8 syntax again.
+    """
+    if self._header_only:
+      self._header_only = False
+      self._setTree(parse_cache.ParseSource(
+          self.parser, self._source, lazy_bodies=self.lazy_bodies),
+          self._source)
+
+  def _setTree(self, tree, source, shifts=None):
+    self._tree = tree
+    # source is None for known Java 8 files, which are not read.
+    self._source = source
+    self._content = _EditBuffer(u'' if source is None else source)
+    self._shifts = shifts
+    self._element_list = self._element_table = None
+    self._main_element_list = self._main_element_table = None
+    self._element_positions = None
+    if not self.lazy_bodies:
+      self._traverseTree()
+    self._span_indexes = {}
+    self._symbol_index = None
+    self._scope_table = None
+    # The element list is empty exactly when there is no tree.
+    if not isinstance(tree, model.SourceElement):
       logging.warn("unable to read file, %s, file likely contains java8 syntax",
-          filepath)
+          self._filepath)
       self._failed_to_parse = True
     else:
       self._failed_to_parse = False
 
-    self._content_is_change = False
-
-    self.offset_table = collections.defaultdict(int)
-    self.offset_table[0] = -2
+    self._resetEdits()
 
+    if self._element_table is None:
+      classes = _DeclaredClasses(tree)
+    else:
+      classes = self._element_table
     self.main_class, self.super_class_name = _GetMainClassAndSuperClassName(
-        self._element_table)
+        classes)
+
+  def _traverseTree(self):
+    """Build the element lists and tables, unless they already are"""
+    if self._element_list is not None:
+      return
+    self._element_list, self._element_table, self._main_element_list, \
+        self._main_element_table = _TraverseTree(self._tree, self._shifts)
+    self._element_positions = _ElementPositions(
+        self._element_list, self._element_table)
+    self._shifts = None
+
+  def _locations(self):
+    """Return the _ElementLocations of the element list, built on first use
+
+    Offsets recorded before then are applied to it.
+    """
+    if self._element_locations is None:
+      self._element_locations = _ElementLocations(
+          [e.lexpos for e in self.element_list])
+      for lex, offset in self.offset_table.items():
+        if offset:
+          self._element_locations.Add(lex, offset)
+      self.offset_table.on_change = self._element_locations.Add
+    return self._element_locations
 
   def Save(self):
+    self._checkRead()
+    return self._write(self._modifiedContent())
+
+  def _checkRead(self):
+    if self._source is None:
+      raise ValueError('%s was skipped for Java 8 syntax and not read'
+                       % self._filepath)
+
+  def _write(self, content):
     output_file_path = self._filepath
     if self.kwargs.get('save_as_new', False):
       output_file_path = output_file_path + '.new'
     with codecs.open(output_file_path, encoding='utf-8', mode='w') as f:
-      f.write(self.content)
+      f.write(content)
     return output_file_path
 
   def SaveAndReload(self):
-    output_file_path = self.Save()
-    self.Load(self.parser, output_file_path)
+    """Save the file and reload it
+
+    Members the edits did not touch are kept from the current tree and only
+    the rest of the file is parsed again.
+    """
+    self._checkRead()
+    content, unchanged = self._modifiedContentAndUnchangedSpans()
+    output_file_path = self._write(content)
+    reparsed = None
+    if not self._failed_to_parse:
+      reparsed = _ReparseMembers(
+          self.parser, self._tree, self._source, content, unchanged)
+    if reparsed is None:
+      self.Load(self.parser, output_file_path)
+    else:
+      tree, shifts = reparsed
+      self._filepath = output_file_path
+      self._setTree(tree, content, shifts)
 
   def _locToNextElement(self, loc):
-    for i in self.element_list:
-      if self._lexposToLoc(i.lexpos) > loc:
-        return i
+    index = self._locations().FirstAfter(loc)
+    if index is not None:
+      return self.element_list[index]
 
   def _lexposToLoc(self, lex):
-    offset = 0
-    for i,j in self.offset_table.items():
-      if i <= lex:
-        offset += j
-    return offset+lex
+    return lex + self.offset_table.Sum(lex)
 
   def _removeElement(self, e):
-    return self._replaceString(r'.*', '', element=e, flags=re.DOTALL)
+    return self._replaceString(_ALL_PATTERN, '', element=e)
 
   def _isDeclaredLocally(self, method):
-    for declaration in self.main_element_table.get(model.MethodDeclaration, []):
-      if declaration.name == method.name:
-        return True
+    return method.name in self._symbols().declared_methods
 
   def _argumentIsFloatOrDouble(self, element):
     assert isinstance(element, model.MethodInvocation)
@@ -273,28 +1410,16 @@ class BaseAgent(object):
             _FLOAT_PATTERN.match(arg.rhs.value)):
           return True
       elif isinstance(arg, model.Name):
-        possible_vars = [
-            i for i in self.element_table.get(model.VariableDeclaration, []) if
-            i.variable_declarators[0].variable.name == arg.value and
-            i.lineno < arg.lineno]
-        if len(possible_vars) == 0:
+        declared_type = self._scopes().TypeOf(arg)
+        if declared_type is None:
+          return False
+        if _TypeName(declared_type) in _FLOAT_TYPES:
+          return True
+        if not isinstance(declared_type, model.Type):
           return False
-        current_var = possible_vars[0]
-        for i in possible_vars:
-          if arg.lineno - i.lineno < arg.lineno - current_var.lineno:
-            current_var = i
-        if isinstance(current_var.type, model.Type):
-          if current_var.type.name.value in ['Double', 'Float']:
-            return True
-        else:
-          if current_var.type in ['double', 'float', 'Double', 'Float']:
-            return True
-          else:
-            return False
       elif isinstance(arg, model.MethodInvocation):
-        if any(i for i in self.element_table[model.MethodDeclaration] if
-               i.name == arg.name and i.return_type in
-               ['double', 'float', 'Double', 'Float']):
+        if any(_TypeName(i) in _FLOAT_TYPES
+               for i in self._scopes().return_types.get(arg.name, [])):
           return True
     return False
 
@@ -304,57 +1429,64 @@ class BaseAgent(object):
       return False
     if self._isImportedStaticMethod(method):
       return False
-    for declaration in self.main_element_table[model.MethodDeclaration]:
-      if declaration.name == method.name:
-        return False
-    return True
+    return method.name not in self._symbols().declared_methods
 
-  def _insertInBetween(self, insertion, start, end):
-    self.content = (
-      self.content[:start] + insertion + self.content[end:])
+  def _insertInBetween(self, insertion, start, end, prepend=False):
+    self._replaceContent(start, end, insertion, prepend=prepend)
 
   def _insertBelow(self, element, partial_insertion, auto_indentation=True):
-    index = self._lexposToLoc(element.lexpos)
-    indentation = 0
-    while self.content[index] != '\n':
-      if self.content[index] == ' ':
-        indentation += 1
-      elif self.content[index] != ' ':
-        indentation = 0
-      index -= 1
-    index = self._lexposToLoc(element.lexpos)
-    while self.content[index] != '\n':
-      index += 1
+    loc = self._lexposToLoc(element.lexpos)
+    index = self.content.LineEnd(loc)
     if auto_indentation:
-      insertion = ' ' * indentation + partial_insertion + '\n'
+      insertion = (' ' * self.content.Indentation(loc) + partial_insertion
+                   + '\n')
     else:
       insertion = partial_insertion + '\n'
-    self._insertInBetween(insertion, index+1, index+1)
+    # Each insertion lands right below the line, ahead of earlier ones.
+    self._insertInBetween(insertion, index+1, index+1, prepend=True)
+    if self._edit_script is not None:
+      return
     next_element = self._findNextElementIndex(element)
     while self._lexposToLoc(next_element.lexpos) <= index:
       next_element = self._findNextElementIndex(next_element)
     self.offset_table[next_element.lexpos] += len(insertion)
 
   def _insertAbove(self, element, partial_insertion, auto_indentation=True):
-    index = self._lexposToLoc(element.lexpos)
-    indentation = 0
-    while self.content[index] != '\n':
-      if self.content[index] == ' ':
-        indentation += 1
-      elif self.content[index] != ' ':
-        indentation = 0
-      index -= 1
+    loc = self._lexposToLoc(element.lexpos)
+    if self._edit_script is not None:
+      loc = self._locAfterRemovedLine(loc)
+    index = self.content.LineStart(loc)
     if auto_indentation:
-      insertion = ' ' * indentation + partial_insertion + '\n'
+      insertion = (' ' * self.content.Indentation(loc) + partial_insertion
+                   + '\n')
     else:
       insertion = partial_insertion + '\n'
-    self._insertInBetween(insertion, index+1, index+1)
-    self.offset_table[element.lexpos] += len(insertion)
+    self._insertInBetween(insertion, index, index)
+    if self._edit_script is None:
+      self.offset_table[element.lexpos] += len(insertion)
+
+  def _locAfterRemovedLine(self, loc):
+    """Return where the element at loc starts once a removal at loc is done
+
+    With SaveAndReload, an element whose leading line was removed, such as a
+    class losing its first annotation, starts on the next line and lines are
+    inserted above that one. The edit script keeps original positions, so
+    the removed line is skipped here to give the same layout.
+    """
+    end = self._edit_script.RemovalEnd(loc)
+    if end is None:
+      return loc
+    line_end = self.content.LineEnd(end)
+    if self.content[end:line_end].strip() or line_end >= len(self.content):
+      return loc
+    line = self.content[line_end + 1:self.content.LineEnd(line_end + 1)]
+    return line_end + 1 + len(line) - len(line.lstrip(' '))
 
   def _insertInfront(self, element, insertion):
     index = self._lexposToLoc(element.lexpos)
     self._insertInBetween(insertion, index, index)
-    self.offset_table[element.lexpos] += len(insertion)
+    if self._edit_script is None:
+      self.offset_table[element.lexpos] += len(insertion)
 
   def _replaceString(self, pattern, replacement, element=None, optional=True,
                      start=None, end=None, flags=0, verbose=False, upper=False):
@@ -363,17 +1495,20 @@ class BaseAgent(object):
     if end is None:
       end = self._lexposToLoc(element.lexend)
     content_string = self.content[start:end+1]
-    search_res = re.search(pattern, content_string, flags=flags)
+    search_res = regex_registry.Search(pattern, content_string, flags=flags)
     if optional and search_res is None:
       return
     elif not optional and search_res is None:
       raise Exception('Element not found')
+    if self._edit_script is not None:
+      self._recordReplacement(pattern, replacement, content_string, search_res,
+                              start, flags=flags, verbose=verbose, upper=upper)
+      return content_string
     change_loc = start+search_res.start()
     content_replacement = _ReturnReplacement(
         pattern, replacement, content_string, flags=flags, upper=upper)
     next_element = self._locToNextElement(change_loc)
-    self.content = (
-        self.content[:start] + content_replacement + self.content[end+1:])
+    self._replaceContent(start, end+1, content_replacement)
     if verbose:
       logging.debug("Before: " + content_string)
       logging.debug("After : " + content_replacement)
@@ -383,62 +1518,154 @@ class BaseAgent(object):
           len(content_replacement) - len(content_string))
     return content_string
 
+  def _recordReplacement(self, pattern, replacement, content_string,
+                         search_res, start, flags=0, verbose=False,
+                         upper=False):
+    if isinstance(replacement, _SourceSpan):
+      _WarnIfFoundMoreThanOnce(
+          regex_registry.Compile(pattern, flags), content_string)
+      self._replaceContent(start+search_res.start(), start+search_res.end(),
+                           [replacement])
+      return
+    content_replacement = _ReturnReplacement(
+        pattern, replacement, content_string, flags=flags, upper=upper)
+    if verbose:
+      logging.debug("Before: " + content_string)
+      logging.debug("After : " + content_replacement)
+    if upper:
+      self._replaceContent(
+          start, start+len(content_string), content_replacement)
+      return
+    # Only the matched part changed, record just that so edits elsewhere in
+    # the element do not overlap this one.
+    tail = len(content_string) - search_res.end()
+    self._replaceContent(
+        start+search_res.start(), start+search_res.end(),
+        content_replacement[search_res.start():
+                            len(content_replacement)-tail])
+
   def _findNextElementIndex(self, element):
-    for i, j in enumerate(self.element_list):
-      if j == element:
-        if i == len(self.element_list) - 1:
-          #If it's the last element, return a sentinel
-          return model.SourceElement(
-              lineno = j.lineno+1, lexpos = len(self.content)-1)
-        else:
-          return self.element_list[i+1]
+    self._traverseTree()
+    position = self._element_positions.get(id(element))
+    if position is None:
+      return
+    i = position[0]
+    if i == len(self.element_list) - 1:
+      #If it's the last element, return a sentinel
+      return model.SourceElement(
+          lineno = element.lineno+1, lexpos = len(self.content)-1)
+    else:
+      return self.element_list[i+1]
 
   def _findNextParallelElementIndex(self, element):
-    for i, j in enumerate(self.element_table[type(element)]):
-      if j == element:
-        if i == len(self.element_table[type(element)]) - 1:
-          #If it's the last element, return a sentinel
-          return model.SourceElement(
-              lineno = j.lineno+1, lexpos = len(self.content)-1)
-        else:
-          return self.element_table[type(element)][i+1]
-    raise Exception('Element not found')
+    self._traverseTree()
+    position = self._element_positions.get(id(element))
+    if position is None or position[1] is None:
+      raise Exception('Element not found')
+    i = position[1]
+    if i == len(self.element_table[type(element)]) - 1:
+      #If it's the last element, return a sentinel
+      return model.SourceElement(
+          lineno = element.lineno+1, lexpos = len(self.content)-1)
+    else:
+      return self.element_table[type(element)][i+1]
+
+  def _enclosingElement(self, element, element_type, strict=False):
+    """Return the innermost main class element_type around element, or None
+
+    With strict the returned element has to start before and end after
+    element.
+    """
+    span_index = self._span_indexes.get(element_type)
+    if span_index is None:
+      span_index = _SpanIndex(self.main_element_table[element_type])
+      self._span_indexes[element_type] = span_index
+    return span_index.Enclosing(element, strict=strict)
+
+  def _symbols(self):
+    """Return the _SymbolIndex of the file as last loaded"""
+    if self._symbol_index is None:
+      self._symbol_index = _SymbolIndex(
+          self.element_table, self.main_element_table)
+    return self._symbol_index
+
+  def _scopes(self):
+    """Return the _ScopeTable of the file as last loaded"""
+    if self._scope_table is None:
+      self._scope_table = _ScopeTable(self._tree)
+    return self._scope_table
 
   def _addImport(self, package):
-    if package not in self._added_imports:
-      self._added_imports.append(package)
-      import_string = 'import ' +  package + ';'
-      if len(self.element_table[model.ImportDeclaration]) == 0:
-        self._insertBelow(
-            self.element_table[model.PackageDeclaration][0],
-            import_string)
-      else:
-        self._insertBelow(
-            self.element_table[model.ImportDeclaration][-1],
-            import_string)
+    """Import package, 'static ' in front for a static import
+
+    Nothing is written until the file is saved, see _rewriteImports.
+    """
+    self._import_additions.add(_ParseImport(package))
 
   def _isImportedType(self, type_element):
     assert isinstance(type_element, model.InstanceCreation)
-    for i in self.element_table[model.ImportDeclaration]:
-      if i.name.value.split('.')[-1] == type_element.type.name.value:
-        return True
-    return False
+    return type_element.type.name.value in self._symbols().imports
 
   def _isImportedStaticMethod(self, method):
     assert isinstance(method, model.MethodInvocation)
-    for i in self.element_table[model.ImportDeclaration]:
-      if i.name.value.split('.')[-1] == method.name:
-        return True
-    return False
+    # Any import counts, static or not, as it always has.
+    return method.name in self._symbols().imports
 
   def _removeImport(self, import_name):
-    start = self._lexposToLoc(
-        self.element_table[model.ImportDeclaration][0].lexpos)
-    end = self._lexposToLoc(
-        self.element_table[model.ImportDeclaration][-1].lexend)
-    self._replaceString(r'import.*%s; *\n' % import_name, '', start=start,
-                        end=end)
+    """Drop the imports of import_name, a qualified or simple name
+
+    Only imports already in the file are removed. Nothing is written until
+    the file is saved, see _rewriteImports.
+    """
+    self._import_removals.add(import_name)
+
+  def _rewriteImports(self):
+    """Apply the pending import additions and removals as a single edit
+
+    The import block is written out again in Chromium's import order. When
+    it has anything but imports in it, e.g. comments, it is kept as is and
+    removed imports are dropped and new ones appended instead.
+    """
+    additions, removals = self._import_additions, self._import_removals
+    if not additions and not removals:
+      return
+    self._import_additions, self._import_removals = set(), set()
+    declarations = self.element_table.get(model.ImportDeclaration)
+    if not declarations:
+      if additions:
+        self._insertBelow(self.element_table[model.PackageDeclaration][0],
+                          '\n' + _FormatImports(additions))
+      return
+    imports = set(_DeclaredImport(i) for i in declarations)
+    removed = set(i for i in imports if any(
+        _ImportMatches(i[1], import_name) for import_name in removals))
+    start = self._lexposToLoc(declarations[0].lexpos)
+    # The block ends with the semicolon of the last import.
+    end = self._lexposToLoc(declarations[-1].lexend) + 1
+    original = block = self.content[start:end]
+    if regex_registry.Sub(_IMPORT_STATEMENT_PATTERN, '', block).strip():
+      for static, name in removed:
+        block = regex_registry.Sub(
+            r'[ \t]*import\s+%s%s\s*;[ \t]*\n?' % (
+                r'static\s+' if static else '', re.escape(name)),
+            '', block)
+      new_imports = additions - imports
+      if new_imports:
+        block = block.rstrip() + '\n' + _FormatImports(new_imports)
+    else:
+      block = _FormatImports((imports - removed) | additions)
+    if block == original:
+      return
+    next_element = self._locToNextElement(end - 1)
+    self._replaceContent(start, end, block)
+    if self._edit_script is None and next_element is not None:
+      self.offset_table[next_element.lexpos] += len(block) - (end - start)
 
   def replaceYear(self):
     """Change copyright year to 2017"""
-    self.content = _YEAR_PATTERN.sub(r'\1 2015', self.content, count=1)
+    # The pattern is anchored at the start of the file, so only the head of
+    # the buffer needs to be matched.
+    match = _YEAR_PATTERN.match(self.content[:64])
+    if match:
+      self._replaceContent(
+          match.start(), match.end(), match.expand(r'\1 2015'))
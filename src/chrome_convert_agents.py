@@ -2,6 +2,7 @@
 
 import model
 import base_agent
+import regex_registry
 import test_convert_agent
 
 import re
@@ -14,8 +15,26 @@ _TOUCH_COMMON_METHOD_DICT = {
     'singleClickView': False
 }
 
+_PROTECTED_PATTERN = regex_registry.Register('protected')
+
+_OVERRIDE_PATTERN = regex_registry.Register(r' *@Override\n')
+
+_SUPER_SET_UP_PATTERN = regex_registry.Register(r' *super.setUp\(.*\); *\n')
+
+_SUPER_TEAR_DOWN_PATTERN = regex_registry.Register(
+    r' *super.tearDown\(.*\) *;\n')
+
+_START_MAIN_ACTIVITY_PATTERN = regex_registry.Register('startMainActivity')
+
+_SUPER_CONSTRUCTOR_ARGUMENT_PATTERN = regex_registry.Register(
+    r'.*super\((".*?")\);.*', re.DOTALL)
+
+_CLASS_HEADER_PATTERN = regex_registry.Register(r'^(public.*?) {', re.DOTALL)
+
 class MojoTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for MojoTestCase direct childrens"""
+  converted_super_class = "MojoTestCase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -30,7 +49,7 @@ class MojoTestAgent(test_convert_agent.TestConvertAgent):
     if 'abstract' in self.main_class.modifiers:
       self.logger.debug('Skip: %s is abstract class' % self._filepath)
       return True
-    if self.super_class_name != 'MojoTestCase':
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not MojoTestAgent direct children'
           % self._filepath)
       return True
@@ -87,12 +106,16 @@ class CronetTestAgent(test_convert_agent.TestConvertAgent):
     if 'abstract' in self.main_class.modifiers:
       self.logger.debug('Skip: %s is abstract class' % self._filepath)
       return True
-    if self.super_class_name not in ['CronetTestBase', 'CronetSmokeTestCase', 'NativeCronetTestCase']:
+    if self.super_class_name not in self.super_class_names():
       self.logger.debug('Skip: %s is not CronetTestAgent direct children'
           % self._filepath)
       return True
     return False
 
+  @classmethod
+  def super_class_names(cls):
+    return ['CronetTestBase', 'CronetSmokeTestCase', 'NativeCronetTestCase']
+
   @staticmethod
   def raw_api_mapping():
     return {
@@ -130,6 +153,8 @@ class CronetTestAgent(test_convert_agent.TestConvertAgent):
 
 class PartnerUnitTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for BasePartnerBrowserCustomizationUnitTest direct childrens"""
+  converted_super_class = "BasePartnerBrowserCustomizationUnitTest"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -148,7 +173,7 @@ class PartnerUnitTestAgent(test_convert_agent.TestConvertAgent):
     if 'abstract' in self.main_class.modifiers:
       self.logger.debug('Skip: %s is abstract class' % self._filepath)
       return True
-    if self.super_class_name != 'BasePartnerBrowserCustomizationUnitTest':
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not CronetTestAgent direct children'
           % self._filepath)
       return True
@@ -187,6 +212,8 @@ class PartnerUnitTestAgent(test_convert_agent.TestConvertAgent):
 
 class CrashTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for CrashTestCase direct childrens"""
+  converted_super_class = "CrashTestCase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -205,7 +232,7 @@ class CrashTestAgent(test_convert_agent.TestConvertAgent):
     if 'abstract' in self.main_class.modifiers:
       self.logger.debug('Skip: %s is abstract class' % self._filepath)
       return True
-    if self.super_class_name != 'CrashTestCase':
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not CronetTestAgent direct children'
           % self._filepath)
       return True
@@ -244,6 +271,9 @@ class CrashTestAgent(test_convert_agent.TestConvertAgent):
 
 class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
   """Agent for ChromeActivityTestCaseBase direct childrens"""
+  converted_super_class = "ChromeActivityTestCaseBase"
+  use_edit_script = True
+
   @staticmethod
   def class_runner():
     return ('ChromeJUnit4ClassRunner',
@@ -295,8 +325,8 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
       return ''
     start = self._lexposToLoc(m.body[0].lexpos)
     end = self._lexposToLoc(m.body[-1].lexend)
-    content = self.content[start:end+1]
-    self._replaceString(r'.*', '', element=m, flags=re.DOTALL)
+    content = self._copyContent(start, end+1)
+    self._removeElement(m)
     return content
 
   def _startActivityEmpty(self, declaration):
@@ -306,12 +336,12 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
       return False
 
   def _convertSetUp(self, m, replacement=''):
-    self._replaceString('protected', 'public', element=m, optional=True)
+    self._replaceString(_PROTECTED_PATTERN, 'public', element=m, optional=True)
     self._insertAbove(m, '@Before')
     self._addImport('org.junit.Before')
-    self._replaceString(r' *@Override\n', '', element=m, optional=True)
+    self._replaceString(_OVERRIDE_PATTERN, '', element=m, optional=True)
     self._replaceString(
-        r' *super.setUp\(.*\); *\n', replacement, element=m, optional=True)
+        _SUPER_SET_UP_PATTERN, replacement, element=m, optional=True)
 
   def addCommandLineFlags(self, template=None):
     if template is None:
@@ -358,10 +388,10 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
       else:
         self._insertAbove(start_m, '@Before')
         self._addImport('org.junit.Before')
-        self._replaceString(r' *@Override\n', '', element=start_m,
+        self._replaceString(_OVERRIDE_PATTERN, '', element=start_m,
                             optional=True)
-        self._replaceString('startMainActivity', 'setUp', element=start_m,
-                            optional=False)
+        self._replaceString(_START_MAIN_ACTIVITY_PATTERN, 'setUp',
+                            element=start_m, optional=False)
     else:
       # If startMainActivity() exist but is empty, remove it
       if start_m:
@@ -371,12 +401,13 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
 
     if methods.get('tearDown'):
       m = methods.get('tearDown')
-      self._replaceString('protected', 'public', element=m, optional=True)
+      self._replaceString(_PROTECTED_PATTERN, 'public', element=m,
+                          optional=True)
       self._insertAbove(m, '@After')
       self._addImport('org.junit.After')
-      self._replaceString(r' *@Override\n', '', element=m, optional=True)
+      self._replaceString(_OVERRIDE_PATTERN, '', element=m, optional=True)
       self._replaceString(
-          r' *super.tearDown\(.*\) *;\n', '', element=m, optional=True)
+          _SUPER_TEAR_DOWN_PATTERN, '', element=m, optional=True)
 
   def changeTouchCommonMethods(self):
     def _action(m):
@@ -410,9 +441,6 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
     #Change setup teardown to be public, remove @Override, add @Before @After
     self.changeSetUpTearDown()
 
-    #Save the file and re-parse it
-    self.SaveAndReload()
-
     #Change assertEquals, etc to Assert.assertEquals, import org.junit.Assert
     self.changeAssertions()
 
@@ -464,6 +492,8 @@ class ChromeActivityBaseCaseAgent(test_convert_agent.TestConvertAgent):
 
 class SyncTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for SyncTestBase direct childrens"""
+  converted_super_class = "SyncTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -483,7 +513,7 @@ class SyncTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "SyncTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not SyncTestBase children'
                        % self._filepath)
       return True
@@ -491,6 +521,8 @@ class SyncTestAgent(ChromeActivityBaseCaseAgent):
 
 class PartnerIntegrationTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for BasePartnerBrowserCustomizationIntegrationTest direct childrens"""
+  converted_super_class = "BasePartnerBrowserCustomizationIntegrationTest"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -510,7 +542,7 @@ class PartnerIntegrationTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "BasePartnerBrowserCustomizationIntegrationTest":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not BasePartnerBrowserCustomizationIntegrationTest children'
                        % self._filepath)
       return True
@@ -518,6 +550,8 @@ class PartnerIntegrationTestAgent(ChromeActivityBaseCaseAgent):
 
 class ChromeTabbedTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for ChromeTabbedTestCase direct childrens"""
+  converted_super_class = "ChromeTabbedActivityTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -537,7 +571,7 @@ class ChromeTabbedTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "ChromeTabbedActivityTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not ChromeTabbedActivityTestBase children'
                        % self._filepath)
       return True
@@ -545,6 +579,8 @@ class ChromeTabbedTestAgent(ChromeActivityBaseCaseAgent):
 
 class PermissionTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for PermissionTestBase direct childrens"""
+  converted_super_class = "PermissionTestCaseBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -564,7 +600,7 @@ class PermissionTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "PermissionTestCaseBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not PermissionTestCaseBase children'
                        % self._filepath)
       return True
@@ -573,6 +609,8 @@ class PermissionTestAgent(ChromeActivityBaseCaseAgent):
 
 class ChromeVrTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for VrTestBase direct childrens"""
+  converted_super_class = "VrTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -592,7 +630,7 @@ class ChromeVrTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "VrTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not VrTestBase children'
                        % self._filepath)
       return True
@@ -601,6 +639,7 @@ class ChromeVrTestAgent(ChromeActivityBaseCaseAgent):
 
 class MultiActivityTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for MultiActivityTestBase direct children"""
+  converted_super_class = "MultiActivityTestBase"
 
   @staticmethod
   def raw_api_mapping():
@@ -621,7 +660,7 @@ class MultiActivityTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "MultiActivityTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not MultiActivityTestBase children'
                        % self._filepath)
       return True
@@ -630,6 +669,8 @@ class MultiActivityTestAgent(ChromeActivityBaseCaseAgent):
 
 class PaymentRequestAgent(ChromeActivityBaseCaseAgent):
   """Agent for PaymentRequestTestBase direct childrens"""
+  converted_super_class = "PaymentRequestTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -649,7 +690,7 @@ class PaymentRequestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "PaymentRequestTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not PaymentRequestTestBase children'
                        % self._filepath)
       return True
@@ -657,17 +698,17 @@ class PaymentRequestAgent(ChromeActivityBaseCaseAgent):
 
   def removeConstructorParameterToRuleInsta(self):
     def _action(constu):
-      content = self._replaceString(r'.*', '', element=constu, flags=re.DOTALL)
-      argument = re.search(r'.*super\((".*?")\);.*', content, flags=re.DOTALL).group(1)
+      content = self._removeElement(constu)
+      argument = regex_registry.Search(
+          _SUPER_CONSTRUCTOR_ARGUMENT_PATTERN, content).group(1)
       self.rule_dict['modified_instan'] = self.rule_dict['instan'] % argument
     self.actionOnX(model.ConstructorDeclaration, action=_action)
 
   def implementMainActivityStartCallback(self):
     self._replaceString(
-        r'^(public.*?) {',
+        _CLASS_HEADER_PATTERN,
         r'\1 implements MainActivityStartCallback {',
-        element=self.main_class,
-        flags=re.DOTALL)
+        element=self.main_class)
 
   def actions(self):
     self.removeConstructorParameterToRuleInsta()
@@ -677,6 +718,8 @@ class PaymentRequestAgent(ChromeActivityBaseCaseAgent):
 
 class CastTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for CastTestBase direct childrens"""
+  converted_super_class = "CastTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -696,7 +739,7 @@ class CastTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "CastTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not CastTestBase children'
                        % self._filepath)
       return True
@@ -704,6 +747,8 @@ class CastTestAgent(ChromeActivityBaseCaseAgent):
 
 class ProviderTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for ProviderTestBase direct childrens"""
+  converted_super_class = "ProviderTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -723,7 +768,7 @@ class ProviderTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "ProviderTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not ProviderTestBase children'
                        % self._filepath)
       return True
@@ -731,6 +776,8 @@ class ProviderTestAgent(ChromeActivityBaseCaseAgent):
 
 class CustomTabActivityTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for CustomTabActivityTestBase direct childrens"""
+  converted_super_class = "CustomTabActivityTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -750,13 +797,16 @@ class CustomTabActivityTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "CustomTabActivityTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not CustomTabActivityTestBase children'
                        % self._filepath)
+      return True
     return super(CustomTabActivityTestAgent, self).skip()
 
 class NotificationTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for NotificationTestBase direct childrens"""
+  converted_super_class = "NotificationTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -776,7 +826,7 @@ class NotificationTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "NotificationTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not NotificationTestBase children'
                        % self._filepath)
       return True
@@ -784,6 +834,8 @@ class NotificationTestAgent(ChromeActivityBaseCaseAgent):
 
 class DownloadTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for DownloadTestBase direct childrens"""
+  converted_super_class = "DownloadTestBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -803,7 +855,7 @@ class DownloadTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "DownloadTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not DownloadTestBase children'
                        % self._filepath)
       return True
@@ -811,6 +863,8 @@ class DownloadTestAgent(ChromeActivityBaseCaseAgent):
 
 class BottomSheetTestAgent(ChromeActivityBaseCaseAgent):
   """Agent for BottomSheetTestCaseBase direct childrens"""
+  converted_super_class = "BottomSheetTestCaseBase"
+
   @staticmethod
   def raw_api_mapping():
     result_mapping = collections.OrderedDict()
@@ -830,7 +884,7 @@ class BottomSheetTestAgent(ChromeActivityBaseCaseAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "BottomSheetTestCaseBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not BottomSheetTestCaseBase children'
                        % self._filepath)
       return True
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Array backed form of a parsed java file, for analyses over many files
+
+A CompactTree keeps the kind, position, name and links of every node of a
+tree in flat arrays, about 30 bytes a node, and drops the model objects.
+Queries like BaseAgent.actionOnX run on the arrays. The model tree is only
+built again, by parsing the file, when an element is asked for.
+"""
+
+import model
+import parse_cache
+
+import array
+import operator
+
+# Names of all node classes, a node kind is an index into it. The list is
+# the same for every tree, so kinds can be compared across files.
+KINDS = tuple(sorted(
+    name for name, value in vars(model).iteritems()
+    if isinstance(value, type) and issubclass(value, model.SourceElement)))
+
+_KIND_INDEX = dict((name, i) for i, name in enumerate(KINDS))
+
+_CLASS_KINDS = frozenset([_KIND_INDEX['ClassDeclaration'],
+                          _KIND_INDEX['InterfaceDeclaration']])
+
+# Fields holding the string a node is looked up by, first one found wins.
+_NAME_FIELDS = ('name', 'value')
+
+_BY_INDEX_LEXPOS = operator.itemgetter(1, 0)
+
+
+def _Children(element):
+  """Return the child elements of element in field order"""
+  children = []
+  for f in element._fields:
+    value = getattr(element, f)
+    if type(value) is list:
+      children.extend(i for i in value if isinstance(i, model.SourceElement))
+    elif isinstance(value, model.SourceElement):
+      children.append(value)
+  return children
+
+
+def _PreOrder(tree):
+  """Yield (element, parent index) for the elements of tree, parents first"""
+  stack = [(tree, -1)]
+  index = 0
+  while stack:
+    element, parent = stack.pop()
+    yield element, parent
+    stack.extend((child, index) for child in reversed(_Children(element)))
+    index += 1
+
+
+def _NodeName(element):
+  for f in _NAME_FIELDS:
+    value = getattr(element, f, None)
+    if isinstance(value, basestring):
+      return value
+  return None
+
+
+def _KindOf(classtype):
+  if isinstance(classtype, basestring):
+    return _KIND_INDEX[classtype]
+  return _KIND_INDEX[classtype.__name__]
+
+
+class CompactNode(object):
+  """View of one node of a CompactTree"""
+
+  __slots__ = ('tree', 'index')
+
+  def __init__(self, tree, index):
+    self.tree = tree
+    self.index = index
+
+  def __repr__(self):
+    return 'CompactNode(%s, name=%r, lexpos=%d)' % (
+        self.kind, self.name, self.lexpos)
+
+  @property
+  def kind(self):
+    return KINDS[self.tree.kinds[self.index]]
+
+  @property
+  def name(self):
+    return self.tree.Name(self.index)
+
+  @property
+  def lexpos(self):
+    return self.tree.lexposes[self.index]
+
+  @property
+  def lexend(self):
+    return self.tree.lexends[self.index]
+
+  @property
+  def lineno(self):
+    return self.tree.linenos[self.index]
+
+  @property
+  def parent(self):
+    parent = self.tree.parents[self.index]
+    if parent >= 0:
+      return CompactNode(self.tree, parent)
+
+  @property
+  def children(self):
+    return [CompactNode(self.tree, i) for i in self.tree.Children(self.index)]
+
+  @property
+  def element(self):
+    """The model element of this node, parsing the file if needed"""
+    return self.tree.Element(self.index)
+
+
+class CompactTree(object):
+  """Nodes of a tree in pre-order, stored in arrays
+
+  For node i, kinds[i] indexes KINDS and names[i] indexes strings, or is -1
+  for nodes without a string name or value. parents, first_children and
+  next_siblings hold node indexes, -1 where there is none.
+  """
+
+  def __init__(self, filepath=None, java_parser=None):
+    self.filepath = filepath
+    self.kinds = array.array('B')
+    self.lexposes = array.array('i')
+    self.lexends = array.array('i')
+    self.linenos = array.array('i')
+    self.parents = array.array('i')
+    self.first_children = array.array('i')
+    self.next_siblings = array.array('i')
+    self.names = array.array('i')
+    # Number of classes and interfaces around each node, itself included.
+    self.class_depths = array.array('H')
+    self.strings = []
+    # Kind to the array of its nodes in lexpos order, and the same for the
+    # nodes inside exactly one class.
+    self._table = {}
+    self._main_table = {}
+    self._java_parser = java_parser
+    # The model elements by node index, once materialized.
+    self._elements = None
+
+  @classmethod
+  def FromTree(cls, tree, filepath=None, java_parser=None):
+    """Build the compact form of tree, parsed from filepath if given"""
+    compact = cls(filepath, java_parser)
+    if isinstance(tree, model.SourceElement):
+      compact._Build(tree)
+    return compact
+
+  def _Build(self, tree):
+    string_index = {}
+    last_children = []
+    for element, parent in _PreOrder(tree):
+      index = len(self.kinds)
+      kind = _KIND_INDEX[type(element).__name__]
+      self.kinds.append(kind)
+      self.lexposes.append(element.lexpos)
+      self.lexends.append(element.lexend)
+      self.linenos.append(element.lineno)
+      self.parents.append(parent)
+      self.first_children.append(-1)
+      self.next_siblings.append(-1)
+      last_children.append(-1)
+      name = _NodeName(element)
+      if name is None:
+        self.names.append(-1)
+      else:
+        if type(name) is str:
+          name = intern(name)
+        if name not in string_index:
+          string_index[name] = len(self.strings)
+          self.strings.append(name)
+        self.names.append(string_index[name])
+      depth = self.class_depths[parent] if parent >= 0 else 0
+      self.class_depths.append(depth + (kind in _CLASS_KINDS))
+      if parent >= 0:
+        previous = last_children[parent]
+        if previous < 0:
+          self.first_children[parent] = index
+        else:
+          self.next_siblings[previous] = index
+        last_children[parent] = index
+    self._BuildTables()
+
+  def _BuildTables(self):
+    by_kind = {}
+    for i, kind in enumerate(self.kinds):
+      by_kind.setdefault(kind, []).append((i, self.lexposes[i]))
+    single_class = sum(len(by_kind.get(k, ())) for k in _CLASS_KINDS) == 1
+    class_kind = _KIND_INDEX['ClassDeclaration']
+    for kind, nodes in by_kind.iteritems():
+      if kind == class_kind:
+        # Class lookups have always seen the interfaces too, as in
+        # base_agent._TraverseTree.
+        nodes = nodes + by_kind.get(_KIND_INDEX['InterfaceDeclaration'], [])
+      nodes.sort(key=_BY_INDEX_LEXPOS)
+      self._table[kind] = array.array('i', [i for i, _ in nodes])
+      if not single_class:
+        main = [i for i, lexpos in by_kind[kind]
+                if self.class_depths[i] == 1 and lexpos >= 0]
+        main.sort(key=lambda i: (self.lexposes[i], i))
+        if main:
+          self._main_table[kind] = array.array('i', main)
+    if single_class:
+      # With a single class the main table is the whole file.
+      self._main_table = self._table
+
+  def __len__(self):
+    return len(self.kinds)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_java_parser'] = None
+    state['_elements'] = None
+    return state
+
+  def Node(self, index):
+    return CompactNode(self, index)
+
+  def Name(self, index):
+    """Return the name or value string of node index, or None"""
+    name = self.names[index]
+    if name >= 0:
+      return self.strings[name]
+
+  def Children(self, index):
+    """Return the indexes of the children of node index, in order"""
+    children = []
+    child = self.first_children[index]
+    while child >= 0:
+      children.append(child)
+      child = self.next_siblings[child]
+    return children
+
+  def Nodes(self, classtype, main_table=False):
+    """Return the indexes of the nodes of classtype in lexpos order
+
+    classtype is a model class or its name.
+    """
+    table = self._main_table if main_table else self._table
+    return table.get(_KindOf(classtype), array.array('i'))
+
+  def ActionOnX(self, classtype, condition=None, optional=False,
+                main_table=False, action=None):
+    """Like BaseAgent.actionOnX, on CompactNodes instead of elements"""
+    indexes = self.Nodes(classtype, main_table=main_table)
+    if not indexes:
+      if optional:
+        return []
+      raise Exception('Did not find any this type of element in code')
+    nodes = [CompactNode(self, i) for i in indexes]
+    if condition:
+      nodes = [i for i in nodes if condition(i)]
+    if action:
+      for i in nodes:
+        action(i)
+    return nodes
+
+  def Materialize(self, java_parser=None):
+    """Return the model elements by node index, parsing the file once"""
+    if self._elements is None:
+      java_parser = java_parser or self._java_parser
+      if self.filepath is None or java_parser is None:
+        raise ValueError('Need a file and a parser to materialize elements')
+      tree = parse_cache.ParseFile(java_parser, self.filepath)
+      elements = [element for element, _ in _PreOrder(tree)] if isinstance(
+          tree, model.SourceElement) else []
+      if len(elements) != len(self) or any(
+          KINDS[kind] != type(element).__name__
+          for kind, element in zip(self.kinds, elements)):
+        raise ValueError('%s changed since it was loaded' % self.filepath)
+      self._elements = elements
+    return self._elements
+
+  def Element(self, index, java_parser=None):
+    return self.Materialize(java_parser)[index]
+
+  def Release(self):
+    """Drop the materialized elements"""
+    self._elements = None
+
+
+def Load(java_parser, filepath):
+  """Parse filepath, through the parse cache, into a CompactTree"""
+  tree = parse_cache.ParseFile(java_parser, filepath)
+  return CompactTree.FromTree(tree, filepath, java_parser)
@@ -12,6 +12,8 @@ import logging
 
 class ContentShellTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for ContentShellTestAgent direct childrens"""
+  converted_super_class = "ContentShellTestBase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -38,7 +40,7 @@ class ContentShellTestAgent(test_convert_agent.TestConvertAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "ContentShellTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not ContentShellTestBase children'
                        % self._filepath)
       return True
@@ -62,6 +64,8 @@ class ContentShellTestAgent(test_convert_agent.TestConvertAgent):
 
 class DialogOverlayImplTestAgent(ContentShellTestAgent):
   """Agent for DialogOverlayImplTestAgent direct childrens"""
+  converted_super_class = "DialogOverlayImplTestBase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -89,7 +93,7 @@ class DialogOverlayImplTestAgent(ContentShellTestAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "DialogOverlayImplTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not DialogOverlayImplTestBase children'
                        % self._filepath)
       return True
@@ -112,6 +116,8 @@ class DialogOverlayImplTestAgent(ContentShellTestAgent):
 
 class NativeLibraryTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for NativeLibraryTestAgent direct childrens"""
+  converted_super_class = "NativeLibraryTestBase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -138,7 +144,7 @@ class NativeLibraryTestAgent(test_convert_agent.TestConvertAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "NativeLibraryTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not NativeLibraryTestBase children'
                        % self._filepath)
       return True
@@ -162,6 +168,8 @@ class NativeLibraryTestAgent(test_convert_agent.TestConvertAgent):
 
 class ConnectivityCheckerTestAgent(NativeLibraryTestAgent):
   """Agent for ConnectivityCheckerTestAgent direct childrens"""
+  converted_super_class = "ConnectivityCheckerTestBase"
+
   @classmethod
   def ignore_files(cls):
     return []
@@ -183,7 +191,7 @@ class ConnectivityCheckerTestAgent(NativeLibraryTestAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "ConnectivityCheckerTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not ConnectivityCheckerTestBase children'
                        % self._filepath)
       return True
@@ -191,6 +199,8 @@ class ConnectivityCheckerTestAgent(NativeLibraryTestAgent):
 
 class SelectorObserverTest(test_convert_agent.TestConvertAgent):
   """Agent for SelectorObserverTestAgent direct childrens"""
+  converted_super_class = "TabModelSelectorObserverTestBase"
+
   @staticmethod
   def class_runner():
     return ('BaseJUnit4ClassRunner',
@@ -217,7 +227,7 @@ class SelectorObserverTest(test_convert_agent.TestConvertAgent):
     return result_mapping
 
   def skip(self):
-    if self.super_class_name != "TabModelSelectorObserverTestBase":
+    if self.super_class_name != self.converted_super_class:
       self.logger.debug('Skip: %s is not TabModelSelectorObserverTestBase children'
                        % self._filepath)
       return True
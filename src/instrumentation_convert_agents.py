@@ -29,6 +29,10 @@ class InstrumentationTestCaseAgent(test_convert_agent.TestConvertAgent):
   def raw_api_mapping():
     return {}
 
+  @classmethod
+  def super_class_names(cls):
+    return ['InstrumentationTestCase', 'AndroidTestCase', 'TestCase']
+
   def skip(self):
     if self.main_class is None:
       self.logger.debug('Skip: %s is not test java class' % self._filepath)
@@ -38,7 +42,7 @@ class InstrumentationTestCaseAgent(test_convert_agent.TestConvertAgent):
       if 'abstract' in self.main_class.modifiers:
         self.logger.debug('Skip: %s is abstract class' % self._filepath)
         return True
-    if self.super_class_name not in ['InstrumentationTestCase', 'AndroidTestCase', 'TestCase']:
+    if self.super_class_name not in self.super_class_names():
       self.logger.debug('Skip: %s is not InstrumentationTestCase direct children'
           % self._filepath)
       return True
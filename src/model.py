@@ -1,13 +1,135 @@
+def _slot_names(cls):
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(klass.__dict__.get('__slots__', ()))
+        names = _SLOT_NAMES[cls] = tuple(names)
+    return names
+
+# Node class to the names of all its slots, filled by _slot_names.
+_SLOT_NAMES = {}
+
+
+def _child_elements(value):
+    """Yield the SourceElements in a field value, looking into lists"""
+    if isinstance(value, SourceElement):
+        yield value
+    elif isinstance(value, list):
+        stack = [value]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, SourceElement):
+                yield current
+            elif isinstance(current, list):
+                stack.extend(current)
+
+
+def _hash_key(value):
+    if isinstance(value, SourceElement):
+        return value._structural_hash
+    if isinstance(value, list):
+        return tuple(_hash_key(i) for i in value)
+    return value
+
+
+def structurally_equal(a, b):
+    """Whether two nodes, lists or values have the same structure
+
+    Nodes are compared by type and fields, their positions are left out.
+    A node also matches one of a base class with the same fields, e.g. an
+    Additive matches a BinaryExpression. Hashes are neither computed nor
+    read, a cached one may be out of date if the tree was changed after it
+    was hashed.
+    """
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        if isinstance(a, SourceElement):
+            if not isinstance(b, SourceElement) or not (
+                    isinstance(a, type(b)) or isinstance(b, type(a))):
+                return False
+            stack.extend((getattr(a, f), getattr(b, f)) for f in a._fields)
+        elif isinstance(a, list):
+            if not isinstance(b, list) or len(a) != len(b):
+                return False
+            stack.extend(zip(a, b))
+        elif isinstance(b, (SourceElement, list)) or a != b:
+            return False
+    return True
+
+
+class LazyBody(object):
+    """
+    Statements of a method or constructor body, parsed when first read.
+
+    parse is called once, without arguments, and returns the statements.
+    """
+    __slots__ = ('_parse', '_statements')
+
+    def __init__(self, parse):
+        self._parse = parse
+        self._statements = None
+
+    def statements(self):
+        if self._parse is not None:
+            self._statements = self._parse()
+            self._parse = None
+        return self._statements
+
+
+def _lazy_field(slot):
+    """Property over slot that parses a LazyBody stored there on first read"""
+    def get(self):
+        value = getattr(self, slot)
+        if type(value) is LazyBody:
+            value = value.statements()
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+    return property(get, set)
+
+
+def is_parsed(element, field):
+    """Whether reading field of element can be done without parsing"""
+    return type(getattr(element, '_' + field, None)) is not LazyBody
+
+
+def parse_bodies(tree):
+    """Parse every lazy body left in tree"""
+    stack = [tree]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, SourceElement):
+            stack.extend(getattr(current, f) for f in current._fields)
+        elif isinstance(current, list):
+            stack.extend(current)
+
+
 # Base node
 class SourceElement(object):
     '''
     A SourceElement is the base class for all elements that occur in a Java
     file parsed by plyj.
+
+    Nodes use __slots__, the names of the child fields of a node type are
+    in its class level _fields.
+
+    Nodes compare and hash by identity, use structurally_equal and
+    structural_hash to compare their contents.
     '''
+    _fields = ()
+    # label is only set by the parser, on labeled statements. The slot is
+    # here rather than on Statement as VariableDeclaration derives from both
+    # Statement and FieldDeclaration.
+    __slots__ = ('lineno', 'lexpos', 'lexspan', 'label', '_structural_hash')
 
     def __init__(self, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(SourceElement, self).__init__()
-        self._fields = []
         self.lineno = lineno
         self.lexpos = lexpos
         self.lexspan = lexspan
@@ -22,20 +144,61 @@ class SourceElement(object):
         args = ", ".join(equals)
         return "{0}({1})".format(self.__class__.__name__, args)
 
-    def __eq__(self, other):
+    def __getstate__(self):
+        state = {}
+        for k in _slot_names(type(self)):
+            if k != '_structural_hash' and hasattr(self, k):
+                value = getattr(self, k)
+                if type(value) is LazyBody:
+                    value = value.statements()
+                state[k] = value
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
+    def structural_hash(self):
+        '''
+        Return a hash of the node type and fields, positions left out.
+
+        The hash is built bottom up from the hashes of the child nodes the
+        first time it is asked for and then cached on every node of the
+        subtree, so a node must not be changed once it has been hashed.
+        '''
         try:
-            return self.__dict__ == other.__dict__
+            return self._structural_hash
         except AttributeError:
-            return False
-
-    def __ne__(self, other):
-        return not self == other
+            pass
+        stack = [(self, False)]
+        while stack:
+            node, children_hashed = stack.pop()
+            if not children_hashed:
+                stack.append((node, True))
+                for f in node._fields:
+                    stack.extend((child, False)
+                                 for child in _child_elements(getattr(node, f))
+                                 if not hasattr(child, '_structural_hash'))
+            elif not hasattr(node, '_structural_hash'):
+                node._structural_hash = hash((type(node).__name__,) + tuple(
+                    _hash_key(getattr(node, f)) for f in node._fields))
+        return self._structural_hash
+
+    def structurally_equal(self, other):
+        '''
+        Whether other is a node of the same type with the same fields, all
+        the way down. Positions are not compared.
+        '''
+        return structurally_equal(self, other)
 
     def accept(self, visitor):
         """
         default implementation that visit the subnodes in the order
         they are stored in self_field
         """
+        if isinstance(visitor, DispatchVisitor):
+            visitor.walk(self)
+            return
         class_name = self.__class__.__name__
         visit = getattr(visitor, 'visit_' + class_name)
         if visit(self):
@@ -52,12 +215,13 @@ class SourceElement(object):
 
 
 class CompilationUnit(SourceElement):
+    _fields = (
+        'package_declaration', 'import_declarations', 'type_declarations')
+    __slots__ = _fields
 
     def __init__(self, package_declaration=None, import_declarations=None,
                  type_declarations=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(CompilationUnit, self).__init__(lineno, lexpos, lexspan)
-        self._fields = [
-            'package_declaration', 'import_declarations', 'type_declarations']
         if import_declarations is None:
             import_declarations = []
         if type_declarations is None:
@@ -67,10 +231,11 @@ class CompilationUnit(SourceElement):
         self.type_declarations = type_declarations
 
 class PackageDeclaration(SourceElement):
+    _fields = ('name', 'modifiers')
+    __slots__ = _fields
 
     def __init__(self, name, modifiers=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(PackageDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'modifiers']
         if modifiers is None:
             modifiers = []
         self.name = name
@@ -78,22 +243,24 @@ class PackageDeclaration(SourceElement):
 
 
 class ImportDeclaration(SourceElement):
+    _fields = ('name', 'static', 'on_demand')
+    __slots__ = _fields
 
     def __init__(self, name, static=False, on_demand=False, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ImportDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'static', 'on_demand']
         self.name = name
         self.static = static
         self.on_demand = on_demand
 
 
 class ClassDeclaration(SourceElement):
+    _fields = ('name', 'body', 'modifiers',
+               'type_parameters', 'extends', 'implements')
+    __slots__ = _fields
 
     def __init__(self, name, body, modifiers=None, type_parameters=None,
                  extends=None, implements=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ClassDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'body', 'modifiers',
-                        'type_parameters', 'extends', 'implements']
         if modifiers is None:
             modifiers = []
         if type_parameters is None:
@@ -108,20 +275,25 @@ class ClassDeclaration(SourceElement):
         self.implements = implements
 
 class ClassInitializer(SourceElement):
+    _fields = ('block', 'static')
+    __slots__ = _fields
 
     def __init__(self, block, static=False, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ClassInitializer, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['block', 'static']
         self.block = block
         self.static = static
 
 class ConstructorDeclaration(SourceElement):
+    _fields = ('name', 'block', 'modifiers',
+               'type_parameters', 'parameters', 'throws')
+    # block may be parsed lazily, see LazyBody.
+    __slots__ = ('name', '_block', 'modifiers',
+                 'type_parameters', 'parameters', 'throws')
+    block = _lazy_field('_block')
 
     def __init__(self, name, block, modifiers=None, type_parameters=None,
                  parameters=None, throws=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ConstructorDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'block', 'modifiers',
-                        'type_parameters', 'parameters', 'throws']
         if modifiers is None:
             modifiers = []
         if type_parameters is None:
@@ -136,13 +308,14 @@ class ConstructorDeclaration(SourceElement):
         self.throws = throws
 
 class EmptyDeclaration(SourceElement):
-    pass
+    __slots__ = ()
 
 class FieldDeclaration(SourceElement):
+    _fields = ('type', 'variable_declarators', 'modifiers')
+    __slots__ = _fields
 
     def __init__(self, type, variable_declarators, modifiers=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(FieldDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['type', 'variable_declarators', 'modifiers']
         if modifiers is None:
             modifiers = []
         self.type = type
@@ -150,14 +323,19 @@ class FieldDeclaration(SourceElement):
         self.modifiers = modifiers
 
 class MethodDeclaration(SourceElement):
+    _fields = ('name', 'modifiers', 'type_parameters', 'parameters',
+               'return_type', 'body', 'abstract', 'extended_dims',
+               'throws')
+    # body may be parsed lazily, see LazyBody.
+    __slots__ = ('name', 'modifiers', 'type_parameters', 'parameters',
+                 'return_type', '_body', 'abstract', 'extended_dims',
+                 'throws')
+    body = _lazy_field('_body')
 
     def __init__(self, name, modifiers=None, type_parameters=None,
                  parameters=None, return_type='void', body=None, abstract=False,
                  extended_dims=0, throws=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(MethodDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'modifiers', 'type_parameters', 'parameters',
-                        'return_type', 'body', 'abstract', 'extended_dims',
-                        'throws']
         if modifiers is None:
             modifiers = []
         if type_parameters is None:
@@ -175,10 +353,11 @@ class MethodDeclaration(SourceElement):
         self.throws = throws
 
 class FormalParameter(SourceElement):
+    _fields = ('variable', 'type', 'modifiers', 'vararg')
+    __slots__ = _fields
 
     def __init__(self, variable, type, modifiers=None, vararg=False, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(FormalParameter, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['variable', 'type', 'modifiers', 'vararg']
         if modifiers is None:
             modifiers = []
         self.variable = variable
@@ -194,36 +373,40 @@ class Variable(SourceElement):
     # type with two variable declarators;This closely resembles the source code.
     # If the variable is to go away, the type has to be duplicated for every
     # variable...
+    _fields = ('name', 'dimensions')
+    __slots__ = _fields
 
     def __init__(self, name, dimensions=0, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Variable, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'dimensions']
         self.name = name
         self.dimensions = dimensions
 
 
 class VariableDeclarator(SourceElement):
+    _fields = ('variable', 'initializer')
+    __slots__ = _fields
 
     def __init__(self, variable, initializer=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(VariableDeclarator, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['variable', 'initializer']
         self.variable = variable
         self.initializer = initializer
 
 class Throws(SourceElement):
+    _fields = ('types',)
+    __slots__ = _fields
 
     def __init__(self, types, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Throws, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['types']
         self.types = types
 
 class InterfaceDeclaration(SourceElement):
+    _fields = (
+        'name', 'modifiers', 'extends', 'type_parameters', 'body')
+    __slots__ = _fields
 
     def __init__(self, name, modifiers=None, extends=None, type_parameters=None,
                  body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(InterfaceDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = [
-            'name', 'modifiers', 'extends', 'type_parameters', 'body']
         if modifiers is None:
             modifiers = []
         if extends is None:
@@ -239,12 +422,13 @@ class InterfaceDeclaration(SourceElement):
         self.body = body
 
 class EnumDeclaration(SourceElement):
+    _fields = (
+        'name', 'implements', 'modifiers', 'type_parameters', 'body')
+    __slots__ = _fields
 
     def __init__(self, name, implements=None, modifiers=None,
                  type_parameters=None, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(EnumDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = [
-            'name', 'implements', 'modifiers', 'type_parameters', 'body']
         if implements is None:
             implements = []
         if modifiers is None:
@@ -260,10 +444,11 @@ class EnumDeclaration(SourceElement):
         self.body = body
 
 class EnumConstant(SourceElement):
+    _fields = ('name', 'arguments', 'modifiers', 'body')
+    __slots__ = _fields
 
     def __init__(self, name, arguments=None, modifiers=None, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(EnumConstant, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'arguments', 'modifiers', 'body']
         if arguments is None:
             arguments = []
         if modifiers is None:
@@ -276,13 +461,14 @@ class EnumConstant(SourceElement):
         self.body = body
 
 class AnnotationDeclaration(SourceElement):
+    _fields = (
+        'name', 'modifiers', 'type_parameters', 'extends', 'implements',
+        'body')
+    __slots__ = _fields
 
     def __init__(self, name, modifiers=None, type_parameters=None, extends=None,
                  implements=None, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(AnnotationDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = [
-            'name', 'modifiers', 'type_parameters', 'extends', 'implements',
-            'body']
         if modifiers is None:
             modifiers = []
         if type_parameters is None:
@@ -299,12 +485,13 @@ class AnnotationDeclaration(SourceElement):
         self.body = body
 
 class AnnotationMethodDeclaration(SourceElement):
+    _fields = ('name', 'type', 'parameters', 'default',
+               'modifiers', 'type_parameters', 'extended_dims')
+    __slots__ = _fields
 
     def __init__(self, name, type, parameters=None, default=None,
                  modifiers=None, type_parameters=None, extended_dims=0, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(AnnotationMethodDeclaration, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'type', 'parameters', 'default',
-                        'modifiers', 'type_parameters', 'extended_dims']
         if parameters is None:
             parameters = []
         if modifiers is None:
@@ -320,10 +507,11 @@ class AnnotationMethodDeclaration(SourceElement):
         self.extended_dims = extended_dims
 
 class Annotation(SourceElement):
+    _fields = ('name', 'members', 'single_member')
+    __slots__ = _fields
 
     def __init__(self, name, members=None, single_member=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Annotation, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'members', 'single_member']
         if members is None:
             members = []
         self.name = name
@@ -332,20 +520,22 @@ class Annotation(SourceElement):
 
 
 class AnnotationMember(SourceElement):
+    _fields = ('name', 'value')
+    __slots__ = _fields
 
     def __init__(self, name, value, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(AnnotationMember, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'value']
         self.name = name
         self.value = value
 
 
 class Type(SourceElement):
+    _fields = ('name', 'type_arguments', 'enclosed_in', 'dimensions')
+    __slots__ = _fields
 
     def __init__(self, name, type_arguments=None, enclosed_in=None,
                  dimensions=0, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Type, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'type_arguments', 'enclosed_in', 'dimensions']
         if type_arguments is None:
             type_arguments = []
         self.name = name
@@ -355,30 +545,33 @@ class Type(SourceElement):
 
 
 class Wildcard(SourceElement):
+    _fields = ('bounds',)
+    __slots__ = _fields
 
     def __init__(self, bounds=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Wildcard, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['bounds']
         if bounds is None:
             bounds = []
         self.bounds = bounds
 
 
 class WildcardBound(SourceElement):
+    _fields = ('type', 'extends', '_super')
+    __slots__ = _fields
 
     def __init__(self, type, extends=False, _super=False, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(WildcardBound, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['type', 'extends', '_super']
         self.type = type
         self.extends = extends
         self._super = _super
 
 
 class TypeParameter(SourceElement):
+    _fields = ('name', 'extends')
+    __slots__ = _fields
 
     def __init__(self, name, extends=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(TypeParameter, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'extends']
         if extends is None:
             extends = []
         self.name = name
@@ -386,105 +579,110 @@ class TypeParameter(SourceElement):
 
 
 class Expression(SourceElement):
+    __slots__ = ()
 
     def __init__(self, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Expression, self).__init__(lineno, lexpos, lexspan)
-        self._fields = []
 
 class BinaryExpression(Expression):
+    _fields = ('operator', 'lhs', 'rhs')
+    __slots__ = _fields
 
     def __init__(self, operator, lhs, rhs, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(BinaryExpression, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['operator', 'lhs', 'rhs']
         self.operator = operator
         self.lhs = lhs
         self.rhs = rhs
 
 class Assignment(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Conditional(Expression):
+    _fields = ('predicate', 'if_true', 'if_false')
+    __slots__ = _fields
 
     def __init__(self, predicate, if_true, if_false, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(self.__class__, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['predicate', 'if_true', 'if_false']
         self.predicate = predicate
         self.if_true = if_true
         self.if_false = if_false
 
 class ConditionalOr(BinaryExpression):
-    pass
+    __slots__ = ()
 
 class ConditionalAnd(BinaryExpression):
-    pass
+    __slots__ = ()
 
 class Or(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Xor(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class And(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Equality(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class InstanceOf(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Relational(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Shift(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Additive(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Multiplicative(BinaryExpression):
-    pass
+    __slots__ = ()
 
 
 class Unary(Expression):
+    _fields = ('sign', 'expression')
+    __slots__ = _fields
 
     def __init__(self, sign, expression, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Unary, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['sign', 'expression']
         self.sign = sign
         self.expression = expression
 
 
 class Cast(Expression):
+    _fields = ('target', 'expression')
+    __slots__ = _fields
 
     def __init__(self, target, expression, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Cast, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['target', 'expression']
         self.target = target
         self.expression = expression
 
 
 class Statement(SourceElement):
-    pass
+    __slots__ = ()
 
 class Empty(Statement):
-    pass
+    __slots__ = ()
 
 
 class Block(Statement):
+    _fields = ('statements',)
+    __slots__ = _fields
 
     def __init__(self, statements=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Statement, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['statements']
         if statements is None:
             statements = []
         self.statements = statements
@@ -494,21 +692,25 @@ class Block(Statement):
             yield s
 
 class VariableDeclaration(Statement, FieldDeclaration):
-    pass
+    __slots__ = ()
 
 class ArrayInitializer(SourceElement):
+    _fields = ('elements',)
+    __slots__ = _fields
+
     def __init__(self, elements=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ArrayInitializer, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['elements']
         if elements is None:
             elements = []
         self.elements = elements
 
 
 class MethodInvocation(Expression):
+    _fields = ('name', 'arguments', 'type_arguments', 'target')
+    __slots__ = _fields
+
     def __init__(self, name, arguments=None, type_arguments=None, target=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(MethodInvocation, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'arguments', 'type_arguments', 'target']
         if arguments is None:
             arguments = []
         if type_arguments is None:
@@ -519,37 +721,41 @@ class MethodInvocation(Expression):
         self.target = target
 
 class IfThenElse(Statement):
+    _fields = ('predicate', 'if_true', 'if_false')
+    __slots__ = _fields
 
     def __init__(self, predicate, if_true=None, if_false=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(IfThenElse, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['predicate', 'if_true', 'if_false']
         self.predicate = predicate
         self.if_true = if_true
         self.if_false = if_false
 
 class While(Statement):
+    _fields = ('predicate', 'body')
+    __slots__ = _fields
 
     def __init__(self, predicate, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(While, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['predicate', 'body']
         self.predicate = predicate
         self.body = body
 
 class For(Statement):
+    _fields = ('init', 'predicate', 'update', 'body')
+    __slots__ = _fields
 
     def __init__(self, init, predicate, update, body, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(For, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['init', 'predicate', 'update', 'body']
         self.init = init
         self.predicate = predicate
         self.update = update
         self.body = body
 
 class ForEach(Statement):
+    _fields = ('type', 'variable', 'iterable', 'body', 'modifiers')
+    __slots__ = _fields
 
     def __init__(self, type, variable, iterable, body, modifiers=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ForEach, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['type', 'variable', 'iterable', 'body', 'modifiers']
         if modifiers is None:
             modifiers = []
         self.type = type
@@ -560,87 +766,97 @@ class ForEach(Statement):
 
 
 class Assert(Statement):
+    _fields = ('predicate', 'message')
+    __slots__ = _fields
 
     def __init__(self, predicate, message=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Assert, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['predicate', 'message']
         self.predicate = predicate
         self.message = message
 
 
 class Switch(Statement):
+    _fields = ('expression', 'switch_cases')
+    __slots__ = _fields
 
     def __init__(self, expression, switch_cases, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Switch, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['expression', 'switch_cases']
         self.expression = expression
         self.switch_cases = switch_cases
 
 class SwitchCase(SourceElement):
+    _fields = ('cases', 'body')
+    __slots__ = _fields
 
     def __init__(self, cases, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(SwitchCase, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['cases', 'body']
         if body is None:
             body = []
         self.cases = cases
         self.body = body
 
 class DoWhile(Statement):
+    _fields = ('predicate', 'body')
+    __slots__ = _fields
 
     def __init__(self, predicate, body=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(DoWhile, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['predicate', 'body']
         self.predicate = predicate
         self.body = body
 
 
 class Continue(Statement):
+    _fields = ('label',)
+    __slots__ = ()
 
     def __init__(self, label=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Continue, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['label']
         self.label = label
 
 
 class Break(Statement):
+    _fields = ('label',)
+    __slots__ = ()
 
     def __init__(self, label=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Break, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['label']
         self.label = label
 
 
 class Return(Statement):
+    _fields = ('result',)
+    __slots__ = _fields
 
     def __init__(self, result=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Return, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['result']
         self.result = result
 
 
 class Synchronized(Statement):
+    _fields = ('monitor', 'body')
+    __slots__ = _fields
 
     def __init__(self, monitor, body, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Synchronized, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['monitor', 'body']
         self.monitor = monitor
         self.body = body
 
 
 class Throw(Statement):
+    _fields = ('exception',)
+    __slots__ = _fields
 
     def __init__(self, exception, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Throw, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['exception']
         self.exception = exception
 
 
 class Try(Statement):
+    _fields = ('block', 'catches', '_finally', 'resources')
+    __slots__ = _fields
 
     def __init__(self, block, catches=None, _finally=None, resources=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Try, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['block', 'catches', '_finally', 'resources']
         if catches is None:
             catches = []
         if resources is None:
@@ -661,10 +877,11 @@ class Try(Statement):
 
 
 class Catch(SourceElement):
+    _fields = ('variable', 'modifiers', 'types', 'block')
+    __slots__ = _fields
 
     def __init__(self, variable, modifiers=None, types=None, block=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Catch, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['variable', 'modifiers', 'types', 'block']
         if modifiers is None:
             modifiers = []
         if types is None:
@@ -676,10 +893,11 @@ class Catch(SourceElement):
 
 
 class Resource(SourceElement):
+    _fields = ('variable', 'type', 'modifiers', 'initializer')
+    __slots__ = _fields
 
     def __init__(self, variable, type=None, modifiers=None, initializer=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Resource, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['variable', 'type', 'modifiers', 'initializer']
         if modifiers is None:
             modifiers = []
         self.variable = variable
@@ -693,10 +911,11 @@ class ConstructorInvocation(Statement):
 
     This is a variant of either this() or super(), NOT a "new" expression.
     """
+    _fields = ('name', 'target', 'type_arguments', 'arguments')
+    __slots__ = _fields
 
     def __init__(self, name, target=None, type_arguments=None, arguments=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ConstructorInvocation, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'target', 'type_arguments', 'arguments']
         if type_arguments is None:
             type_arguments = []
         if arguments is None:
@@ -708,12 +927,13 @@ class ConstructorInvocation(Statement):
 
 
 class InstanceCreation(Expression):
+    _fields = (
+        'type', 'type_arguments', 'arguments', 'body', 'enclosed_in')
+    __slots__ = _fields
 
     def __init__(self, type, type_arguments=None, arguments=None, body=None,
                  enclosed_in=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(InstanceCreation, self).__init__(lineno, lexpos, lexspan)
-        self._fields = [
-            'type', 'type_arguments', 'arguments', 'body', 'enclosed_in']
         if type_arguments is None:
             type_arguments = []
         if arguments is None:
@@ -728,28 +948,31 @@ class InstanceCreation(Expression):
 
 
 class FieldAccess(Expression):
+    _fields = ('name', 'target')
+    __slots__ = _fields
 
     def __init__(self, name, target, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(FieldAccess, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['name', 'target']
         self.name = name
         self.target = target
 
 
 class ArrayAccess(Expression):
+    _fields = ('index', 'target')
+    __slots__ = _fields
 
     def __init__(self, index, target, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ArrayAccess, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['index', 'target']
         self.index = index
         self.target = target
 
 
 class ArrayCreation(Expression):
+    _fields = ('type', 'dimensions', 'initializer')
+    __slots__ = _fields
 
     def __init__(self, type, dimensions=None, initializer=None, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ArrayCreation, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['type', 'dimensions', 'initializer']
         if dimensions is None:
             dimensions = []
         self.type = type
@@ -758,26 +981,29 @@ class ArrayCreation(Expression):
 
 
 class Literal(SourceElement):
+    _fields = ('value',)
+    __slots__ = _fields
 
     def __init__(self, value, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Literal, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['value']
         self.value = value
 
 
 class ClassLiteral(SourceElement):
+    _fields = ('type',)
+    __slots__ = _fields
 
     def __init__(self, type, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ClassLiteral, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['type']
         self.type = type
 
 
 class Name(SourceElement):
+    _fields = ('value',)
+    __slots__ = _fields
 
     def __init__(self, value, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(Name, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['value']
         self.value = value
 
     def append_name(self, name):
@@ -788,9 +1014,11 @@ class Name(SourceElement):
 
 
 class ExpressionStatement(Statement):
+    _fields = ('expression',)
+    __slots__ = _fields
+
     def __init__(self, expression, lineno=-1, lexpos=-1, lexspan=(-1,-1)):
         super(ExpressionStatement, self).__init__(lineno, lexpos, lexspan)
-        self._fields = ['expression']
         self.expression = expression
 
 
@@ -810,3 +1038,94 @@ class Visitor(object):
                 print(msg.format(name, element))
             return True
         return f
+
+
+def _node_classes():
+    """Return SourceElement and all its subclasses"""
+    classes = set()
+    stack = [SourceElement]
+    while stack:
+        cls = stack.pop()
+        if cls not in classes:
+            classes.add(cls)
+            stack.extend(cls.__subclasses__())
+    return classes
+
+# Visitor class to its dispatch table, filled by DispatchVisitor._table.
+_DISPATCH_TABLES = {}
+
+
+class DispatchVisitor(Visitor):
+    '''
+    Visitor with its visit_ and leave_ methods looked up once per visitor
+    class, in a table from node class to the two functions.
+
+    walk, which accept calls for these visitors, goes through the tree with
+    a stack instead of recursion, so deep expression chains are fine. Nodes
+    are visited in the same order as by SourceElement.accept.
+    '''
+
+    @classmethod
+    def _table(cls):
+        table = _DISPATCH_TABLES.get(cls)
+        if table is None:
+            table = _DISPATCH_TABLES[cls] = {}
+            for node_class in _node_classes():
+                cls._dispatch(node_class, table)
+        return table
+
+    @classmethod
+    def _dispatch(cls, node_class, table):
+        # Class attributes only, Visitor.__getattr__ answers for instances.
+        # The plain functions are stored, calling them skips the self check
+        # of unbound methods.
+        name = node_class.__name__
+        entry = table[node_class] = tuple(
+            getattr(method, '__func__', method) for method in (
+                getattr(cls, 'visit_' + name, None),
+                getattr(cls, 'leave_' + name, None)))
+        return entry
+
+    def _default(self, prefix, element):
+        if self.verbose:
+            Visitor.__getattr__(self, prefix + type(element).__name__)(element)
+        return True
+
+    def walk(self, tree):
+        table = self._table()
+        source_element = SourceElement
+        stack = [tree] if isinstance(tree, SourceElement) else []
+        pop, push = stack.pop, stack.append
+        while stack:
+            current = pop()
+            if type(current) is tuple:
+                # The children of current[0] are done.
+                element = current[0]
+                leave = table[type(element)][1]
+                if leave is None:
+                    self._default('leave_', element)
+                else:
+                    leave(self, element)
+                continue
+            element_type = type(current)
+            visit, leave = (table.get(element_type) or
+                            self._dispatch(element_type, table))
+            if leave is not None or self.verbose:
+                push((current,))
+            if visit is None:
+                keep_going = self._default('visit_', current)
+            else:
+                keep_going = visit(self, current)
+            if not keep_going:
+                continue
+            children = []
+            for f in current._fields:
+                field = getattr(current, f)
+                if field:
+                    if type(field) is list:
+                        children.extend(i for i in field
+                                        if isinstance(i, source_element))
+                    elif isinstance(field, source_element):
+                        children.append(field)
+            children.reverse()
+            stack.extend(children)
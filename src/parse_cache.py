@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+import model
+import parser
+
+import cPickle
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+import ply
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'junit-auto-migrate', 'parse')
+
+_DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_CACHE_SUFFIX = '.tree'
+
+_default_cache = None
+
+# Files found to use Java 8 syntax in this run, path to (size, mtime, line).
+_java8_files = {}
+
+
+def _SourceDigest(module):
+  path = os.path.splitext(module.__file__)[0] + '.py'
+  if not os.path.exists(path):
+    path = module.__file__
+  with open(path, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()
+
+
+def GrammarVersion():
+  """Return a string that changes whenever a cached tree may be stale"""
+  return '-'.join(
+      [ply.__version__, _SourceDigest(parser), _SourceDigest(model)])
+
+
+class ParseCache(object):
+  """On-disk cache of parsed trees keyed by source content and grammar
+
+  Entries are zlib compressed pickles. The mtime of an entry is bumped on
+  every hit, so once the cache grows past max_bytes the least recently used
+  entries are evicted first.
+  """
+
+  def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+               max_bytes=_DEFAULT_MAX_BYTES):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self._version = GrammarVersion()
+    self._total_bytes = None
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+
+  def Key(self, source, header=False):
+    kind = 'header\0' if header else ''
+    if isinstance(source, unicode):
+      source = source.encode('utf-8')
+    return hashlib.sha1(self._version + '\0' + kind + source).hexdigest()
+
+  def _EntryPath(self, key):
+    return os.path.join(self.cache_dir, key + _CACHE_SUFFIX)
+
+  def _Entries(self):
+    entries = []
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith(_CACHE_SUFFIX):
+        continue
+      path = os.path.join(self.cache_dir, name)
+      try:
+        stat = os.stat(path)
+      except OSError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+  def Get(self, key):
+    """Return (True, tree) on a hit and (False, None) on a miss"""
+    path = self._EntryPath(key)
+    try:
+      with open(path, 'rb') as f:
+        data = f.read()
+      tree = cPickle.loads(zlib.decompress(data))
+    except (IOError, OSError):
+      return False, None
+    except Exception:
+      logging.debug('Dropping unreadable parse cache entry %s', path)
+      self._Remove(path)
+      return False, None
+    try:
+      os.utime(path, None)
+    except OSError:
+      pass
+    return True, tree
+
+  def Put(self, key, tree):
+    try:
+      data = zlib.compress(cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL))
+    except RuntimeError:
+      logging.debug('Tree is too deep to be cached')
+      return
+    fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+      f.write(data)
+    os.rename(temp_path, self._EntryPath(key))
+    if self._total_bytes is None:
+      self._total_bytes = sum(size for _, size, _ in self._Entries())
+    else:
+      self._total_bytes += len(data)
+    if self._total_bytes > self.max_bytes:
+      self.Evict()
+
+  def _Remove(self, path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  def Evict(self):
+    """Remove least recently used entries until the cache is under its cap"""
+    entries = sorted(self._Entries())
+    self._total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+      if self._total_bytes <= self.max_bytes:
+        break
+      self._Remove(path)
+      self._total_bytes -= size
+
+  def Parse(self, java_parser, source, header=False, lazy_bodies=False):
+    """Return the cached tree of source, parsing it on a miss
+
+    With lazy_bodies a miss is parsed lazily and not cached, as pickling
+    the tree would parse every body.
+    """
+    key = self.Key(source, header)
+    hit, tree = self.Get(key)
+    if not hit:
+      tree = _Parse(java_parser, source, header, lazy_bodies)
+      if not lazy_bodies:
+        self.Put(key, tree)
+    return tree
+
+
+def SetDefaultCache(cache):
+  """Set the cache used by ParseFile and ParseSource, None disables
+  caching"""
+  global _default_cache
+  _default_cache = cache
+
+
+def _Parse(java_parser, source, header, lazy_bodies=False):
+  if header:
+    return java_parser.parse_header(source)
+  if lazy_bodies:
+    return java_parser.parse_string(source, lazy_bodies=True)
+  return java_parser.parse_string(source)
+
+
+def ParseSource(java_parser, source, header=False, lazy_bodies=False):
+  """Parse source through the default cache
+
+  source is not scanned for Java 8 syntax, it is meant for text LoadFile
+  already scanned, see IsJava8File.
+  """
+  if _default_cache is None:
+    return _Parse(java_parser, source, header, lazy_bodies)
+  return _default_cache.Parse(java_parser, source, header, lazy_bodies)
+
+
+def _IsKnownJava8File(filepath, stat):
+  known = _java8_files.get(filepath)
+  return known is not None and known[:2] == (stat.st_size, stat.st_mtime)
+
+
+def _ParseRead(java_parser, filepath, stat, source, header, lazy_bodies):
+  """Parse source as read from filepath, remembering Java 8 files"""
+  position = parser.find_java8_syntax(source)
+  if position is not None:
+    line = source.count('\n', 0, position) + 1
+    logging.debug('%s:%d: Java 8 syntax, not parsing', filepath, line)
+    _java8_files[filepath] = (stat.st_size, stat.st_mtime, line)
+    return None
+  _java8_files.pop(filepath, None)
+  return ParseSource(java_parser, source, header, lazy_bodies)
+
+
+def ParseFile(java_parser, filepath, header=False, lazy_bodies=False):
+  """Parse filepath, only the headers of its types with header
+
+  Files with Java 8 syntax, which the grammar does not cover, are not
+  parsed and give None. They are remembered until they change, see
+  Java8Files.
+  """
+  return LoadFile(java_parser, filepath, header, lazy_bodies)[0]
+
+
+def LoadFile(java_parser, filepath, header=False, lazy_bodies=False):
+  """Return the tree of filepath, as ParseFile does, and its text
+
+  The file is read and decoded once, the lexpos values of the tree index
+  into the text. Known Java 8 files are not read and give (None, None).
+  """
+  stat = os.stat(filepath)
+  if _IsKnownJava8File(filepath, stat):
+    return None, None
+  source = parser.read_source(filepath)
+  return _ParseRead(java_parser, filepath, stat, source, header,
+                    lazy_bodies), source
+
+
+def IsJava8File(filepath):
+  """Return whether filepath was found to use Java 8 syntax when loaded"""
+  return filepath in _java8_files
+
+
+def Java8Files():
+  """Return {path: (size, mtime, line)} of the files found to use Java 8
+  syntax, line being where it is first used"""
+  return dict(_java8_files)
+
+
+def MergeJava8Files(files):
+  """Add files from another process, as returned by its Java8Files()"""
+  _java8_files.update(files)
+
+
+def Java8Report():
+  """Return report lines for the files skipped for Java 8 syntax"""
+  if not _java8_files:
+    return []
+  lines = ['Skipped %d files with Java 8 syntax:' % len(_java8_files)]
+  for path, (_, _, line) in sorted(_java8_files.iteritems()):
+    lines.append('  %s:%d' % (path, line))
+  return lines
@@ -2,10 +2,18 @@
 
 import ply.lex as lex
 import ply.yacc as yacc
+import functools
 import logging
+import re
 
 from model import *
 
+def _print_illegal_character(char, lineno):
+    # Unicode input comes from decoding a file, print the character encoded.
+    print("Illegal character '{}' ({}) in line {}".format(
+        char.encode('utf-8') if isinstance(char, unicode) else char,
+        hex(ord(char)), lineno))
+
 class MyLexer(object):
 
     keywords = ('this', 'class', 'void', 'super', 'extends', 'implements', 'enum', 'interface',
@@ -97,9 +105,137 @@ class MyLexer(object):
         t.lexer.lineno += len(t.value) / 2
 
     def t_error(self, t):
-        print("Illegal character '{}' ({}) in line {}".format(t.value[0], hex(ord(t.value[0])), t.lexer.lineno))
+        _print_illegal_character(t.value[0], t.lexer.lineno)
         t.lexer.skip(1)
 
+_KEYWORDS = frozenset(MyLexer.keywords)
+
+# Rules of MyLexer matched by their regex rather than their text.
+_PATTERN_TOKENS = ('NUM', 'STRING_LITERAL', 'CHAR_LITERAL')
+
+def _operator_types():
+    """Map the text of each operator and literal of MyLexer to its type"""
+    types = dict((c, c) for c in MyLexer.literals)
+    for name in MyLexer.tokens:
+        rule = getattr(MyLexer, 't_' + name, None)
+        if isinstance(rule, str) and name not in _PATTERN_TOKENS:
+            types[re.sub(r'\\(.)', r'\1', rule)] = name
+    return types
+
+_OPERATOR_TYPES = _operator_types()
+
+# Operator text to the (str value, type) of its token.
+_OPERATOR_TOKENS = dict((text, (text, name))
+                        for text, name in _OPERATOR_TYPES.iteritems())
+
+# The rules of MyLexer in one alternation. Whitespace, newlines and
+# comments are one 'ignore' group, operators and literals one 'operator'
+# group, longest first, which is the order PLY tries them in as well.
+# Anything else is an 'error' of one character.
+_TOKEN_PATTERN = re.compile('|'.join([
+    r'(?P<ignore>(?:[ \t\f\n]|\r\n|//.*|/\*[\s\S]*?\*/)+)',
+    '(?P<NAME>%s)' % MyLexer.t_NAME.__doc__,
+] + ['(?P<%s>%s)' % (name, getattr(MyLexer, 't_' + name))
+     for name in _PATTERN_TOKENS] + [
+    '(?P<operator>%s)' % '|'.join(
+        re.escape(i) for i in sorted(_OPERATOR_TYPES, key=len, reverse=True)),
+    r'(?P<error>[\s\S])',
+]))
+
+class FastLexer(object):
+    """
+    Lexer giving the same tokens as the PLY lexer built from MyLexer.
+
+    All rules are matched by one regex and there is no Python call per
+    token: the parser calls the next method of a generator directly.
+    Identifiers are interned, and they and operators are str even when the
+    input is unicode, as they are ASCII. Tokens are lex.LexToken with the
+    same type, value, lineno and lexpos, and lexpos and lineno of the lexer
+    follow the PLY lexer too, as yacc reads them for the positions of empty
+    rules.
+    """
+
+    def __init__(self):
+        self.lexdata = None
+        self._lexpos = 0
+        self._lineno = 1
+        self._restart()
+
+    def input(self, data):
+        if not isinstance(data, basestring):
+            raise ValueError('Expected a string')
+        self.lexdata = data
+        self._lexpos = 0
+        self._restart()
+
+    @property
+    def lexpos(self):
+        return self._lexpos
+
+    @lexpos.setter
+    def lexpos(self, lexpos):
+        self._lexpos = lexpos
+        self._restart()
+
+    @property
+    def lineno(self):
+        return self._lineno
+
+    @lineno.setter
+    def lineno(self, lineno):
+        self._lineno = lineno
+        self._restart()
+
+    def _restart(self):
+        # Read by yacc once per parse, so bound after every position change.
+        self.token = self._tokens(self.lexdata, self._lexpos,
+                                  self._lineno).next
+
+    def __iter__(self):
+        return iter(self.token, None)
+
+    def _tokens(self, lexdata, lexpos, lineno):
+        """Yield the tokens of lexdata from lexpos, then None forever"""
+        if lexdata is None:
+            raise RuntimeError('No input string given with input()')
+        LexToken = lex.LexToken
+        operator_tokens = _OPERATOR_TOKENS
+        # Identifier to its interned value and type.
+        names = {}
+        for match in _TOKEN_PATTERN.finditer(lexdata, lexpos):
+            kind = match.lastgroup
+            value = match.group()
+            if kind == 'NAME':
+                name = names.get(value)
+                if name is None:
+                    value = intern(str(value))
+                    name = names[value] = (
+                        value, value.upper() if value in _KEYWORDS else 'NAME')
+                value, kind = name
+            elif kind == 'operator':
+                value, kind = operator_tokens[value]
+            elif kind == 'ignore':
+                newlines = value.count('\n')
+                if newlines:
+                    lineno += newlines
+                    self._lineno = lineno
+                continue
+            elif kind == 'error':
+                _print_illegal_character(value, lineno)
+                continue
+            token = LexToken()
+            token.type = kind
+            token.value = value
+            token.lineno = lineno
+            token.lexpos = match.start()
+            self._lexpos = match.end()
+            yield token
+        lexpos = max(lexpos, len(lexdata))
+        while True:
+            lexpos += 1
+            self._lexpos = lexpos
+            yield None
+
 class ExpressionParser(object):
 
     def p_expression(self, p):
@@ -2008,10 +2144,180 @@ class MyParser(ExpressionParser, NameParser, LiteralParser, TypeParser, ClassPar
     def p_empty(self, p):
         '''empty :'''
 
+def _header_tokens(lexer):
+    """Yield the tokens of lexer, leaving out what is inside type bodies
+
+    A '{' outside of parentheses at the top level opens a type body, the
+    tokens up to its matching '}' are dropped. Parentheses keep array
+    values of annotations, e.g. @A({1, 2}), from counting as bodies.
+    """
+    parens = 0
+    depth = 0
+    for token in lexer:
+        t = token.type
+        if depth:
+            if t == '{':
+                depth += 1
+            elif t == '}':
+                depth -= 1
+                if not depth:
+                    yield token
+            continue
+        if t == '(':
+            parens += 1
+        elif t == ')':
+            parens -= 1
+        elif t == '{' and not parens:
+            depth = 1
+        yield token
+
+# Comments, string and char literals, or a lambda arrow or method
+# reference in the code around them.
+_JAVA8_PATTERN = re.compile(
+    r"""//[^\n]*|/\*.*?\*/|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|(->|::)""",
+    re.DOTALL)
+
+def find_java8_syntax(code):
+    """Return the position of the first -> or :: in code, or None
+
+    Those only occur in Java 8 syntax, which the grammar does not cover.
+    Comments and literals are skipped over.
+    """
+    if '->' not in code and '::' not in code:
+        return None
+    for match in _JAVA8_PATTERN.finditer(code):
+        if match.group(1):
+            return match.start()
+    return None
+
+# Tokens that start the body of a type declaration at the next '{'.
+_TYPE_KEYWORDS = frozenset(['CLASS', 'INTERFACE', 'ENUM'])
+
+def _lazy_body_tokens(lexer, bodies):
+    """Yield the tokens of lexer, leaving out what is inside the bodies of
+    methods and constructors
+
+    Only '{' and '}' of a body are kept. bodies maps the lexpos of each
+    such '}' to the lexpos and lineno of its '{'.
+
+    At the top level of a class or interface body, a '{' after ')' or a
+    throws clause, with no '=' in between, starts a method or constructor
+    body. Everything else, like initializers, anonymous classes and enum
+    constants, is kept.
+    """
+    # Kind of every open '{': 'type', 'enum' before the first ';' of an
+    # enum body, or 'other'.
+    kinds = []
+    parens = 0
+    assigned = throws = type_body_next = False
+    last = None
+    skipped = 0
+    start = None
+    for token in lexer:
+        t = token.type
+        if skipped:
+            if t == '{':
+                skipped += 1
+            elif t == '}':
+                skipped -= 1
+                if not skipped:
+                    bodies[token.lexpos] = start
+                    yield token
+                    assigned = throws = type_body_next = False
+                    last = None
+            continue
+        if kinds and kinds[-1] == 'other':
+            if t == '{':
+                kinds.append('other')
+            elif t == '}':
+                kinds.pop()
+                if not kinds or kinds[-1] != 'other':
+                    last = None
+            yield token
+            continue
+        # The top level or the top level of a type body.
+        if t == '(':
+            parens += 1
+        elif t == ')':
+            parens -= 1
+        elif parens:
+            pass
+        elif t == '{':
+            kind = 'other'
+            if type_body_next:
+                kind = 'enum' if type_body_next == 'ENUM' else 'type'
+            elif (kinds and kinds[-1] == 'type' and not assigned and
+                  (last == ')' or throws)):
+                skipped = 1
+                start = (token.lexpos, token.lineno)
+                yield token
+                continue
+            kinds.append(kind)
+            assigned = throws = type_body_next = False
+            last = None
+            yield token
+            continue
+        elif t == '}':
+            if kinds:
+                kinds.pop()
+            assigned = throws = type_body_next = False
+        elif t == ';':
+            if kinds and kinds[-1] == 'enum':
+                kinds[-1] = 'type'
+            assigned = throws = type_body_next = False
+        elif t == '=':
+            assigned = True
+        elif t == 'THROWS':
+            throws = True
+        elif t in _TYPE_KEYWORDS:
+            type_body_next = t
+        last = t
+        yield token
+
+def _body_tokens(lexer, lexpos, lineno):
+    """Yield a '*' then the tokens of lexer from the block at lexpos"""
+    token = lex.LexToken()
+    token.type = token.value = '*'
+    token.lexpos = lexpos
+    token.lineno = lineno
+    yield token
+    depth = 0
+    for token in lexer:
+        yield token
+        if token.type == '{':
+            depth += 1
+        elif token.type == '}':
+            depth -= 1
+            if not depth:
+                return
+
+def iter_tokens(source, lineno=1):
+    """Yield the tokens of source, as the parser gets them
+
+    The tokens come from a lexer of their own, so they can be read while
+    a Parser is in use.
+    """
+    lexer = FastLexer()
+    lexer.lineno = lineno
+    lexer.input(source)
+    for token in lexer:
+        yield token
+
+def read_source(path):
+    """Return the text of the file at path, read once and decoded as UTF-8
+
+    Positions in the tokens and trees of the text index into it.
+    """
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
 class Parser(object):
 
-    def __init__(self, errorlog=logging.getLogger()):
-        self.lexer = lex.lex(module=MyLexer(), optimize=1)
+    def __init__(self, errorlog=logging.getLogger(), fast_lexer=True):
+        if fast_lexer:
+            self.lexer = FastLexer()
+        else:
+            self.lexer = lex.lex(module=MyLexer(), optimize=1)
         self.parser = yacc.yacc(module=MyParser(), start='goal', optimize=1,
                                 errorlog=errorlog)
 
@@ -2022,11 +2328,8 @@ class Parser(object):
 
     def tokenize_file(self, _file):
         if type(_file) == str:
-            _file = open(_file)
-        content = ''
-        for line in _file:
-            content += line
-        return self.tokenize_string(content)
+            return self.tokenize_string(read_source(_file))
+        return self.tokenize_string(_file.read())
 
     def parse_expression(self, code, debug=0, lineno=1):
         return self.parse_string(code, debug, lineno, prefix='--')
@@ -2034,15 +2337,81 @@ class Parser(object):
     def parse_statement(self, code, debug=0, lineno=1):
         return self.parse_string(code, debug, lineno, prefix='* ')
 
-    def parse_string(self, code, debug=0, lineno=1, prefix='++'):
+    def parse_string(self, code, debug=0, lineno=1, prefix='++',
+                     lazy_bodies=False):
+        """Parse code, see _parse_lazily for lazy_bodies"""
+        if lazy_bodies:
+            return self._parse_lazily(prefix + code, debug, lineno)
         self.lexer.lineno = lineno
         return self.parser.parse(prefix + code, lexer=self.lexer, debug=debug, tracking=True)
 
+    def _parse_lazily(self, code, debug, lineno):
+        """
+        Parse code leaving the bodies of methods and constructors for later.
+
+        The bodies are only lexed. Each one is parsed from its token range
+        the first time MethodDeclaration.body or ConstructorDeclaration.block
+        is read, see model.LazyBody. A body that fails to parse then comes
+        out empty.
+        """
+        self.lexer.lineno = lineno
+        bodies = {}
+        tokens = _lazy_body_tokens(self.lexer, bodies)
+        tree = self.parser.parse(code, lexer=self.lexer, debug=debug,
+                                 tracking=True,
+                                 tokenfunc=lambda: next(tokens, None))
+        if not bodies:
+            return tree
+        stack = [tree]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, list):
+                stack.extend(current)
+                continue
+            if not isinstance(current, SourceElement):
+                continue
+            field = None
+            if isinstance(current, MethodDeclaration):
+                field = '_body'
+            elif isinstance(current, ConstructorDeclaration):
+                field = '_block'
+            if field is not None and current.lexend in bodies:
+                stack.extend(getattr(current, f) for f in current._fields
+                             if f not in ('body', 'block'))
+                setattr(current, field, LazyBody(functools.partial(
+                    self._parse_body, code, *bodies[current.lexend])))
+                continue
+            stack.extend(getattr(current, f) for f in current._fields)
+        return tree
+
+    def _parse_body(self, code, lexpos, lineno):
+        """Return the statements of the block at lexpos of code"""
+        self.lexer.input(code)
+        self.lexer.lexpos = lexpos
+        self.lexer.lineno = lineno
+        tokens = _body_tokens(self.lexer, lexpos, lineno)
+        block = self.parser.parse(None, lexer=self.lexer, tracking=True,
+                                  tokenfunc=lambda: next(tokens, None))
+        if not isinstance(block, Block):
+            return []
+        return block.statements
+
+    def parse_header(self, code, debug=0, lineno=1):
+        """Parse the package, imports and type declaration headers of code
+
+        Type bodies are skipped by brace matching and come out empty, so
+        only the lexer runs over them. Positions match parse_string.
+        """
+        self.lexer.lineno = lineno
+        tokens = _header_tokens(self.lexer)
+        return self.parser.parse('++' + code, lexer=self.lexer, debug=debug,
+                                 tracking=True,
+                                 tokenfunc=lambda: next(tokens, None))
+
     def parse_file(self, _file, debug=0):
         if type(_file) == str:
-            _file = open(_file)
-        content = _file.read()
-        return self.parse_string(content, debug=debug)
+            return self.parse_string(read_source(_file), debug=debug)
+        return self.parse_string(_file.read(), debug=debug)
 
 if __name__ == '__main__':
     # for testing
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import collections
+import re
+import time
+
+_MAX_DYNAMIC_PATTERNS = 256
+
+_FLAG_NAMES = [(re.IGNORECASE, 'IGNORECASE'), (re.MULTILINE, 'MULTILINE'),
+               (re.DOTALL, 'DOTALL'), (re.VERBOSE, 'VERBOSE')]
+
+# Patterns registered by the agents, kept for the life of the process.
+_registered = {}
+
+# Patterns built at run time, least recently used first.
+_dynamic = collections.OrderedDict()
+
+# (pattern, flags) to [calls, seconds] while stats are enabled, see
+# EnableStats.
+_stats = None
+
+
+def Register(pattern, flags=0):
+  """Compile a fixed pattern once, meant to be called at module level"""
+  key = (pattern, flags)
+  if key not in _registered:
+    _registered[key] = re.compile(pattern, flags)
+  return _registered[key]
+
+
+def Compile(pattern, flags=0):
+  """Return the compiled pattern
+
+  Registered patterns are returned as is, everything else goes through a
+  small LRU cache. Already compiled patterns are passed through, flags are
+  ignored for them.
+  """
+  if not isinstance(pattern, basestring):
+    return pattern
+  key = (pattern, flags)
+  compiled = _registered.get(key)
+  if compiled is not None:
+    return compiled
+  compiled = _dynamic.pop(key, None)
+  if compiled is None:
+    compiled = re.compile(pattern, flags)
+    if len(_dynamic) >= _MAX_DYNAMIC_PATTERNS:
+      _dynamic.popitem(last=False)
+  _dynamic[key] = compiled
+  return compiled
+
+
+def _Call(compiled, method, *args):
+  if _stats is None:
+    return getattr(compiled, method)(*args)
+  start = time.time()
+  try:
+    return getattr(compiled, method)(*args)
+  finally:
+    entry = _stats.setdefault((compiled.pattern, compiled.flags), [0, 0.0])
+    entry[0] += 1
+    entry[1] += time.time() - start
+
+
+def Search(pattern, string, flags=0):
+  return _Call(Compile(pattern, flags), 'search', string)
+
+
+def FindAll(pattern, string, flags=0):
+  return _Call(Compile(pattern, flags), 'findall', string)
+
+
+def Sub(pattern, replacement, string, count=0, flags=0):
+  return _Call(Compile(pattern, flags), 'sub', replacement, string, count)
+
+
+def EnableStats(enabled=True):
+  """Start counting and timing every Search, FindAll and Sub from zero"""
+  global _stats
+  _stats = {} if enabled else None
+
+
+def StatsEnabled():
+  return _stats is not None
+
+
+def Stats():
+  """Return {(pattern, flags): (calls, seconds)} since EnableStats"""
+  return dict((k, tuple(v)) for k, v in (_stats or {}).iteritems())
+
+
+def MergeStats(stats):
+  """Add stats from another process, as returned by its Stats()"""
+  if _stats is None:
+    return
+  for key, (calls, seconds) in stats.iteritems():
+    entry = _stats.setdefault(key, [0, 0.0])
+    entry[0] += calls
+    entry[1] += seconds
+
+
+def Report(limit=20):
+  """Return report lines for the patterns with the most match time"""
+  lines = ['%8s %10s  %s' % ('calls', 'ms', 'pattern')]
+  by_time = sorted(Stats().iteritems(), key=lambda x: x[1][1], reverse=True)
+  for (pattern, flags), (calls, seconds) in by_time[:limit]:
+    names = [name for flag, name in _FLAG_NAMES if flags & flag]
+    lines.append('%8d %10.2f  %r%s' % (
+        calls, seconds * 1000, pattern,
+        ' (%s)' % '|'.join(names) if names else ''))
+  return lines
@@ -3,6 +3,7 @@
 import model
 import test_convert_agent
 import base_agent
+import regex_registry
 
 import codecs
 import jinja2
@@ -10,6 +11,12 @@ import logging
 import re
 import os
 
+_CLASS_HEADER_PATTERN = regex_registry.Register(r'(^public.*?){')
+
+_METHOD_BODY_PATTERN = regex_registry.Register(r'(.*?) {.*}', re.DOTALL)
+
+_PROTECTED_PATTERN = regex_registry.Register('protected')
+
 _TEST_COMMON_JINJA_TEMPLATE = """
 // Copyright 2017 The Chromium Authors. All rights reserved.
 // Use of this source code is governed by a BSD-style license that can be
@@ -111,7 +118,7 @@ class BaseCaseAgent(test_convert_agent.TestConvertAgent):
 
   def implementsTestCommonCallback(self, common_callback_class_name):
     self._replaceString(
-        r'(^public.*?){', r'\1implements %s {' % common_callback_class_name,
+        _CLASS_HEADER_PATTERN, r'\1implements %s {' % common_callback_class_name,
         element=self.main_class)
 
   def createGetter(self, field):
@@ -151,12 +158,8 @@ class BaseCaseAgent(test_convert_agent.TestConvertAgent):
             static_inaccessible)
 
   def _methodUnderBlock(self, m):
-    block_range = []
-    for b in self.main_element_table[model.Block]:
-      block_range.append((b.lexpos, b.lexend))
-    for r in block_range:
-      if m.lexpos > r[0] and m.lexend < r[1]:
-        return True
+    if self._enclosingElement(m, model.Block, strict=True) is not None:
+      return True
     return super.skip()
 
   def getMethods(self):
@@ -185,9 +188,9 @@ class BaseCaseAgent(test_convert_agent.TestConvertAgent):
       if m.parameters:
         arg = '(%s)' % ', '.join([p.variable.name for p in m.parameters])
       self._replaceString(
-          r'(.*?) {.*}',
+          _METHOD_BODY_PATTERN,
           r'\1 {\n        mTestCommon.%s%s;\n    }' % (m.name, arg),
-          element=m, flags=re.DOTALL)
+          element=m)
 
   def actions(self):
     self.changeAssertions()
@@ -252,7 +255,7 @@ class BaseCaseAgent(test_convert_agent.TestConvertAgent):
         self.parser, os.path.join(dirname, test_rule_class_name+'.java'))
     test_rule_agent.actionOnMethodDeclaration(
         action=lambda x: test_rule_agent._replaceString(
-            'protected', 'public', element=x))
+            _PROTECTED_PATTERN, 'public', element=x))
     self.Save()
     test_rule_agent.Save()
 
@@ -3,17 +3,48 @@
 import model
 import parser
 import base_agent
+import regex_registry
 
 import json
 import re
 import os
 import collections
 import codecs
+import copy
+import hashlib
 import logging
 
-_YEAR_PATTERN = re.compile(r'^(\/\/ Copyright) 2017')
+_YEAR_PATTERN = regex_registry.Register(r'^(\/\/ Copyright) 2017')
 
-_FLOAT_PATTERN = re.compile(r'^\d+?\.\d+f?$')
+_FLOAT_PATTERN = regex_registry.Register(r'^\d+?\.\d+f?$')
+
+_PROTECTED_PATTERN = regex_registry.Register('protected')
+
+_OVERRIDE_PATTERN = regex_registry.Register(r' *@Override\n')
+
+_SUPER_SET_UP_PATTERN = regex_registry.Register(r' *super.setUp\(.*\); *\n')
+
+_SUPER_TEAR_DOWN_PATTERN = regex_registry.Register(
+    r' *super.tearDown\(.*\) *;\n')
+
+_FIELD_GETTER_PATTERN = regex_registry.Register(r'm(\w)')
+
+_FIELD_SETTER_PATTERN = regex_registry.Register(r'm(\w)(\w+) = (.*);')
+
+_RUN_TEST_ON_UI_THREAD_PATTERN = regex_registry.Register('runTestOnUiThread')
+
+_FLOAT_ASSERT_EQUALS_PATTERN = regex_registry.Register(
+    r'assertEquals\((.*)\)', re.DOTALL)
+
+_SEND_KEYS_PATTERN = regex_registry.Register(r'sendKeys')
+
+# Keyed by the token following the super class name.
+_EXTENDS_PATTERNS = {
+    '{': regex_registry.Register(r'extends .*? {', re.DOTALL),
+    'implements': regex_registry.Register(r'extends .*? implements', re.DOTALL),
+}
+
+_MIN_SDK_PATTERN = regex_registry.Register(r'@MinAndroidSdkLevel\((.*)\)')
 
 _ASSERTION_METHOD_SET = {
     'assertEquals',
@@ -48,46 +79,72 @@ _INSTRUMENTATION_REGISTRY_METHODS = {
     'getInstrumentation', 'getContext', 'getTargetContext'
 }
 
+# Analysis of rule classes keyed by (location, content sha1), shared by every
+# agent in the process so each rule file is parsed once per run.
+_analyzed_rule_cache = {}
+
+
+class _RuleFileAgent(base_agent.BaseAgent):
+  # Only the declarations of a rule file are looked at, its method bodies
+  # are left unparsed.
+  lazy_bodies = True
+
+
+def _AnalyzeRuleFile(java_parser, location):
+  with open(location) as rule_file:
+    key = (location, hashlib.sha1(rule_file.read()).hexdigest())
+  if key not in _analyzed_rule_cache:
+    f = _RuleFileAgent(java_parser, location)
+    element_table, main_element_table = f.parsedElementTables()
+    api_list = [m.name for m in main_element_table[model.MethodDeclaration]
+                if f._isPublicOrProtected(m.modifiers) and not
+                f._isStatic(m.modifiers) and m.name not in _TEST_RULE_METHODS]
+    static_api_list = [m.name for m in
+                       main_element_table[model.MethodDeclaration]
+                       if f._isPublicOrProtected(m.modifiers) and
+                       f._isStatic(m.modifiers)]
+    local_accessible_interface = [
+        m.name for m in main_element_table.get(
+            model.InterfaceDeclaration, [])
+        if f._isPublicOrProtected(m.modifiers)]
+    local_accessible_annotation = [
+        m.name for m in main_element_table.get(
+            model.AnnotationDeclaration, [])
+        if f._isPublicOrProtected(m.modifiers)]
+    local_accessible_class = [
+        m.name for m in element_table.get(model.ClassDeclaration, [])
+        if f._isPublicOrProtected(
+            m.modifiers) and m.name != f.main_class.name]
+    _analyzed_rule_cache[key] = {
+      'api': list(set(api_list)),
+      'static_api': list(set(static_api_list)),
+      'types': local_accessible_class
+          +local_accessible_interface+local_accessible_annotation}
+  return copy.deepcopy(_analyzed_rule_cache[key])
+
 def AnalyzeMapping(java_parser, mapping):
   for _, info in mapping.items():
     try:
-      f = base_agent.BaseAgent(java_parser, info['location'])
-      api_list = [m.name for m in f.main_element_table[model.MethodDeclaration]
-                  if f._isPublicOrProtected(m.modifiers) and not
-                  f._isStatic(m.modifiers) and m.name not in _TEST_RULE_METHODS]
-      static_api_list = [m.name for m in
-                         f.main_element_table[model.MethodDeclaration]
-                         if f._isPublicOrProtected(m.modifiers) and
-                         f._isStatic(m.modifiers)]
-      local_accessible_interface = [
-          m.name for m in f.main_element_table.get(
-              model.InterfaceDeclaration, [])
-          if f._isPublicOrProtected(m.modifiers)]
-      local_accessible_annotation = [
-          m.name for m in f.main_element_table.get(
-              model.AnnotationDeclaration, [])
-          if f._isPublicOrProtected(m.modifiers)]
-      local_accessible_class = [
-          m.name for m in f.element_table.get(model.ClassDeclaration, [])
-          if f._isPublicOrProtected(
-              m.modifiers) and m.name != f.main_class.name]
-      info.update({
-        'api': list(set(api_list)),
-        'static_api': list(set(static_api_list)),
-        'types': local_accessible_class
-            +local_accessible_interface+local_accessible_annotation})
+      info.update(_AnalyzeRuleFile(java_parser, info['location']))
     except IOError:
       logging.debug("%s doesn't exist" % info['location'])
   return mapping
 
 
 class TestConvertAgent(base_agent.BaseAgent):
+  # Name of the super class of the files this agent converts. Agents that
+  # convert several override super_class_names, agents with none are tried
+  # for files no other agent claims.
+  converted_super_class = None
+
   def __init__(self, java_parser, filepath, logger=logging.getLogger,
                agent=None, use_base_class=None, **kwargs):
     super(TestConvertAgent, self).__init__(java_parser, filepath, logger, agent,
                                            **kwargs)
     if type(agent) == type(self):
-      self._api_mapping = agent.api_mapping
+      # Copy so per-file edits such as 'modified_instan' do not leak into the
+      # next file, which keeps the output independent of conversion order.
+      self._api_mapping = copy.deepcopy(agent.api_mapping)
     else:
       self._api_mapping = AnalyzeMapping(self.parser, self.raw_api_mapping())
 
@@ -124,6 +181,13 @@ class TestConvertAgent(base_agent.BaseAgent):
     """implement this class method to return mapping from base class to rules"""
     raise NotImplementedError("raw_api_mapping not implemented")
 
+  @classmethod
+  def super_class_names(cls):
+    """return the names of the super classes this agent converts"""
+    if cls.converted_super_class is None:
+      return []
+    return [cls.converted_super_class]
+
   @classmethod
   def filename_match(cls, file_whole_path):
     if (file_whole_path.endswith('Test.java') and file_whole_path not in
@@ -174,9 +238,7 @@ class TestConvertAgent(base_agent.BaseAgent):
     JUnit3: mObj.doAction() //mObj inherited from parent
     JUnit4: mTestRule.getObj().doAction()
     """
-    locally_declared_field_names = [
-        f.variable_declarators[0].variable.name
-        for f in self.actionOnX(model.FieldDeclaration)]
+    locally_declared_field_names = self._symbols().field_names
     #Find all inherited values
     self.actionOnX(
         model.MethodInvocation,
@@ -184,23 +246,21 @@ class TestConvertAgent(base_agent.BaseAgent):
           and x.target.value.startswith("m")
           and x.target.value not in locally_declared_field_names,
         action=lambda x: self._replaceString(
-          r'm(\w)', r'%s.get$1' % self.rule_var, upper=True))
+          _FIELD_GETTER_PATTERN, r'%s.get$1' % self.rule_var, upper=True))
 
   def setFieldWithSetter(self):
     """
     Similar to above, if a inherited field is set, use setter if setter method
     is found
     """
-    locally_declared_field_names = [
-        f.variable_declarators[0].variable.name
-        for f in self.actionOnX(model.FieldDeclaration)]
+    locally_declared_field_names = self._symbols().field_names
     self.actionOnX(
         model.Assignment,
         condition=lambda x: getattr(x, "lhs", None)
           and x.lhs.value.startswith("m")
           and x.lhs.value not in locally_declared_field_names,
         action=lambda x: self._replaceString(
-          r'm(\w)(\w+) = (.*);', r'%s.set\1\2(\3)' % self.rule_var))
+          _FIELD_SETTER_PATTERN, r'%s.set\1\2(\3)' % self.rule_var))
 
 
 
@@ -209,7 +269,7 @@ class TestConvertAgent(base_agent.BaseAgent):
         condition=lambda x: x.name == 'runTestOnUiThread'
                   and self._isInherited(x),
         action=lambda x: self._replaceString(
-            'runTestOnUiThread',
+            _RUN_TEST_ON_UI_THREAD_PATTERN,
             'InstrumentationRegistry.getInstrumentation().runOnMainSync',
             element=x))
 
@@ -263,20 +323,22 @@ class TestConvertAgent(base_agent.BaseAgent):
         if m.name in ['setUp', 'tearDown'])
     if methods.get('setUp'):
       m = methods.get('setUp')
-      self._replaceString('protected', 'public', element=m, optional=True)
+      self._replaceString(_PROTECTED_PATTERN, 'public', element=m,
+                          optional=True)
       self._insertAbove(m, '@Before')
       self._addImport('org.junit.Before')
-      self._replaceString(r' *@Override\n', '', element=m, optional=True)
+      self._replaceString(_OVERRIDE_PATTERN, '', element=m, optional=True)
       self._replaceString(
-          r' *super.setUp\(.*\); *\n', '', element=m, optional=True)
+          _SUPER_SET_UP_PATTERN, '', element=m, optional=True)
     if methods.get('tearDown'):
       m = methods.get('tearDown')
-      self._replaceString('protected', 'public', element=m, optional=True)
+      self._replaceString(_PROTECTED_PATTERN, 'public', element=m,
+                          optional=True)
       self._insertAbove(m, '@After')
       self._addImport('org.junit.After')
-      self._replaceString(r' *@Override\n', '', element=m, optional=True)
+      self._replaceString(_OVERRIDE_PATTERN, '', element=m, optional=True)
       self._replaceString(
-          r' *super.tearDown\(.*\) *;\n', '', element=m, optional=True)
+          _SUPER_TEAR_DOWN_PATTERN, '', element=m, optional=True)
 
   def changeAssertions(self):
     def _action(m):
@@ -284,8 +346,8 @@ class TestConvertAgent(base_agent.BaseAgent):
           self._argumentIsFloatOrDouble(m)):
         self._addImport('org.junit.Assert')
         self._replaceString(
-            r'assertEquals\((.*)\)', r'Assert.assertEquals(\1, 0)', element=m,
-            optional=False, flags=re.DOTALL, verbose=True)
+            _FLOAT_ASSERT_EQUALS_PATTERN, r'Assert.assertEquals(\1, 0)',
+            element=m, optional=False, verbose=True)
       else:
         self._addImport('org.junit.Assert')
         self._removeImport('junit.framework.Assert')
@@ -309,7 +371,7 @@ class TestConvertAgent(base_agent.BaseAgent):
   def changeSendKeys(self):
     def _action(m):
       self._replaceString(
-          r'sendKeys',
+          _SEND_KEYS_PATTERN,
           'InstrumentationRegistry.getInstrumentation().sendKeyDownUpSync',
           element=m)
     self.actionOnMethodInvocation(
@@ -328,22 +390,19 @@ class TestConvertAgent(base_agent.BaseAgent):
     end = '{'
     if self.main_class.implements:
       end = 'implements'
-    self._replaceString(r'extends .*? '+end, end, element=self.main_class,
-        flags=re.DOTALL)
+    self._replaceString(_EXTENDS_PATTERNS[end], end, element=self.main_class)
 
 #     if len(self.rule_dict) != 0:
       # self._addImport(self.rule_dict['package'] + '.'+self.rule_dict['rule'])
 
   def removeConstructor(self):
     self.actionOnX(model.ConstructorDeclaration,
-        action=lambda x: self._replaceString(
-            '.*', '', element=x, flags=re.DOTALL), optional=True,
+        action=self._removeElement, optional=True,
         main_table=True)
 
   def changeMinSdkAnnotation(self):
     def _action(a):
-      self._replaceString(r'@MinAndroidSdkLevel\((.*)\)', r'@SdkSuppress\1',
-          element=a)
+      self._replaceString(_MIN_SDK_PATTERN, r'@SdkSuppress\1', element=a)
       self._removeImport('org.chromium.base.test.util.MinAndroidSdkLevel')
       self._addImport('android.support.test.filters.SdkSuppress')
     self.actionOnX(model.Annotation,
@@ -9,6 +9,8 @@ import collections
 
 class WebViewTestAgent(test_convert_agent.TestConvertAgent):
   """Agent for AwTestBase direct childrens"""
+  converted_super_class = "AwTestBase"
+
   @staticmethod
   def class_runner():
     return ('AwJUnit4ClassRunner',
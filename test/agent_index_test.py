@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import auto_change
+import chrome_convert_agents
+
+import collections
+import unittest
+
+
+class ReorderedSyncTestAgent(chrome_convert_agents.SyncTestAgent):
+  @staticmethod
+  def raw_api_mapping():
+    mapping = chrome_convert_agents.SyncTestAgent.raw_api_mapping()
+    return collections.OrderedDict(reversed(mapping.items()))
+
+
+class AgentIndexTest(unittest.TestCase):
+  def testEveryAgentIsIndexedUnderItsSuperClass(self):
+    by_super_class, fallbacks = auto_change._AgentIndex(
+        sorted(auto_change._AGENT_DICT))
+    for agent_class in auto_change._AGENT_DICT.itervalues():
+      if agent_class.converted_super_class is not None:
+        self.assertIs(by_super_class[agent_class.converted_super_class],
+                      agent_class)
+    self.assertEqual([i.__name__ for i in fallbacks], ['BaseCaseAgent'])
+
+  def testMappingOrderDoesNotMatter(self):
+    self.assertEqual(ReorderedSyncTestAgent.raw_api_mapping().keys()[0],
+                     'ChromeActivityTestCaseBase')
+    self.assertEqual(ReorderedSyncTestAgent.super_class_names(),
+                     ['SyncTestBase'])
+
+
+if __name__ == '__main__':
+  unittest.main()
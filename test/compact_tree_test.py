@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import base_agent
+import compact_tree
+import model
+from test_util import FakeParser, TempDirTestCase
+
+import cPickle
+import unittest
+
+
+def _Span(start, end):
+  return dict(lexpos=start, lexspan=(start, end))
+
+
+def _Tree():
+  # import a;
+  # class A {
+  #   void f(T x) { x++; }
+  #   class B {}
+  # }
+  # class C {}
+  name_t = model.Name('T', **_Span(27, 27))
+  parameter = model.FormalParameter(
+      model.Variable('x', **_Span(29, 29)),
+      model.Type(name_t, **_Span(27, 27)), **_Span(29, 29))
+  statement = model.ExpressionStatement(
+      model.Unary('x++', model.Name('x', **_Span(35, 35))), **_Span(35, 38))
+  method = model.MethodDeclaration(
+      'f', parameters=[parameter], body=[statement], **_Span(20, 40))
+  class_a = model.ClassDeclaration(
+      'A', [method, model.ClassDeclaration('B', [], **_Span(50, 60))],
+      modifiers=['public'], **_Span(10, 100))
+  return model.CompilationUnit(
+      import_declarations=[model.ImportDeclaration(
+          model.Name('a', **_Span(7, 7)), **_Span(0, 8))],
+      type_declarations=[
+          class_a, model.InterfaceDeclaration('C', [], **_Span(110, 120))],
+      **_Span(0, 120))
+
+
+class CompactTreeTest(unittest.TestCase):
+  def setUp(self):
+    self.tree = _Tree()
+    self.compact = compact_tree.CompactTree.FromTree(self.tree)
+
+  def testLinks(self):
+    self.assertEqual(len(self.compact), 14)
+    root = self.compact.Node(0)
+    self.assertEqual(root.kind, 'CompilationUnit')
+    self.assertIsNone(root.parent)
+    self.assertEqual([i.kind for i in root.children], [
+        'ImportDeclaration', 'ClassDeclaration', 'InterfaceDeclaration'])
+    class_a = root.children[1]
+    self.assertEqual((class_a.name, class_a.lexpos, class_a.lexend),
+                     ('A', 10, 100))
+    self.assertEqual([i.name for i in class_a.children], ['f', 'B'])
+    self.assertEqual(class_a.children[0].parent.index, class_a.index)
+
+  def testStringsAreInterned(self):
+    self.assertEqual(self.compact.strings.count('x'), 1)
+    names = [self.compact.Name(i) for i in range(len(self.compact))]
+    self.assertEqual(names.count('x'), 2)
+
+  def testQueriesMatchTraverseTree(self):
+    _, element_table, _, main_table = base_agent._TraverseTree(self.tree)
+    for table, main in [(element_table, False), (main_table, True)]:
+      for element_type, elements in table.iteritems():
+        nodes = self.compact.ActionOnX(element_type, main_table=main)
+        self.assertEqual([(i.kind, i.lexpos) for i in nodes],
+                         [(type(e).__name__, e.lexpos) for e in elements])
+    self.assertEqual(
+        [i.name for i in self.compact.ActionOnX(model.ClassDeclaration)],
+        ['A', 'B', 'C'])
+
+  def testActionOnX(self):
+    seen = []
+    nodes = self.compact.ActionOnX(
+        'Name', condition=lambda x: x.name != 'a', action=seen.append)
+    self.assertEqual([i.name for i in nodes], ['T', 'x'])
+    self.assertEqual(seen, nodes)
+    self.assertEqual(
+        self.compact.ActionOnX(model.Literal, optional=True), [])
+    self.assertRaises(Exception, self.compact.ActionOnX, model.Literal)
+
+  def testPickle(self):
+    copy = cPickle.loads(
+        cPickle.dumps(self.compact, cPickle.HIGHEST_PROTOCOL))
+    self.assertEqual(copy.kinds, self.compact.kinds)
+    self.assertEqual(copy.strings, self.compact.strings)
+    self.assertEqual(
+        [i.lexpos for i in copy.ActionOnX(model.Name, main_table=True)],
+        [27, 35])
+
+
+class MaterializeTest(TempDirTestCase):
+  def setUp(self):
+    super(MaterializeTest, self).setUp()
+    self.Write('')
+
+  def testElementsAreParsedOnce(self):
+    java_parser = FakeParser(_Tree())
+    compact = compact_tree.Load(java_parser, self.path)
+    self.assertEqual(len(java_parser.parsed), 1)
+    java_parser.tree = _Tree()
+    method = compact.ActionOnX(model.MethodDeclaration)[0]
+    self.assertIs(method.element,
+                  java_parser.tree.type_declarations[0].body[0])
+    compact.Element(0)
+    self.assertEqual(len(java_parser.parsed), 2)
+
+  def testChangedFileIsRejected(self):
+    compact = compact_tree.Load(FakeParser(_Tree()), self.path)
+    self.assertRaises(
+        ValueError, compact.Materialize, FakeParser(model.CompilationUnit()))
+    self.assertRaises(
+        ValueError, compact_tree.CompactTree.FromTree(_Tree()).Element, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -32,14 +32,14 @@ class CompilationUnitTest(unittest.TestCase):
         m = self.parser.parse_string('''
         package foo.bar;
         ''')
-        self.assertEqual(m.package_declaration, model.PackageDeclaration(model.Name('foo.bar')))
+        self.assertStructurallyEqual(m.package_declaration, model.PackageDeclaration(model.Name('foo.bar')))
 
     def test_package_annotation(self):
         m = self.parser.parse_string('''
         @Annot
         package foo;
         ''')
-        self.assertEqual(m.package_declaration,
+        self.assertStructurallyEqual(m.package_declaration,
                          model.PackageDeclaration(model.Name('foo'),
                                                   modifiers=[model.Annotation(model.Name('Annot'))]))
 
@@ -48,7 +48,7 @@ class CompilationUnitTest(unittest.TestCase):
         import foo;
         import foo.bar;
         ''')
-        self.assertEqual(m.import_declarations,
+        self.assertStructurallyEqual(m.import_declarations,
                          [model.ImportDeclaration(model.Name('foo')),
                           model.ImportDeclaration(model.Name('foo.bar'))])
 
@@ -56,21 +56,21 @@ class CompilationUnitTest(unittest.TestCase):
         m = self.parser.parse_string('''
         import static foo.bar;
         ''')
-        self.assertEqual(m.import_declarations,
+        self.assertStructurallyEqual(m.import_declarations,
                          [model.ImportDeclaration(model.Name('foo.bar'), static=True)])
 
     def test_wildcard_import(self):
         m = self.parser.parse_string('''
         import foo.bar.*;
         ''')
-        self.assertEqual(m.import_declarations,
+        self.assertStructurallyEqual(m.import_declarations,
                          [model.ImportDeclaration(model.Name('foo.bar'), on_demand=True)])
 
     def test_static_wildcard_import(self):
         m = self.parser.parse_string('''
         import static foo.bar.*;
         ''')
-        self.assertEqual(m.import_declarations,
+        self.assertStructurallyEqual(m.import_declarations,
                          [model.ImportDeclaration(model.Name('foo.bar'), static=True, on_demand=True)])
 
     def test_annotations(self):
@@ -81,7 +81,7 @@ class CompilationUnitTest(unittest.TestCase):
         ''')
         t = self._assert_declaration(m, 'Foo')
 
-        self.assertEqual(t.modifiers, [model.Annotation(
+        self.assertStructurallyEqual(t.modifiers, [model.Annotation(
             name=model.Name('Annot'),
             members=[model.AnnotationMember(name=model.Name('key'),
                                             value=model.Literal('1'))])])
@@ -126,6 +126,10 @@ class CompilationUnitTest(unittest.TestCase):
         v = model.Visitor()
         m.accept(v)
 
+    def assertStructurallyEqual(self, first, second):
+        self.assertTrue(model.structurally_equal(first, second),
+                        '{} != {}'.format(first, second))
+
     def _assert_declaration(self, compilation_unit, name, index=0, type=model.ClassDeclaration):
         self.assertIsInstance(compilation_unit, model.CompilationUnit)
         self.assertTrue(len(compilation_unit.type_declarations) >= index + 1)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import base_agent
+
+import random
+import unittest
+
+
+class EditBufferTest(unittest.TestCase):
+  def testReadsLikeString(self):
+    text = u''.join(unichr(ord('a') + i % 26) for i in range(2000))
+    buf = base_agent._EditBuffer(text)
+    buf.Replace(0, 0, u'')
+    self.assertEqual(len(buf), len(text))
+    self.assertEqual(buf[0], text[0])
+    self.assertEqual(buf[-1], text[-1])
+    self.assertEqual(buf[510:1030], text[510:1030])
+    self.assertEqual(buf[:5], text[:5])
+    self.assertEqual(buf[1990:5000], text[1990:5000])
+    self.assertEqual(buf[10:5], u'')
+    self.assertRaises(IndexError, lambda: buf[len(text)])
+
+  def testReplaceAcrossChunks(self):
+    text = u'x' * 600 + u'y' * 600
+    buf = base_agent._EditBuffer(text)
+    buf.Replace(500, 700, u'abc')
+    text = text[:500] + u'abc' + text[700:]
+    self.assertEqual(buf.Text(), text)
+    self.assertEqual(buf[499:504], text[499:504])
+
+  def testMatchesStringEdits(self):
+    rand = random.Random(0)
+    text = u''.join(rand.choice(u'ab \n') for _ in range(3000))
+    buf = base_agent._EditBuffer(text)
+    for _ in range(400):
+      start = rand.randint(0, len(text))
+      end = rand.randint(start, min(len(text), start + rand.choice([0, 5, 900])))
+      insertion = rand.choice([u'', u'q', u'long insertion\n' * 20])
+      buf.Replace(start, end, insertion)
+      text = text[:start] + insertion + text[end:]
+      probe = rand.randint(0, len(text) - 1)
+      self.assertEqual(buf[probe], text[probe])
+      self.assertEqual(buf[probe:probe + 700], text[probe:probe + 700])
+      self.assertEqual(len(buf), len(text))
+    self.assertEqual(buf.Text(), text)
+
+
+class EditBufferLinesTest(unittest.TestCase):
+  def assertLinesMatch(self, buf, text, pos):
+    line_start = text.rfind(u'\n', 0, pos) + 1
+    line_end = text.find(u'\n', pos)
+    if line_end < 0:
+      line_end = len(text)
+    leading = text[line_start:pos]
+    self.assertEqual(buf.LineStart(pos), line_start)
+    self.assertEqual(buf.LineEnd(pos), line_end)
+    self.assertEqual(buf.LineAndColumn(pos),
+                     (text.count(u'\n', 0, pos) + 1, pos - line_start + 1))
+    self.assertEqual(buf.Indentation(pos),
+                     len(leading) - len(leading.lstrip(u' ')))
+
+  def testLines(self):
+    text = u'class A {\n    int a;\n\n  }'
+    buf = base_agent._EditBuffer(text)
+    self.assertEqual(buf.LineStart(14), 10)
+    self.assertEqual(buf.LineEnd(14), 20)
+    self.assertEqual(buf.LineAndColumn(14), (2, 5))
+    self.assertEqual(buf.Indentation(14), 4)
+    self.assertEqual(buf.LineEnd(20), 20)
+    self.assertEqual(buf.LineStart(21), 21)
+    self.assertEqual(buf.LineEnd(23), len(text))
+
+  def testMatchesStringAfterEdits(self):
+    rand = random.Random(1)
+    text = u''.join(rand.choice(u'ab  \n') for _ in range(3000))
+    buf = base_agent._EditBuffer(text)
+    for _ in range(300):
+      start = rand.randint(0, len(text))
+      end = rand.randint(start, min(len(text), start + rand.choice([0, 5, 900])))
+      insertion = rand.choice([u'', u'\n', u'  x\n  y', u'no newline' * 60])
+      buf.Replace(start, end, insertion)
+      text = text[:start] + insertion + text[end:]
+      self.assertLinesMatch(buf, text, rand.randint(0, len(text)))
+    for pos in range(0, len(text), 7):
+      self.assertLinesMatch(buf, text, pos)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import base_agent
+import parser
+from test_util import TempDirTestCase
+
+import unittest
+
+
+class EditScriptTest(unittest.TestCase):
+  def testRenderWithoutEdits(self):
+    script = base_agent._EditScript(u'class A {}')
+    self.assertEqual(script.Render(), u'class A {}')
+    self.assertEqual(len(script), 0)
+
+  def testPositionsReferToOriginalText(self):
+    script = base_agent._EditScript(u'abcdef')
+    script.Replace(4, 5, u'E')
+    script.Replace(0, 0, u'>>')
+    script.Replace(1, 3, u'')
+    self.assertEqual(script.Render(), u'>>adEf')
+
+  def testInsertionOrder(self):
+    script = base_agent._EditScript(u'ab')
+    script.Replace(1, 1, u'1')
+    script.Replace(1, 1, u'2')
+    script.Replace(1, 1, u'x', prepend=True)
+    script.Replace(1, 1, u'y', prepend=True)
+    self.assertEqual(script.Render(), u'ayx12b')
+
+  def testInsertionBeforeReplacementAtSameStart(self):
+    script = base_agent._EditScript(u'abc')
+    script.Replace(1, 2, u'B')
+    script.Replace(1, 1, u'^')
+    self.assertEqual(script.Render(), u'a^Bc')
+
+  def testWidestEditWins(self):
+    script = base_agent._EditScript(u'0123456789')
+    script.Replace(3, 4, u'x')
+    script.Replace(2, 6, u'')
+    script.Replace(5, 8, u'y')
+    self.assertEqual(script.Render(), u'016789')
+
+  def testSourceSpanKeepsInnerEdits(self):
+    script = base_agent._EditScript(u'f() { a(); } g() { b(); }')
+    body = base_agent._SourceSpan(6, 10)
+    script.Replace(0, 13, u'')
+    script.Replace(19, 23, [u'c(); ', body])
+    script.Replace(6, 6, u'rule.')
+    self.assertEqual(script.Render(), u'g() { c(); rule.a(); }')
+
+  def testRemovalEnd(self):
+    script = base_agent._EditScript(u'0123456789')
+    script.Replace(2, 2, u'x')
+    script.Replace(2, 4, u'y')
+    self.assertIsNone(script.RemovalEnd(2))
+    script.Replace(2, 5, u'')
+    script.Replace(2, 3, u'')
+    self.assertEqual(script.RemovalEnd(2), 5)
+
+
+class EditScriptAgent(base_agent.BaseAgent):
+  use_edit_script = True
+
+
+class InsertAboveTest(TempDirTestCase):
+  def testInsertAboveRemovedAnnotation(self):
+    # Laid out as SaveAndReload after each edit did before edit scripts.
+    self.Write('@Flags(A)\npublic class FooTest {\n}\n')
+    agent = EditScriptAgent(parser.Parser(), self.path)
+    agent._insertAbove(agent.main_class, '@RunWith(X.class)')
+    agent._removeElement(agent.main_class.modifiers[0])
+    agent._insertAbove(agent.main_class, '@Flags({A, B})')
+    self.assertEqual(agent._modifiedContent(), '@RunWith(X.class)\n\n'
+                     '@Flags({A, B})\npublic class FooTest {\n}\n')
+
+
+if __name__ == '__main__':
+  unittest.main()
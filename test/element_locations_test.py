@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import base_agent
+
+import random
+import unittest
+
+
+class ElementLocationsTest(unittest.TestCase):
+  def testEmpty(self):
+    locations = base_agent._ElementLocations([])
+    locations.Add(0, 5)
+    self.assertEqual(locations.FirstAfter(-10), None)
+
+  def testSuffixAdd(self):
+    locations = base_agent._ElementLocations([-1, 0, 4, 4, 9])
+    locations.Add(0, -2)
+    self.assertEqual(locations.FirstAfter(-1), 2)
+    locations.Add(5, 10)
+    self.assertEqual(locations.FirstAfter(2), 4)
+    self.assertEqual(locations.FirstAfter(17), None)
+
+  def testMatchesLinearScan(self):
+    rand = random.Random(0)
+    lexposes = sorted(rand.randint(-1, 400) for _ in range(150))
+    locations = base_agent._ElementLocations(lexposes)
+    current = list(lexposes)
+    for _ in range(300):
+      lex = rand.randint(0, 410)
+      delta = rand.randint(-30, 30)
+      locations.Add(lex, delta)
+      current = [c + delta if l >= lex else c
+                 for l, c in zip(lexposes, current)]
+      loc = rand.randint(-50, 500)
+      expected = next(
+          (i for i, c in enumerate(current) if c > loc), None)
+      self.assertEqual(locations.FirstAfter(loc), expected)
+
+
+if __name__ == '__main__':
+  unittest.main()
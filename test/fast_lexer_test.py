@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import compact_tree
+import model
+import parser
+
+import StringIO
+import sys
+import unittest
+
+import ply.lex as lex
+
+_SOURCES = [
+    'a >>>= b >>= c >>> d >> e >= f > g <<= h << i <= j < k',
+    '++ -- -= += *= /= %= &= |= ^= && || == != ~ ! ? : ... @ ; , . [ ]',
+    '.5 1.e5 0x1F 10L 3_000 .. a.b',
+    'x\r\ny\r\r\nz\n\n/* a\nb */ // c\r\n"s\\"t" \'\\n\' "open\n# /*',
+    u'String s = "caf\xe9";',
+    '',
+    ' \t\f\n',
+]
+
+_CLASS = '''package org.chromium;
+
+import java.util.List;
+
+/** Foo. */
+@Deprecated
+public class FooTest extends InstrumentationTestCase {
+    private int mCount = 1 << 3;
+
+    public FooTest() {
+        super();
+    }
+
+    @SmallTest
+    public void testFoo() throws Exception {
+        for (int i = 0; i < 2; i++) {
+            assertTrue(i >= 0);
+        }
+    }
+
+    interface Bar {
+        void bar();
+    }
+}
+'''
+
+
+def _Stream(lexer, source, lineno):
+  """Return the tokens of source with the lexer state after each one"""
+  lexer.lineno = lineno
+  lexer.input(source)
+  stream = []
+  while True:
+    token = lexer.token()
+    if token is not None:
+      token = (token.type, token.value, token.lineno, token.lexpos)
+    stream.append((token, lexer.lexpos, lexer.lineno))
+    if token is None:
+      return stream
+
+
+def _Positions(tree):
+  compact = compact_tree.CompactTree.FromTree(tree)
+  return (compact.kinds, compact.lexposes, compact.lexends, compact.linenos,
+          compact.strings)
+
+
+class FastLexerTest(unittest.TestCase):
+  def setUp(self):
+    self.ply_lexer = lex.lex(module=parser.MyLexer(), optimize=1)
+    self.lexer = parser.FastLexer()
+
+  def testSameTokensAsPly(self):
+    stdout = sys.stdout
+    try:
+      for source in _SOURCES + [_CLASS, _CLASS.replace('\n', '\r\n')]:
+        sys.stdout = expected_output = StringIO.StringIO()
+        expected = _Stream(self.ply_lexer, source, 3)
+        sys.stdout = output = StringIO.StringIO()
+        self.assertEqual(_Stream(self.lexer, source, 3), expected)
+        self.assertEqual(output.getvalue(), expected_output.getvalue())
+    finally:
+      sys.stdout = stdout
+
+  def testIdentifiersAreInterned(self):
+    for source in ['foo + foo', u'foo + foo']:
+      self.lexer.input(source)
+      first, _, second = list(self.lexer)
+      self.assertEqual(first.value, 'foo')
+      self.assertIs(first.value, second.value)
+    self.lexer.input('class klass')
+    self.assertEqual([i.type for i in self.lexer], ['CLASS', 'NAME'])
+
+  def testStartAtLexpos(self):
+    self.lexer.input('a\nb\nc')
+    self.lexer.lexpos = 2
+    self.lexer.lineno = 7
+    self.assertEqual([(i.value, i.lineno, i.lexpos) for i in self.lexer],
+                     [('b', 7, 2), ('c', 8, 4)])
+    self.assertEqual(self.lexer.lexpos, 6)
+
+  def testIterTokens(self):
+    tokens = parser.iter_tokens('a\n+ 1', lineno=2)
+    self.assertEqual(next(tokens).value, 'a')
+    parser.Parser().parse_string('class B {}')
+    self.assertEqual([(i.type, i.lineno, i.lexpos) for i in tokens],
+                     [('+', 3, 2), ('NUM', 3, 4)])
+
+
+class FastLexerParserTest(unittest.TestCase):
+  def setUp(self):
+    self.parser = parser.Parser()
+    self.ply_parser = parser.Parser(fast_lexer=False)
+
+  def testSamePositions(self):
+    for source in [_CLASS, _CLASS.replace('\n', '\r\n')]:
+      tree = self.parser.parse_string(source)
+      self.assertIsInstance(tree, model.CompilationUnit)
+      self.assertEqual(_Positions(tree),
+                       _Positions(self.ply_parser.parse_string(source)))
+      self.assertEqual(_Positions(self.parser.parse_header(source)),
+                       _Positions(self.ply_parser.parse_header(source)))
+      tree = self.parser.parse_string(source, lazy_bodies=True)
+      model.parse_bodies(tree)
+      self.assertEqual(_Positions(tree),
+                       _Positions(self.ply_parser.parse_string(source)))
+
+
+if __name__ == '__main__':
+  unittest.main()
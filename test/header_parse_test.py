@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import auto_change
+import base_agent
+import model
+import parse_cache
+import parser
+from test_util import TempDirTestCase
+
+import logging
+import os
+import unittest
+
+_SOURCE = '''package org.chromium.foo;
+
+import android.test.InstrumentationTestCase;
+import static org.junit.Assert.assertTrue;
+
+/** Tests {@link Foo}. */
+@SuppressWarnings({"a", "b"})
+public abstract class FooTest extends InstrumentationTestCase {
+  private static final String[] NAMES = {"x", "y"};
+
+  class Inner extends Object {
+    void f() { if (true) { g(); } }
+  }
+
+  public void testFoo() {
+    assertTrue("}", NAMES.length == 2);
+  }
+}
+
+interface Bar extends Baz { int X = 1; }
+'''
+
+_java_parser = None
+
+
+def _Parser():
+  global _java_parser
+  if _java_parser is None:
+    logger = logging.getLogger('parser_logger')
+    logger.setLevel(logging.ERROR)
+    _java_parser = parser.Parser(logger)
+  return _java_parser
+
+
+class ParseHeaderTest(unittest.TestCase):
+  def setUp(self):
+    self.parser = _Parser()
+
+  def testHeadersMatchFullParse(self):
+    header = self.parser.parse_header(_SOURCE)
+    full = self.parser.parse_string(_SOURCE)
+    self.assertTrue(header.package_declaration.structurally_equal(
+        full.package_declaration))
+    self.assertTrue(model.structurally_equal(
+        header.import_declarations, full.import_declarations))
+    self.assertEqual(len(header.type_declarations), 2)
+    for short, whole in zip(header.type_declarations, full.type_declarations):
+      self.assertEqual(short.body, [])
+      self.assertEqual((short.name, short.lexpos, short.lexspan, short.lineno),
+                       (whole.name, whole.lexpos, whole.lexspan, whole.lineno))
+      self.assertTrue(model.structurally_equal(
+          short.modifiers, whole.modifiers))
+    self.assertEqual(header.type_declarations[0].extends.name.value,
+                     'InstrumentationTestCase')
+
+  def testMainClassAndSuperClass(self):
+    _, header_table, _, _ = base_agent._TraverseTree(
+        self.parser.parse_header(_SOURCE))
+    _, full_table, _, _ = base_agent._TraverseTree(
+        self.parser.parse_string(_SOURCE))
+    main_class, super_class_name = (
+        base_agent._GetMainClassAndSuperClassName(header_table))
+    full_main_class, full_super_class_name = (
+        base_agent._GetMainClassAndSuperClassName(full_table))
+    self.assertEqual((main_class.name, super_class_name),
+                     (full_main_class.name, full_super_class_name))
+
+
+class LoadHeaderTest(TempDirTestCase):
+  def setUp(self):
+    super(LoadHeaderTest, self).setUp()
+    self.Write(_SOURCE)
+
+  def testLoadFull(self):
+    agent = base_agent.BaseAgent(_Parser(), self.path, header_only=True)
+    self.assertTrue(agent._header_only)
+    self.assertEqual(agent.super_class_name, 'InstrumentationTestCase')
+    self.assertIn('abstract', agent.main_class.modifiers)
+    self.assertNotIn(model.MethodDeclaration, agent.element_table)
+    agent.LoadFull()
+    self.assertFalse(agent._header_only)
+    self.assertEqual(
+        [m.name for m in agent.element_table[model.MethodDeclaration]],
+        ['f', 'testFoo'])
+
+  def testLoadFullDoesNotReadAgain(self):
+    agent = base_agent.BaseAgent(_Parser(), self.path, header_only=True)
+    os.remove(self.path)
+    agent.LoadFull()
+    self.assertEqual(
+        [m.name for m in agent.element_table[model.MethodDeclaration]],
+        ['f', 'testFoo'])
+
+  def testCopiedAgentKeepsHeaderOnly(self):
+    loaded = base_agent.BaseAgent(_Parser(), self.path, header_only=True)
+    agent = base_agent.BaseAgent(_Parser(), self.path, agent=loaded)
+    self.assertTrue(agent._header_only)
+
+  def testCachedSeparately(self):
+    cache_dir = os.path.join(self.directory, 'cache')
+    parse_cache.SetDefaultCache(parse_cache.ParseCache(cache_dir))
+    try:
+      header = parse_cache.ParseFile(_Parser(), self.path, header=True)
+      full = parse_cache.ParseFile(_Parser(), self.path)
+      self.assertEqual(header.type_declarations[0].body, [])
+      self.assertNotEqual(full.type_declarations[0].body, [])
+      self.assertEqual(
+          parse_cache.ParseFile(_Parser(), self.path, header=True)
+          .type_declarations[0].body, [])
+    finally:
+      parse_cache.SetDefaultCache(None)
+
+  def _ConvertCountingCalls(self, names):
+    """Convert self.path, returning the agent and the calls to the parser
+    functions of names"""
+    calls = []
+    originals = dict((name, getattr(parser, name)) for name in names)
+    def _Counting(name):
+      def _Call(*args):
+        calls.append(name)
+        return originals[name](*args)
+      return _Call
+    for name in names:
+      setattr(parser, name, _Counting(name))
+    try:
+      agent = auto_change.ConvertFile(
+          _Parser(), ['instrumentation'], self.path, save_as_new=True)
+    finally:
+      for name, function in originals.iteritems():
+        setattr(parser, name, function)
+    return agent, calls
+
+  def testConvertFileReadsAndScansOnce(self):
+    self.Write('package a;\n\nimport android.test.InstrumentationTestCase;\n\n'
+               'public class FooTest extends InstrumentationTestCase {\n'
+               '  @SmallTest\n  public void testFoo() { assertTrue(true); }\n}\n')
+    agent, calls = self._ConvertCountingCalls(
+        ['read_source', 'find_java8_syntax'])
+    self.assertFalse(agent._header_only)
+    self.assertIn('@Test', agent._modifiedContent())
+    self.assertEqual(calls, ['read_source', 'find_java8_syntax'])
+
+  def testJava8FileIsScannedOnce(self):
+    self.Write('public class FooTest extends InstrumentationTestCase {\n'
+               '  Runnable r = () -> {};\n}\n')
+    agent, calls = self._ConvertCountingCalls(['find_java8_syntax'])
+    self.assertIsNone(agent)
+    self.assertEqual(calls, ['find_java8_syntax'])
+
+if __name__ == '__main__':
+  unittest.main()
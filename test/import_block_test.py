@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+from test_util import FakeParser, TempDirTestCase
+
+import unittest
+
+
+def _Positions(source, text):
+  """Return the lexpos and lexspan parse_string would give text in source"""
+  start = source.index(text) + 2
+  return {'lexpos': start, 'lexspan': (start, start + len(text) - 1)}
+
+
+class FormatImportsTest(unittest.TestCase):
+  def testChromiumOrder(self):
+    imports = [(False, 'java.util.List'), (False, 'org.junit.Test'),
+               (False, 'org.chromium.base.Log'), (False, 'android.os.Bundle'),
+               (True, 'org.junit.Assert.assertTrue'),
+               (False, 'com.google.android.apps.chrome.Foo'),
+               (False, 'com.android.Bar'), (False, 'org.junit.Assert'),
+               (False, 'unknown.Baz')]
+    self.assertEqual(base_agent._FormatImports(imports), '\n'.join([
+        'import static org.junit.Assert.assertTrue;',
+        '',
+        'import android.os.Bundle;',
+        '',
+        'import com.android.Bar;',
+        '',
+        'import org.junit.Assert;',
+        'import org.junit.Test;',
+        '',
+        'import com.google.android.apps.chrome.Foo;',
+        '',
+        'import org.chromium.base.Log;',
+        '',
+        'import java.util.List;',
+        '',
+        'import unknown.Baz;']))
+
+  def testParseImport(self):
+    self.assertEqual(base_agent._ParseImport('org.junit.Test'),
+                     (False, 'org.junit.Test'))
+    self.assertEqual(base_agent._ParseImport('static org.junit.Assert.fail'),
+                     (True, 'org.junit.Assert.fail'))
+
+
+class RewriteImportsTest(TempDirTestCase):
+  def _Agent(self, source, imports):
+    self.Write(source)
+    tree = model.CompilationUnit(
+        package_declaration=model.PackageDeclaration(
+            model.Name('a'), **_Positions(source, 'package a;')),
+        import_declarations=[
+            model.ImportDeclaration(
+                model.Name(name), **_Positions(source, 'import %s;' % name))
+            for name in imports],
+        type_declarations=[model.ClassDeclaration(
+            'FooTest', [], **_Positions(source, 'class FooTest {}'))])
+    return base_agent.BaseAgent(FakeParser(tree), self.path)
+
+  def _Saved(self, agent):
+    agent.Save()
+    with open(self.path) as f:
+      return f.read()
+
+  def testSortsAddsAndRemoves(self):
+    agent = self._Agent(
+        'package a;\n\nimport org.junit.Test;\nimport junit.framework.Foo;\n'
+        'import org.chromium.Base;\n\nclass FooTest {}\n',
+        ['org.junit.Test', 'junit.framework.Foo', 'org.chromium.Base'])
+    agent._addImport('android.os.Bundle')
+    agent._addImport('org.junit.Test')
+    agent._removeImport('Foo')
+    agent._insertAbove(agent.main_class, '@RunWith(Runner.class)')
+    self.assertEqual(self._Saved(agent),
+        'package a;\n\nimport android.os.Bundle;\n\nimport org.junit.Test;\n'
+        '\nimport org.chromium.Base;\n\n@RunWith(Runner.class)\n'
+        'class FooTest {}\n')
+
+  def testKeepsBlockWithComments(self):
+    agent = self._Agent(
+        'package a;\n\nimport org.junit.Test;\n// Keep.\n'
+        'import org.chromium.Base;\n\nclass FooTest {}\n',
+        ['org.junit.Test', 'org.chromium.Base'])
+    agent._addImport('android.os.Bundle')
+    agent._removeImport('org.junit.Test')
+    self.assertEqual(self._Saved(agent),
+        'package a;\n\n// Keep.\nimport org.chromium.Base;\n'
+        'import android.os.Bundle;\n\nclass FooTest {}\n')
+
+  def testNoImports(self):
+    agent = self._Agent('package a;\n\nclass FooTest {}\n', [])
+    agent._addImport('org.junit.Test')
+    agent._addImport('android.os.Bundle')
+    self.assertEqual(self._Saved(agent),
+        'package a;\n\nimport android.os.Bundle;\n\nimport org.junit.Test;\n'
+        '\nclass FooTest {}\n')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+import parser
+import test_convert_agent
+from test_util import TempDirTestCase
+
+import cPickle
+import logging
+import unittest
+
+_SOURCE = '''package org.chromium.foo;
+
+import android.test.InstrumentationTestCase;
+
+public class FooTest extends InstrumentationTestCase {
+  static { init(); }
+  private int[] mValues = {1, 2};
+  private Runnable mRunnable = new Runnable() {
+    public void run() { go(); }
+  };
+
+  public FooTest() throws Exception {
+    super();
+  }
+
+  @Override
+  protected void setUp() throws Exception {
+    super.setUp();
+    if (mValues.length > 1) { mRunnable.run(); }
+  }
+
+  public void testFoo() {
+    assertEquals("{", bar(1, 2));
+  }
+
+  class Inner {
+    void g() { h(); }
+  }
+
+  enum Kind {
+    A { void k() {} }, B;
+    void m() { n(); }
+  }
+}
+'''
+
+_java_parser = None
+
+
+def _Parser():
+  global _java_parser
+  if _java_parser is None:
+    logger = logging.getLogger('parser_logger')
+    logger.setLevel(logging.ERROR)
+    _java_parser = parser.Parser(logger)
+  return _java_parser
+
+
+def _Members(tree):
+  return dict((m.name, m) for m in tree.type_declarations[0].body
+              if isinstance(m, (model.MethodDeclaration,
+                                model.ConstructorDeclaration,
+                                model.ClassDeclaration,
+                                model.EnumDeclaration)))
+
+
+class LazyParseTest(unittest.TestCase):
+  def setUp(self):
+    self.parser = _Parser()
+
+  def testOnlyMethodBodiesAreDeferred(self):
+    members = _Members(self.parser.parse_string(_SOURCE, lazy_bodies=True))
+    self.assertFalse(model.is_parsed(members['FooTest'], 'block'))
+    self.assertFalse(model.is_parsed(members['setUp'], 'body'))
+    self.assertFalse(model.is_parsed(members['testFoo'], 'body'))
+    self.assertFalse(
+        model.is_parsed(members['Inner'].body[0], 'body'))
+    # Enum constant bodies stay as they are, members after the ';' do not.
+    self.assertFalse(
+        model.is_parsed(members['Kind'].body[-1], 'body'))
+    self.assertTrue(model.is_parsed(
+        members['Kind'].body[0].body[0], 'body'))
+
+  def testSameTreeAsFullParse(self):
+    lazy = self.parser.parse_string(_SOURCE, lazy_bodies=True)
+    full = self.parser.parse_string(_SOURCE)
+    self.assertTrue(lazy.structurally_equal(full))
+    lazy_list = base_agent._TraverseTree(lazy)[0]
+    full_list = base_agent._TraverseTree(full)[0]
+    self.assertEqual(
+        [(type(e), e.lexspan, e.lineno) for e in lazy_list],
+        [(type(e), e.lexspan, e.lineno) for e in full_list])
+
+  def testBodyIsParsedOnce(self):
+    method = _Members(
+        self.parser.parse_string(_SOURCE, lazy_bodies=True))['testFoo']
+    body = method.body
+    self.assertTrue(model.is_parsed(method, 'body'))
+    self.assertIs(method.body, body)
+    self.assertEqual(body[0].expression.name, 'assertEquals')
+
+  def testPickleParsesBodies(self):
+    lazy = self.parser.parse_string(_SOURCE, lazy_bodies=True)
+    copy = cPickle.loads(cPickle.dumps(lazy, cPickle.HIGHEST_PROTOCOL))
+    self.assertTrue(model.is_parsed(_Members(copy)['setUp'], 'body'))
+    self.assertTrue(copy.structurally_equal(self.parser.parse_string(_SOURCE)))
+
+
+class LazyAgent(base_agent.BaseAgent):
+  lazy_bodies = True
+
+
+class LazyAgentTest(TempDirTestCase):
+  def setUp(self):
+    super(LazyAgentTest, self).setUp()
+    self.Write(_SOURCE)
+
+  def testTablesAreBuiltOnFirstUse(self):
+    agent = LazyAgent(_Parser(), self.path)
+    self.assertIsNone(agent._element_list)
+    self.assertEqual(agent.main_class.name, 'FooTest')
+    self.assertEqual(agent.super_class_name, 'InstrumentationTestCase')
+    self.assertFalse(model.is_parsed(_Members(agent._tree)['setUp'], 'body'))
+    eager = base_agent.BaseAgent(_Parser(), self.path)
+    self.assertEqual(
+        [(type(e), e.lexpos) for e in agent.element_list],
+        [(type(e), e.lexpos) for e in eager.element_list])
+
+  def testOffsetsBeforeFirstUse(self):
+    agent = LazyAgent(_Parser(), self.path)
+    eager = base_agent.BaseAgent(_Parser(), self.path)
+    for each in [agent, eager]:
+      each.offset_table[100] += 5
+    self.assertEqual(agent._locToNextElement(120).lexpos,
+                     eager._locToNextElement(120).lexpos)
+
+  def testParsedElementTables(self):
+    agent = LazyAgent(_Parser(), self.path)
+    tables = agent.parsedElementTables()
+    self.assertFalse(model.is_parsed(_Members(agent._tree)['setUp'], 'body'))
+    self.assertIsNone(agent._element_list)
+    eager = base_agent.BaseAgent(_Parser(), self.path)
+    eager_tables = (eager.element_table, eager.main_element_table)
+    for table, eager_table in zip(tables, eager_tables):
+      for element_type in [model.ClassDeclaration, model.MethodDeclaration,
+                           model.ConstructorDeclaration,
+                           model.FieldDeclaration]:
+        self.assertEqual([e.lexpos for e in table[element_type]],
+                         [e.lexpos for e in eager_table[element_type]])
+    self.assertEqual(
+        sorted(m.name for m in tables[0][model.MethodInvocation]),
+        ['go', 'init'])
+
+  def testRuleFileAnalysis(self):
+    analyses = []
+    for lazy in [True, False]:
+      test_convert_agent._analyzed_rule_cache.clear()
+      test_convert_agent._RuleFileAgent.lazy_bodies = lazy
+      try:
+        analyses.append(
+            test_convert_agent._AnalyzeRuleFile(_Parser(), self.path))
+      finally:
+        test_convert_agent._RuleFileAgent.lazy_bodies = True
+        test_convert_agent._analyzed_rule_cache.clear()
+    self.assertEqual(analyses[0], analyses[1])
+    self.assertIn('testFoo', analyses[0]['api'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Time parser.FastLexer against the PLY lexer of parser.MyLexer
+
+Reports tokens per second of both lexers on the java snippets of the
+legacy parser tests in test/, on a synthetic file of generated classes
+and, with -d, on the *Test.java files of a directory. Run from the
+repository root:
+
+  PYTHONPATH=src python test/lexer_benchmark.py -d "$CLANKIUM_SRC"
+"""
+
+import parser
+
+import argparse
+import ast
+import glob
+import os
+import sys
+import time
+
+import ply.lex as lex
+
+_CLASS = '''
+/**
+ * Tests for Widget%(n)d.
+ */
+@RunWith(BaseJUnit4ClassRunner.class)
+public class Widget%(n)dTest extends InstrumentationTestCase {
+    private static final String TAG = "Widget%(n)d";
+    private static final long TIMEOUT_MS = 0x%(n)xL * 3000L;
+    private final List<Map<String, Integer>> mValues = new ArrayList<>();
+    private char mSeparator = '\\t';
+
+    @Override
+    protected void setUp() throws Exception {
+        super.setUp();
+        mValues.clear();
+    }
+
+    // Checks the bounds and the shifts.
+    @SmallTest
+    @Feature({"Widget", "Bounds"})
+    public void testBounds%(n)d() throws InterruptedException {
+        int[] values = {1, 2, %(n)d};
+        for (int i = 0; i < values.length; ++i) {
+            values[i] <<= 2;
+            values[i] >>>= 1;
+            assertTrue("value " + i, values[i] >= 0 && values[i] != -1);
+        }
+        double ratio = values.length > 0 ? 1.5e3 / values.length : .25;
+        if (ratio <= 0.0 || !(ratio instanceof Double)) {
+            fail(String.format("%%s: %%d", TAG, values[0] %% 7));
+        }
+    }
+
+    private static int shift(int value, int... bits) {
+        return bits.length == 0 ? value >> 1 : value ^ (bits[0] & 0xFF);
+    }
+}
+'''
+
+
+def _FixtureSources():
+  """Return the java snippets in the string literals of the legacy tests"""
+  sources = []
+  directory = os.path.dirname(os.path.abspath(__file__))
+  for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+    with open(path) as f:
+      tree = ast.parse(f.read(), path)
+    sources.extend(node.s for node in ast.walk(tree)
+                   if isinstance(node, ast.Str) and node.s.strip())
+  return sources
+
+
+def _SyntheticSource(classes):
+  return ''.join(_CLASS % {'n': n} for n in range(classes))
+
+
+def _TestFiles(directory):
+  sources = []
+  for dirpath, _, filenames in os.walk(directory):
+    for filename in filenames:
+      if filename.endswith('Test.java'):
+        with open(os.path.join(dirpath, filename)) as f:
+          sources.append(f.read())
+  return sources
+
+
+def _Tokenize(lexer, sources):
+  count = 0
+  for source in sources:
+    lexer.input(source)
+    for _ in lexer:
+      count += 1
+  return count
+
+
+def _BestTime(lexer, sources, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.time()
+    count = _Tokenize(lexer, sources)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return count, best
+
+
+def _Report(name, sources, repeat):
+  ply_lexer = lex.lex(module=parser.MyLexer(), optimize=1)
+  fast_lexer = parser.FastLexer()
+  count, elapsed = _BestTime(fast_lexer, sources, repeat)
+  ply_count, ply_elapsed = _BestTime(ply_lexer, sources, repeat)
+  if count != ply_count:
+    print '%s: %d tokens against %d from PLY' % (name, count, ply_count)
+  print '%-10s %10d %14.0f %14.0f %8.2fx' % (
+      name, count, count / elapsed, ply_count / ply_elapsed,
+      ply_elapsed / elapsed)
+
+
+def main():
+  arg_parser = argparse.ArgumentParser()
+  arg_parser.add_argument('-d', '--directory',
+                          help='Directory searched for *Test.java files')
+  arg_parser.add_argument('-c', '--classes', type=int, default=500,
+                          help='Number of classes in the synthetic file')
+  arg_parser.add_argument('-r', '--repeat', type=int, default=5,
+                          help='Runs per corpus, the fastest one is reported')
+  arguments = arg_parser.parse_args()
+
+  print '%-10s %10s %14s %14s %9s' % (
+      'corpus', 'tokens', 'tokens/s', 'PLY tokens/s', 'speedup')
+  _Report('fixtures', _FixtureSources(), arguments.repeat)
+  _Report('synthetic', [_SyntheticSource(arguments.classes)], arguments.repeat)
+  if arguments.directory:
+    _Report('directory', _TestFiles(arguments.directory), arguments.repeat)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
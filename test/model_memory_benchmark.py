@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Report the memory taken by model nodes on the largest *Test.java files
+
+Bytes per node counts the node itself, its __dict__ and its own _fields
+list where it has them, the field values are not counted. The same is
+reported for the compact_tree form of the files, arrays and string table
+included. Run from the repository root against a Chromium checkout:
+
+  PYTHONPATH=src python test/model_memory_benchmark.py -d "$CLANKIUM_SRC"
+
+To compare with an older revision, check it out somewhere and pass its
+src directory, e.g.
+
+  git worktree add /tmp/baseline <revision>
+  PYTHONPATH=src python test/model_memory_benchmark.py -d "$CLANKIUM_SRC" \\
+      --baseline /tmp/baseline/src
+"""
+
+import model
+import parser
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+def _LargestTestFiles(directory, count):
+  paths = []
+  for dirpath, _, filenames in os.walk(directory):
+    for filename in filenames:
+      if filename.endswith('Test.java'):
+        path = os.path.join(dirpath, filename)
+        paths.append((os.path.getsize(path), path))
+  paths.sort(reverse=True)
+  return [path for _, path in paths[:count]]
+
+
+def _NodeBytes(node):
+  size = sys.getsizeof(node)
+  attributes = getattr(node, '__dict__', None)
+  if attributes is not None:
+    size += sys.getsizeof(attributes)
+    if '_fields' in attributes:
+      size += sys.getsizeof(attributes['_fields'])
+  return size
+
+
+def _TreeBytes(tree):
+  """Return (number of nodes, bytes) for tree"""
+  nodes, size = 0, 0
+  stack = [tree]
+  while stack:
+    current = stack.pop()
+    if isinstance(current, list):
+      stack.extend(current)
+    elif isinstance(current, model.SourceElement):
+      nodes += 1
+      size += _NodeBytes(current)
+      stack.extend(getattr(current, f) for f in current._fields)
+  return nodes, size
+
+
+def _CompactBytes(tree):
+  # Imported here, a --baseline revision may not have it.
+  import compact_tree
+  compact = compact_tree.CompactTree.FromTree(tree)
+  size = sum(sys.getsizeof(getattr(compact, i)) for i in [
+      'kinds', 'lexposes', 'lexends', 'linenos', 'parents', 'first_children',
+      'next_siblings', 'names', 'class_depths', 'strings'])
+  size += sum(sys.getsizeof(i) for i in compact.strings)
+  return size
+
+
+def _Totals(paths, compact=False):
+  java_parser = parser.Parser()
+  nodes, size, compact_size = 0, 0, 0
+  for path in paths:
+    with open(path) as f:
+      tree = java_parser.parse_string(f.read())
+    if tree is None:
+      continue
+    tree_nodes, tree_size = _TreeBytes(tree)
+    nodes += tree_nodes
+    size += tree_size
+    if compact:
+      compact_size += _CompactBytes(tree)
+  return nodes, size, compact_size
+
+
+def main():
+  arg_parser = argparse.ArgumentParser()
+  arg_parser.add_argument('-d', '--directory', default='.',
+                          help='Directory searched for *Test.java files')
+  arg_parser.add_argument('-n', '--count', type=int, default=10,
+                          help='Number of files, largest first')
+  arg_parser.add_argument('--baseline',
+                          help='src directory of the revision to compare to')
+  arg_parser.add_argument('--totals', action='store_true',
+                          help='Only print the node and byte totals')
+  arguments = arg_parser.parse_args()
+
+  paths = _LargestTestFiles(arguments.directory, arguments.count)
+  nodes, size, compact_size = _Totals(
+      paths, compact=not arguments.totals)
+  if arguments.totals:
+    print nodes, size
+    return
+  print '%d files, %d nodes' % (len(paths), nodes)
+  if nodes:
+    print 'bytes per node %.1f' % (float(size) / nodes)
+    print 'compact bytes per node %.1f' % (float(compact_size) / nodes)
+  if arguments.baseline:
+    environment = dict(os.environ, PYTHONPATH=arguments.baseline)
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--totals',
+         '-d', arguments.directory, '-n', str(arguments.count)],
+        env=environment)
+    baseline_nodes, baseline_size = [
+        int(i) for i in output.strip().splitlines()[-1].split()]
+    if baseline_nodes:
+      print 'baseline bytes per node %.1f' % (
+          float(baseline_size) / baseline_nodes)
+    if size:
+      print 'baseline %d bytes, %.2fx' % (
+          baseline_size, float(baseline_size) / size)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+
+import cPickle
+import unittest
+
+
+def _Tree():
+  call = model.MethodInvocation(
+      'assertTrue', arguments=[model.Name('a', lexpos=30)],
+      lexpos=20, lexspan=(20, 33), lineno=4)
+  loop = model.While(model.Literal('true'), body=model.Block(
+      [model.ExpressionStatement(call)]))
+  loop.label = 'outer'
+  return model.CompilationUnit(type_declarations=[
+      model.ClassDeclaration('FooTest', [
+          model.MethodDeclaration('testFoo', body=[loop])])])
+
+
+class RecordingVisitor(model.Visitor):
+  def __init__(self):
+    super(RecordingVisitor, self).__init__()
+    self.names = []
+
+  def visit_Name(self, name):
+    self.names.append(name.value)
+    return True
+
+
+class SlotsTest(unittest.TestCase):
+  def testNoInstanceDict(self):
+    for element in [model.Name('a'), model.Assignment('=', 'a', 'b'),
+                    model.VariableDeclaration('int', []), model.Empty()]:
+      self.assertFalse(hasattr(element, '__dict__'), type(element).__name__)
+
+  def testFieldsAreShared(self):
+    self.assertIs(model.Name('a')._fields, model.Name('b')._fields)
+    self.assertEqual(model.Assignment._fields, ('operator', 'lhs', 'rhs'))
+    self.assertEqual(model.Empty._fields, ())
+
+  def testPickle(self):
+    tree = _Tree()
+    for protocol in range(cPickle.HIGHEST_PROTOCOL + 1):
+      copy = cPickle.loads(cPickle.dumps(tree, protocol))
+      self.assertTrue(copy.structurally_equal(tree))
+      loop = copy.type_declarations[0].body[0].body[0]
+      self.assertEqual(loop.label, 'outer')
+      call = loop.body.statements[0].expression
+      self.assertEqual((call.lexpos, call.lexspan, call.lineno),
+                       (20, (20, 33), 4))
+
+  def testIdentityEquality(self):
+    tree = _Tree()
+    self.assertEqual(tree, tree)
+    self.assertNotEqual(_Tree(), _Tree())
+    self.assertNotIn(model.Name('a'), [model.Name('a')])
+    self.assertEqual(len(set([tree, tree, _Tree()])), 2)
+
+  def testStructuralEquality(self):
+    self.assertTrue(_Tree().structurally_equal(_Tree()))
+    self.assertTrue(model.Name('a').structurally_equal(
+        model.Name('a', lexpos=3)))
+    self.assertFalse(model.Name('a').structurally_equal(model.Name('b')))
+    self.assertFalse(model.Name('a').structurally_equal('a'))
+    self.assertFalse(model.Name('a').structurally_equal(model.Literal('a')))
+    self.assertTrue(model.structurally_equal(
+        [model.Name('a'), 'b'], [model.Name('a'), 'b']))
+    self.assertFalse(model.structurally_equal(
+        [model.Name('a')], [model.Name('a'), model.Name('b')]))
+
+  def testChangedAfterComparison(self):
+    tree, other = _Tree(), _Tree()
+    self.assertTrue(tree.structurally_equal(other))
+    tree.structural_hash()
+    name = model.Name('b')
+    tree.type_declarations[0].name = 'Bar'
+    other.type_declarations[0].name = 'Bar'
+    self.assertTrue(tree.structurally_equal(other))
+    other.type_declarations[0].name = 'Baz'
+    self.assertFalse(tree.structurally_equal(other))
+    self.assertTrue(model.Additive('+', name, name).structurally_equal(
+        model.BinaryExpression('+', name, name)))
+
+  def testStructuralHash(self):
+    tree, other = _Tree(), _Tree()
+    self.assertEqual(tree.structural_hash(), other.structural_hash())
+    loop = other.type_declarations[0].body[0].body[0]
+    self.assertEqual(loop.structural_hash(),
+                     tree.type_declarations[0].body[0].body[0]
+                     .structural_hash())
+    self.assertNotEqual(model.Name('a').structural_hash(),
+                        model.Name('b').structural_hash())
+    # The hash is cached and does not travel through pickles.
+    copy = cPickle.loads(cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL))
+    self.assertFalse(hasattr(copy, '_structural_hash'))
+    self.assertEqual(copy.structural_hash(), tree.structural_hash())
+
+  def testRepr(self):
+    self.assertEqual(repr(model.Name('a')), "Name(value='a')")
+
+  def testAccept(self):
+    visitor = RecordingVisitor()
+    _Tree().accept(visitor)
+    self.assertEqual(visitor.names, ['a'])
+
+  def testClassesWithoutFields(self):
+    classes = [i for i in vars(model).itervalues() if isinstance(i, type) and
+               issubclass(i, model.SourceElement) and not i._fields]
+    self.assertIn(model.Empty, classes)
+    self.assertIn(model.EmptyDeclaration, classes)
+    for element_class in classes:
+      element = element_class(lexpos=5, lexspan=(5, 5))
+      tree = model.CompilationUnit(type_declarations=[
+          model.ClassDeclaration('A', [element], lexpos=0, lexspan=(0, 9))])
+      element_table = base_agent._TraverseTree(tree)[1]
+      self.assertEqual(element_table[element_class], [element])
+      self.assertTrue(tree.structurally_equal(tree))
+      tree.accept(model.Visitor())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import base_agent
+
+import collections
+import random
+import unittest
+
+
+def _NaiveSum(table, lex):
+  return sum(v for k, v in table.items() if k <= lex)
+
+
+class OffsetTableTest(unittest.TestCase):
+  def testSeed(self):
+    table = base_agent._OffsetTable(10)
+    table[0] = -2
+    self.assertEqual(table.Sum(0), -2)
+    self.assertEqual(table.Sum(9), -2)
+    self.assertEqual(table.Sum(-1), 0)
+
+  def testAccumulateAndOverwrite(self):
+    table = base_agent._OffsetTable(10)
+    table[4] += 3
+    table[4] += 2
+    self.assertEqual(table[4], 5)
+    self.assertEqual(table.Sum(3), 0)
+    self.assertEqual(table.Sum(4), 5)
+    table[4] = -1
+    self.assertEqual(table.Sum(100), -1)
+
+  def testGrowsPastInitialSize(self):
+    table = base_agent._OffsetTable(4)
+    table[2] = 1
+    table[50] = 7
+    self.assertEqual(table.Sum(49), 1)
+    self.assertEqual(table.Sum(50), 8)
+    self.assertEqual(table.Sum(1000), 8)
+
+  def testNegativeKey(self):
+    table = base_agent._OffsetTable(10)
+    table[0] = -2
+    table[-1] += 3
+    self.assertEqual(table[-1], 3)
+    self.assertEqual(table.Sum(-2), 0)
+    self.assertEqual(table.Sum(-1), 3)
+    self.assertEqual(table.Sum(0), 1)
+    table[30] = 1
+    table[-1] += 1
+    self.assertEqual(table.Sum(30), 3)
+    self.assertEqual(sorted(table.items()), [(-1, 4), (0, -2), (30, 1)])
+    tree = base_agent._BinaryIndexedTree([0] * 4)
+    self.assertRaises(ValueError, tree.Add, -1, 1)
+
+  def testMatchesNaiveScan(self):
+    rand = random.Random(0)
+    table = base_agent._OffsetTable(100)
+    naive = collections.defaultdict(int)
+    for _ in range(500):
+      lex = rand.randint(-3, 300)
+      value = rand.randint(-20, 20)
+      if rand.random() < 0.5:
+        table[lex] += value
+        naive[lex] += value
+      else:
+        table[lex] = value
+        naive[lex] = value
+      probe = rand.randint(-5, 320)
+      self.assertEqual(table.Sum(probe), _NaiveSum(naive, probe))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import base_agent
+import parse_cache
+import parser
+from test_util import FakeParser, TempDirTestCase
+
+import os
+import unittest
+
+
+class ParseCacheTest(TempDirTestCase):
+  def setUp(self):
+    super(ParseCacheTest, self).setUp()
+    self.cache_dir = self.directory
+    self.parser = FakeParser()
+
+  def testHitSkipsParse(self):
+    cache = parse_cache.ParseCache(self.cache_dir)
+    self.assertEqual(cache.Parse(self.parser, 'class A {}'),
+                     {'source': 'class A {}'})
+    self.assertEqual(cache.Parse(self.parser, 'class A {}'),
+                     {'source': 'class A {}'})
+    self.assertEqual(self.parser.parsed, ['class A {}'])
+
+  def testPersistsAcrossInstances(self):
+    parse_cache.ParseCache(self.cache_dir).Parse(self.parser, 'class A {}')
+    parse_cache.ParseCache(self.cache_dir).Parse(self.parser, 'class A {}')
+    self.assertEqual(len(self.parser.parsed), 1)
+
+  def testChangedContentMisses(self):
+    cache = parse_cache.ParseCache(self.cache_dir)
+    cache.Parse(self.parser, 'class A {}')
+    cache.Parse(self.parser, 'class B {}')
+    self.assertEqual(self.parser.parsed, ['class A {}', 'class B {}'])
+
+  def testEvictsLeastRecentlyUsed(self):
+    cache = parse_cache.ParseCache(self.cache_dir)
+    for source in ['class A {}', 'class B {}']:
+      cache.Parse(self.parser, source)
+    os.utime(cache._EntryPath(cache.Key('class A {}')), (1, 1))
+    cache.max_bytes = max(size for _, size, _ in cache._Entries())
+    cache.Evict()
+    self.assertFalse(cache.Get(cache.Key('class A {}'))[0])
+    self.assertTrue(cache.Get(cache.Key('class B {}'))[0])
+
+
+class Java8Test(TempDirTestCase):
+  def setUp(self):
+    super(Java8Test, self).setUp()
+    self.parser = FakeParser()
+
+  def testFindJava8Syntax(self):
+    self.assertIsNone(parser.find_java8_syntax('a - > b; c : : d;'))
+    self.assertIsNone(parser.find_java8_syntax(
+        '"->" + \'"\' + "\\"::" // ->\n/* a::b\n c -> d */'))
+    self.assertEqual(parser.find_java8_syntax('f(x -> x);'), 4)
+    self.assertEqual(parser.find_java8_syntax(r'"\\" + Foo::bar'), 10)
+
+  def testJava8FileIsNotParsed(self):
+    path = self.Write('class A {\n  Runnable r = () -> {};\n}')
+    self.assertIsNone(parse_cache.ParseFile(self.parser, path))
+    self.assertIsNone(parse_cache.ParseFile(self.parser, path, header=True))
+    self.assertEqual(self.parser.parsed, [])
+    self.assertEqual(parse_cache.Java8Report(), [
+        'Skipped 1 files with Java 8 syntax:', '  %s:2' % path])
+
+  def testChangedFileIsScannedAgain(self):
+    path = self.Write('class A { Foo::bar }')
+    parse_cache.ParseFile(self.parser, path)
+    self.Write('class A { "Foo::bar" }')
+    os.utime(path, (1, 1))
+    self.assertEqual(parse_cache.ParseFile(self.parser, path),
+                     {'source': 'class A { "Foo::bar" }'})
+    self.assertEqual(parse_cache.Java8Files(), {})
+
+  def testMerge(self):
+    parse_cache.MergeJava8Files({'/a/FooTest.java': (10, 1.0, 3)})
+    self.assertEqual(parse_cache.Java8Report()[1:], ['  /a/FooTest.java:3'])
+
+
+class LoadFileTest(TempDirTestCase):
+  def testPositionsIndexDecodedText(self):
+    with open(self.path, 'wb') as f:
+      f.write(u'// caf\xe9 \u2014\nclass A { int b; }'.encode('utf-8'))
+    tree, source = parse_cache.LoadFile(parser.Parser(), self.path)
+    self.assertEqual(source, u'// caf\xe9 \u2014\nclass A { int b; }')
+    field = tree.type_declarations[0].body[0]
+    variable = field.variable_declarators[0].variable
+    # Positions count the '++' prefix of parse_string.
+    self.assertEqual(source[variable.lexpos - 2], 'b')
+    self.assertEqual(source[field.lexend - 2], ';')
+
+  def testKnownJava8FileIsNotRead(self):
+    self.Write('class A { Foo::bar }')
+    fake_parser = FakeParser()
+    self.assertEqual(parse_cache.LoadFile(fake_parser, self.path),
+                     (None, u'class A { Foo::bar }'))
+    read_source = parser.read_source
+    parser.read_source = None
+    try:
+      self.assertEqual(parse_cache.LoadFile(fake_parser, self.path),
+                       (None, None))
+      self.assertIsNone(parse_cache.ParseFile(fake_parser, self.path))
+    finally:
+      parser.read_source = read_source
+    self.assertEqual(fake_parser.parsed, [])
+
+  def testKnownJava8FileIsNotSaved(self):
+    self.Write('class A { Foo::bar }')
+    parse_cache.LoadFile(FakeParser(), self.path)
+    agent = base_agent.BaseAgent(FakeParser(), self.path, header_only=True)
+    self.assertTrue(agent._failed_to_parse)
+    self.assertRaises(ValueError, agent.Save)
+    with open(self.path) as f:
+      self.assertEqual(f.read(), 'class A { Foo::bar }')
+
+
+if __name__ == '__main__':
+  unittest.main()
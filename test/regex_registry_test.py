@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import regex_registry
+
+import re
+import unittest
+
+
+class RegexRegistryTest(unittest.TestCase):
+  def tearDown(self):
+    regex_registry.EnableStats(False)
+
+  def testRegisteredPatternIsShared(self):
+    compiled = regex_registry.Register(r'foo(\d)', re.DOTALL)
+    self.assertIs(regex_registry.Register(r'foo(\d)', re.DOTALL), compiled)
+    self.assertIs(regex_registry.Compile(r'foo(\d)', re.DOTALL), compiled)
+    self.assertIs(regex_registry.Compile(compiled), compiled)
+
+  def testDynamicPatternsAreEvicted(self):
+    first = regex_registry.Compile('dynamic0')
+    self.assertIs(regex_registry.Compile('dynamic0'), first)
+    for i in range(regex_registry._MAX_DYNAMIC_PATTERNS):
+      regex_registry.Compile('dynamic%d' % (i + 1))
+    self.assertNotIn(('dynamic0', 0), regex_registry._dynamic)
+    self.assertLessEqual(len(regex_registry._dynamic),
+                         regex_registry._MAX_DYNAMIC_PATTERNS)
+
+  def testStats(self):
+    self.assertEqual(regex_registry.Search('b', 'abc').start(), 1)
+    self.assertEqual(regex_registry.Stats(), {})
+    regex_registry.EnableStats()
+    regex_registry.Search('b', 'abc')
+    regex_registry.Sub('b', 'x', 'abcb', count=1)
+    regex_registry.FindAll('.*', 'a\nb', flags=re.DOTALL)
+    stats = regex_registry.Stats()
+    self.assertEqual(stats[('b', 0)][0], 2)
+    self.assertEqual(stats[('.*', re.DOTALL)][0], 1)
+    regex_registry.MergeStats({('b', 0): (3, 0.5)})
+    self.assertEqual(regex_registry.Stats()[('b', 0)][0], 5)
+    report = regex_registry.Report()
+    self.assertIn("'b'", report[1])
+    self.assertTrue(report[2].endswith('(DOTALL)'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+
+import random
+import unittest
+
+
+def _Apply(text, edits):
+  for start, end, insertion in edits:
+    text = text[:start] + insertion + text[end:]
+  return text
+
+
+class UnchangedSpansTest(unittest.TestCase):
+  def testNoEdits(self):
+    self.assertEqual(base_agent._UnchangedSpans(5, []), [(0, 0, 5)])
+
+  def testInsertionSplitsSpan(self):
+    self.assertEqual(base_agent._UnchangedSpans(10, [(4, 4, 3)]),
+                     [(0, 0, 4), (7, 4, 6)])
+
+  def testReplacement(self):
+    self.assertEqual(base_agent._UnchangedSpans(10, [(2, 5, 1), (0, 0, 2)]),
+                     [(2, 0, 2), (5, 5, 5)])
+
+  def testSpansMatchText(self):
+    rand = random.Random(0)
+    old = u''.join(rand.choice(u'abcdefgh') for _ in range(500))
+    edits = []
+    new = old
+    for _ in range(50):
+      start = rand.randint(0, len(new))
+      end = rand.randint(start, min(len(new), start + 20))
+      insertion = u'X' * rand.randint(0, 5)
+      edits.append((start, end, insertion))
+      new = _Apply(new, [(start, end, insertion)])
+    spans = base_agent._UnchangedSpans(
+        len(old), [(s, e, len(i)) for s, e, i in edits])
+    for new_start, old_start, size in spans:
+      self.assertEqual(new[new_start:new_start + size],
+                       old[old_start:old_start + size])
+    self.assertEqual(sum(size for _, _, size in spans),
+                     len(new) - new.count(u'X'))
+
+
+class EditScriptUnchangedTest(unittest.TestCase):
+  def testRenderReportsUnchangedSpans(self):
+    script = base_agent._EditScript(u'abcdef')
+    script.Replace(1, 2, u'XYZ')
+    script.Replace(4, 4, u'!')
+    unchanged = []
+    self.assertEqual(script.Render(unchanged=unchanged), u'aXYZcd!ef')
+    self.assertEqual(unchanged, [(0, 0, 1), (4, 2, 2), (7, 4, 2)])
+
+
+class ShiftTest(unittest.TestCase):
+  def testShiftElement(self):
+    name = model.Name('foo', lineno=3, lexpos=20, lexspan=(20, 22))
+    unknown = model.SourceElement()
+    base_agent._ShiftElement(name, 5, 1)
+    base_agent._ShiftElement(unknown, 5, 1)
+    self.assertEqual((name.lexpos, name.lexspan, name.lineno),
+                     (25, (25, 27), 4))
+    self.assertEqual((unknown.lexpos, unknown.lexspan, unknown.lineno),
+                     (-1, (-1, -1), -1))
+
+  def testTraverseShiftsDescendants(self):
+    name = model.Name('foo', lineno=3, lexpos=20, lexspan=(20, 22))
+    unary = model.Unary('-', name, lineno=3, lexpos=24, lexspan=(24, 27))
+    element_list = base_agent._TraverseTree(unary, {id(unary): (5, 1)})[0]
+    self.assertEqual((unary.lexpos, unary.lexspan, unary.lineno),
+                     (24, (24, 27), 3))
+    self.assertEqual((name.lexpos, name.lexspan, name.lineno),
+                     (25, (25, 27), 4))
+    self.assertEqual(element_list, [unary, name])
+
+
+if __name__ == '__main__':
+  unittest.main()
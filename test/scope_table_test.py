@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+
+import unittest
+
+
+def _Declaration(declaration_type, variable_type, name, lexpos=-1):
+  return declaration_type(
+      variable_type, [model.VariableDeclarator(model.Variable(name))],
+      lexpos=lexpos)
+
+
+def _Use(name, lexpos):
+  return model.Name(name, lexpos=lexpos)
+
+
+class ScopeTableTest(unittest.TestCase):
+  def setUp(self):
+    # class A {
+    #   float mF;
+    #   Double value(int x) {
+    #     use(x);
+    #     { double x = 1; use(x); }
+    #     use(x);
+    #     new Object() { int mF; void run() { use(mF); } };
+    #   }
+    #   void other() { use(x); use(mF); }
+    # }
+    self.param_use = _Use('x', 30)
+    self.shadowed_use = _Use('x', 50)
+    self.after_block_use = _Use('x', 60)
+    self.anonymous_use = _Use('mF', 80)
+    self.undeclared_use = _Use('x', 110)
+    self.field_use = _Use('mF', 115)
+    inner = model.Block([
+        _Declaration(model.VariableDeclaration, 'double', 'x', lexpos=40),
+        self.shadowed_use])
+    anonymous = model.InstanceCreation(
+        model.Type(model.Name('Object')), body=[
+            _Declaration(model.FieldDeclaration, 'int', 'mF'),
+            model.MethodDeclaration('run', body=[self.anonymous_use])])
+    value = model.MethodDeclaration(
+        'value', return_type=model.Type(model.Name('Double')),
+        parameters=[model.FormalParameter(model.Variable('x'), 'int')],
+        body=[self.param_use, inner, self.after_block_use, anonymous])
+    other = model.MethodDeclaration(
+        'other', body=[self.undeclared_use, self.field_use])
+    self.tree = model.CompilationUnit(type_declarations=[
+        model.ClassDeclaration('A', [
+            _Declaration(model.FieldDeclaration, 'float', 'mF'), value,
+            other])])
+    self.scopes = base_agent._ScopeTable(self.tree)
+
+  def testInnermostDeclarationWins(self):
+    self.assertEqual(self.scopes.TypeOf(self.param_use), 'int')
+    self.assertEqual(self.scopes.TypeOf(self.shadowed_use), 'double')
+    self.assertEqual(self.scopes.TypeOf(self.after_block_use), 'int')
+
+  def testFields(self):
+    self.assertEqual(self.scopes.TypeOf(self.field_use), 'float')
+    self.assertEqual(self.scopes.TypeOf(self.anonymous_use), 'int')
+
+  def testUndeclared(self):
+    self.assertIsNone(self.scopes.TypeOf(self.undeclared_use))
+    self.assertIsNone(self.scopes.TypeOf(_Use('x', 30)))
+
+  def testLocalIsVisibleAfterItsDeclaration(self):
+    early = _Use('y', 10)
+    late = _Use('y', 30)
+    tree = model.MethodDeclaration('f', body=[
+        early, _Declaration(model.VariableDeclaration, 'float', 'y', 20),
+        late])
+    scopes = base_agent._ScopeTable(tree)
+    self.assertIsNone(scopes.TypeOf(early))
+    self.assertEqual(scopes.TypeOf(late), 'float')
+
+  def testReturnTypes(self):
+    self.assertEqual(
+        base_agent._TypeName(self.scopes.return_types['value'][0]), 'Double')
+    self.assertEqual(self.scopes.return_types['other'], ['void'])
+
+
+class TypeNameTest(unittest.TestCase):
+  def testNames(self):
+    self.assertEqual(base_agent._TypeName('float'), 'float')
+    self.assertEqual(
+        base_agent._TypeName(model.Type(model.Name('Float'))), 'Float')
+    self.assertEqual(
+        base_agent._TypeName(model.Type('int', dimensions=2)), 'int[][]')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+
+import random
+import unittest
+
+
+def _Element(start, end):
+  return model.SourceElement(lexpos=start, lexspan=(start, end))
+
+
+def _RandomNested(rand, start, end, depth, spans):
+  """Add properly nested spans within [start, end] to spans"""
+  pos = start
+  while depth > 0 and pos < end:
+    a = rand.randint(pos, end)
+    b = rand.randint(a, min(end, a + (end - start) // 2))
+    spans.append(_Element(a, b))
+    _RandomNested(rand, a + 1, b - 1, depth - 1, spans)
+    pos = b + 1 + rand.randint(0, 5)
+
+
+class SpanIndexTest(unittest.TestCase):
+  def setUp(self):
+    rand = random.Random(0)
+    self.spans = []
+    _RandomNested(rand, 0, 1000, 4, self.spans)
+    self.elements = []
+    for _ in range(300):
+      a = rand.randint(0, 1000)
+      self.elements.append(_Element(a, rand.randint(a, min(1000, a + 50))))
+    self.elements.extend(self.spans)
+
+  def testEnclosing(self):
+    index = base_agent._SpanIndex(self.spans)
+    for strict in (False, True):
+      for e in self.elements:
+        if strict:
+          around = [s for s in self.spans
+                    if s.lexpos < e.lexpos and s.lexend > e.lexend]
+        else:
+          around = [s for s in self.spans
+                    if s.lexpos <= e.lexpos and s.lexend >= e.lexend]
+        found = index.Enclosing(e, strict=strict)
+        if not around:
+          self.assertIsNone(found)
+        else:
+          innermost = min(s.lexend - s.lexpos for s in around)
+          self.assertIsNotNone(found)
+          self.assertIn(id(found), set(id(s) for s in around))
+          self.assertEqual(found.lexend - found.lexpos, innermost)
+
+  def testEmpty(self):
+    index = base_agent._SpanIndex([])
+    self.assertIsNone(index.Enclosing(_Element(1, 2)))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -202,4 +202,5 @@ class StatementTest(unittest.TestCase):
     def assert_stmt(self, stmt, result):
         s = self.parser.parse_statement(stmt)
 #        print 'comparing expected - actual:\n{}\n{}'.format(result, s)
-        self.assertEqual(s, result, 'for {} got {}, expected {}'.format(stmt, s, result))
+        self.assertTrue(model.structurally_equal(s, result),
+                        'for {} got {}, expected {}'.format(stmt, s, result))
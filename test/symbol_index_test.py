@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+from test_util import FakeParser, TempDirTestCase
+
+import unittest
+
+
+def _Import(name, static=False):
+  return model.ImportDeclaration(model.Name(name), static=static)
+
+
+def _Field(*names):
+  return model.FieldDeclaration('int', [
+      model.VariableDeclarator(model.Variable(n)) for n in names])
+
+
+class SymbolIndexTest(unittest.TestCase):
+  def testNames(self):
+    element_table = {
+        model.ImportDeclaration: [
+            _Import('org.junit.Assert'), _Import('other.Assert'),
+            _Import('org.junit.Assert.assertTrue', static=True)],
+        model.FieldDeclaration: [_Field('mA', 'mB'), _Field('mC')],
+        model.MethodDeclaration: [model.MethodDeclaration('nested')],
+    }
+    main_element_table = {
+        model.MethodDeclaration: [model.MethodDeclaration('setUp')],
+    }
+    symbols = base_agent._SymbolIndex(element_table, main_element_table)
+    self.assertEqual(symbols.declared_methods, frozenset(['setUp']))
+    self.assertEqual(symbols.imports, {
+        'Assert': 'org.junit.Assert',
+        'assertTrue': 'org.junit.Assert.assertTrue'})
+    self.assertEqual(symbols.field_names, frozenset(['mA', 'mC']))
+
+  def testEmpty(self):
+    symbols = base_agent._SymbolIndex({}, {})
+    self.assertEqual(symbols.declared_methods, frozenset())
+    self.assertEqual(symbols.imports, {})
+    self.assertEqual(symbols.field_names, frozenset())
+
+
+class AgentPredicateTest(TempDirTestCase):
+  def setUp(self):
+    super(AgentPredicateTest, self).setUp()
+    self.Write('class FooTest {}\n')
+    self.local_call = model.MethodInvocation('helper')
+    self.imported_call = model.MethodInvocation('assertTrue')
+    self.inherited_call = model.MethodInvocation('getActivity')
+    self.targeted_call = model.MethodInvocation(
+        'getActivity', target=model.Name('mRule'))
+    body = [model.MethodDeclaration('helper', body=[
+        model.ExpressionStatement(call) for call in [
+            self.local_call, self.imported_call, self.inherited_call,
+            self.targeted_call]])]
+    tree = model.CompilationUnit(
+        import_declarations=[
+            _Import('org.junit.Assert.assertTrue', static=True)],
+        type_declarations=[model.ClassDeclaration('FooTest', body)])
+    self.agent = base_agent.BaseAgent(FakeParser(tree), self.path)
+
+  def testIsInherited(self):
+    self.assertFalse(self.agent._isInherited(self.local_call))
+    self.assertFalse(self.agent._isInherited(self.imported_call))
+    self.assertTrue(self.agent._isInherited(self.inherited_call))
+    self.assertFalse(self.agent._isInherited(self.targeted_call))
+
+  def testIsDeclaredLocally(self):
+    self.assertTrue(self.agent._isDeclaredLocally(self.local_call))
+    self.assertFalse(self.agent._isDeclaredLocally(self.inherited_call))
+
+  def testIsImportedStaticMethod(self):
+    self.assertTrue(self.agent._isImportedStaticMethod(self.imported_call))
+    self.assertFalse(self.agent._isImportedStaticMethod(self.local_call))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Helpers shared by the tests"""
+
+import parse_cache
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class FakeParser(object):
+  """Parser giving tree for any source, or {'source': source} without one
+
+  parsed lists the sources in the order they were parsed.
+  """
+
+  def __init__(self, tree=None):
+    self.tree = tree
+    self.parsed = []
+
+  def parse_string(self, source):
+    self.parsed.append(source)
+    if self.tree is None:
+      return {'source': source}
+    return self.tree
+
+
+class TempDirTestCase(unittest.TestCase):
+  """Test case with a scratch directory and no parse cache
+
+  self.path is FooTest.java in self.directory, it is not created.
+  """
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'FooTest.java')
+    parse_cache.SetDefaultCache(None)
+    parse_cache._java8_files.clear()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+    parse_cache._java8_files.clear()
+
+  def Write(self, source, name='FooTest.java'):
+    """Write source to name in self.directory and return its path"""
+    path = os.path.join(self.directory, name)
+    with open(path, 'w') as f:
+      f.write(source)
+    return path
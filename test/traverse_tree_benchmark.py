@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Time base_agent._TraverseTree on the largest *Test.java files
+
+Run from the repository root against a Chromium checkout:
+
+  PYTHONPATH=src python test/traverse_tree_benchmark.py -d "$CLANKIUM_SRC"
+
+To compare with an older revision, check it out somewhere and pass its
+src directory, e.g.
+
+  git worktree add /tmp/baseline <revision>
+  PYTHONPATH=src python test/traverse_tree_benchmark.py -d "$CLANKIUM_SRC" \\
+      --baseline /tmp/baseline/src
+"""
+
+import base_agent
+import parser
+
+import argparse
+import imp
+import os
+import sys
+import time
+
+
+def _LargestTestFiles(directory, count):
+  paths = []
+  for dirpath, _, filenames in os.walk(directory):
+    for filename in filenames:
+      if filename.endswith('Test.java'):
+        path = os.path.join(dirpath, filename)
+        paths.append((os.path.getsize(path), path))
+  paths.sort(reverse=True)
+  return [path for _, path in paths[:count]]
+
+
+def _BestTime(function, tree, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.time()
+    function(tree)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def main():
+  arg_parser = argparse.ArgumentParser()
+  arg_parser.add_argument('-d', '--directory', default='.',
+                          help='Directory searched for *Test.java files')
+  arg_parser.add_argument('-n', '--count', type=int, default=10,
+                          help='Number of files, largest first')
+  arg_parser.add_argument('-r', '--repeat', type=int, default=20,
+                          help='Runs per file, the fastest one is reported')
+  arg_parser.add_argument('--baseline',
+                          help='src directory of the revision to compare to')
+  arguments = arg_parser.parse_args()
+
+  baseline = None
+  if arguments.baseline:
+    baseline = imp.load_source(
+        'baseline_base_agent',
+        os.path.join(arguments.baseline, 'base_agent.py'))
+
+  java_parser = parser.Parser()
+  total, baseline_total = 0.0, 0.0
+  print '%8s %10s %12s  %s' % ('elements', 'ms', 'baseline ms', 'file')
+  for path in _LargestTestFiles(arguments.directory, arguments.count):
+    with open(path) as f:
+      tree = java_parser.parse_string(f.read())
+    if tree is None:
+      continue
+    elements = len(base_agent._TraverseTree(tree)[0])
+    elapsed = _BestTime(base_agent._TraverseTree, tree, arguments.repeat)
+    total += elapsed
+    baseline_column = ''
+    if baseline:
+      baseline_elapsed = _BestTime(
+          baseline._TraverseTree, tree, arguments.repeat)
+      baseline_total += baseline_elapsed
+      baseline_column = '%.2f' % (baseline_elapsed * 1000)
+    print '%8d %10.2f %12s  %s' % (
+        elements, elapsed * 1000, baseline_column,
+        os.path.relpath(path, arguments.directory))
+  print 'total %.2fms' % (total * 1000)
+  if baseline and total:
+    print 'baseline %.2fms, %.2fx' % (
+        baseline_total * 1000, baseline_total / total)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
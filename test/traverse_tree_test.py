@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import base_agent
+import model
+import parser
+
+import unittest
+
+
+def _Span(start, end):
+  return dict(lexpos=start, lexspan=(start, end))
+
+
+class TraverseTreeTest(unittest.TestCase):
+  def setUp(self):
+    # import a;
+    # class A {
+    #   void f(T x) { x++; }
+    #   class B {}
+    # }
+    # class C {}
+    self.name_a = model.Name('a', **_Span(7, 7))
+    self.import_a = model.ImportDeclaration(self.name_a, **_Span(0, 8))
+    self.name_t = model.Name('T', **_Span(27, 27))
+    self.type_t = model.Type(self.name_t, **_Span(27, 27))
+    self.variable = model.Variable('x', **_Span(29, 29))
+    # PLY puts a parameter without modifiers after its type.
+    self.parameter = model.FormalParameter(
+        self.variable, self.type_t, **_Span(29, 29))
+    self.name_x = model.Name('x', **_Span(35, 35))
+    self.increment = model.Unary('x++', self.name_x)
+    self.statement = model.ExpressionStatement(
+        self.increment, **_Span(35, 38))
+    self.method = model.MethodDeclaration(
+        'f', parameters=[self.parameter], body=[self.statement],
+        **_Span(20, 40))
+    self.class_b = model.ClassDeclaration('B', [], **_Span(50, 60))
+    self.class_a = model.ClassDeclaration(
+        'A', [self.method, self.class_b], modifiers=['public'],
+        **_Span(10, 100))
+    self.class_c = model.ClassDeclaration('C', [], **_Span(110, 120))
+    self.tree = model.CompilationUnit(
+        import_declarations=[self.import_a],
+        type_declarations=[self.class_a, self.class_c], **_Span(0, 120))
+
+  def testListIsOrdered(self):
+    element_list, element_table, main_list, main_table = (
+        base_agent._TraverseTree(self.tree))
+    self.assertEqual([id(e) for e in element_list], [id(e) for e in [
+        self.increment, self.tree, self.import_a, self.name_a, self.class_a,
+        self.method, self.type_t, self.name_t, self.parameter, self.variable,
+        self.statement, self.name_x, self.class_b, self.class_c]])
+    self.assertEqual([id(e) for e in element_table[model.Name]],
+                     [id(self.name_a), id(self.name_t), id(self.name_x)])
+    self.assertEqual(
+        [id(e) for e in element_table[model.ClassDeclaration]],
+        [id(self.class_a), id(self.class_b), id(self.class_c)])
+
+  def testMainPartition(self):
+    _, _, main_list, main_table = base_agent._TraverseTree(self.tree)
+    self.assertEqual([id(e) for e in main_list], [id(e) for e in [
+        self.class_a, self.method, self.type_t, self.name_t, self.parameter,
+        self.variable, self.statement, self.name_x, self.class_c]])
+    self.assertEqual([id(e) for e in main_table[model.ClassDeclaration]],
+                     [id(self.class_a), id(self.class_c)])
+    self.assertNotIn(model.ImportDeclaration, main_table)
+
+  def testSingleClassIsWholeFile(self):
+    self.class_a.body.remove(self.class_b)
+    self.tree.type_declarations.remove(self.class_c)
+    element_list, element_table, main_list, main_table = (
+        base_agent._TraverseTree(self.tree))
+    self.assertIs(main_list, element_list)
+    self.assertIs(main_table, element_table)
+
+  def testInterfacesAreListedAsClasses(self):
+    interface = model.InterfaceDeclaration('I', **_Span(130, 140))
+    self.tree.type_declarations.append(interface)
+    element_table = base_agent._TraverseTree(self.tree)[1]
+    self.assertEqual(
+        [id(e) for e in element_table[model.ClassDeclaration]],
+        [id(self.class_a), id(self.class_b), id(self.class_c), id(interface)])
+    self.assertEqual(element_table[model.InterfaceDeclaration], [interface])
+
+  def testNoTree(self):
+    self.assertEqual(base_agent._TraverseTree(None), ([], {}, [], {}))
+
+  def testEmptyStatementAndDeclaration(self):
+    # class A { void f(T x) { x++; ; } ; class B {} }
+    empty = model.Empty(**_Span(39, 39))
+    self.method.body.append(empty)
+    empty_declaration = model.EmptyDeclaration(**_Span(45, 45))
+    self.class_a.body.insert(1, empty_declaration)
+    element_table = base_agent._TraverseTree(self.tree)[1]
+    self.assertEqual(element_table[model.Empty], [empty])
+    self.assertEqual(element_table[model.EmptyDeclaration], [empty_declaration])
+
+  def testParsedStraySemicolons(self):
+    java_parser = parser.Parser()
+    for source, element_type in [
+        ('class A { void f() { ; } }', model.Empty),
+        ('class A { int x;; }', model.EmptyDeclaration)]:
+      tree = java_parser.parse_string(source)
+      element_table = base_agent._TraverseTree(tree)[1]
+      self.assertEqual(len(element_table[element_type]), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
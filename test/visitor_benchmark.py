@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Time model.DispatchVisitor against model.Visitor on the largest
+*Test.java files
+
+Both visitors count the MethodInvocations of a file. Run from the
+repository root against a Chromium checkout:
+
+  PYTHONPATH=src python test/visitor_benchmark.py -d "$CLANKIUM_SRC"
+"""
+
+import model
+import parser
+
+import argparse
+import os
+import sys
+import time
+
+
+def _LargestTestFiles(directory, count):
+  paths = []
+  for dirpath, _, filenames in os.walk(directory):
+    for filename in filenames:
+      if filename.endswith('Test.java'):
+        path = os.path.join(dirpath, filename)
+        paths.append((os.path.getsize(path), path))
+  paths.sort(reverse=True)
+  return [path for _, path in paths[:count]]
+
+
+class _Counter(object):
+  def __init__(self):
+    super(_Counter, self).__init__()
+    self.invocations = 0
+
+  def visit_MethodInvocation(self, invocation):
+    self.invocations += 1
+    return True
+
+
+class _RecursiveCounter(_Counter, model.Visitor):
+  pass
+
+
+class _DispatchCounter(_Counter, model.DispatchVisitor):
+  pass
+
+
+def _BestTime(visitor_class, tree, repeat):
+  best = None
+  for _ in range(repeat):
+    visitor = visitor_class()
+    start = time.time()
+    tree.accept(visitor)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def main():
+  arg_parser = argparse.ArgumentParser()
+  arg_parser.add_argument('-d', '--directory', default='.',
+                          help='Directory searched for *Test.java files')
+  arg_parser.add_argument('-n', '--count', type=int, default=10,
+                          help='Number of files, largest first')
+  arg_parser.add_argument('-r', '--repeat', type=int, default=20,
+                          help='Runs per file, the fastest one is reported')
+  arguments = arg_parser.parse_args()
+
+  java_parser = parser.Parser()
+  total, recursive_total = 0.0, 0.0
+  print '%10s %12s  %s' % ('ms', 'recursive ms', 'file')
+  for path in _LargestTestFiles(arguments.directory, arguments.count):
+    with open(path) as f:
+      tree = java_parser.parse_string(f.read())
+    if tree is None:
+      continue
+    elapsed = _BestTime(_DispatchCounter, tree, arguments.repeat)
+    recursive_elapsed = _BestTime(_RecursiveCounter, tree, arguments.repeat)
+    total += elapsed
+    recursive_total += recursive_elapsed
+    print '%10.2f %12.2f  %s' % (
+        elapsed * 1000, recursive_elapsed * 1000,
+        os.path.relpath(path, arguments.directory))
+  print 'total %.2fms' % (total * 1000)
+  if total:
+    print 'recursive %.2fms, %.2fx' % (
+        recursive_total * 1000, recursive_total / total)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
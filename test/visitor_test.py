@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import model
+
+import sys
+import unittest
+
+
+def _Tree():
+  call = model.MethodInvocation(
+      'assertTrue', arguments=[model.Name('a'), model.Literal('1')])
+  loop = model.While(model.Name('b'), body=model.Block(
+      [model.ExpressionStatement(call)]))
+  return model.CompilationUnit(type_declarations=[
+      model.ClassDeclaration('FooTest', [
+          model.MethodDeclaration('testFoo', body=[loop]),
+          model.FieldDeclaration('int', [model.VariableDeclarator(
+              model.Variable('c'))])])])
+
+
+class Recorder(object):
+  def __init__(self):
+    super(Recorder, self).__init__()
+    self.events = []
+
+  def visit_Name(self, name):
+    self.events.append('visit ' + name.value)
+    return True
+
+  def leave_Name(self, name):
+    self.events.append('leave ' + name.value)
+
+  def visit_MethodInvocation(self, invocation):
+    self.events.append('visit ' + invocation.name)
+    return True
+
+  def leave_MethodInvocation(self, invocation):
+    self.events.append('leave ' + invocation.name)
+
+  def visit_While(self, loop):
+    self.events.append('visit while')
+    return True
+
+  def visit_FieldDeclaration(self, field):
+    self.events.append('skip field')
+    return False
+
+  def leave_FieldDeclaration(self, field):
+    self.events.append('leave field')
+
+  def visit_Variable(self, variable):
+    self.events.append('visit ' + variable.name)
+    return True
+
+
+class RecursiveRecorder(Recorder, model.Visitor):
+  pass
+
+
+class DispatchRecorder(Recorder, model.DispatchVisitor):
+  pass
+
+
+class DispatchVisitorTest(unittest.TestCase):
+  def testSameOrderAsAccept(self):
+    expected = RecursiveRecorder()
+    _Tree().accept(expected)
+    self.assertEqual(expected.events, [
+        'visit while', 'visit b', 'leave b', 'visit assertTrue', 'visit a',
+        'leave a', 'leave assertTrue', 'skip field', 'leave field'])
+    visitor = DispatchRecorder()
+    visitor.walk(_Tree())
+    self.assertEqual(visitor.events, expected.events)
+    visitor = DispatchRecorder()
+    _Tree().accept(visitor)
+    self.assertEqual(visitor.events, expected.events)
+
+  def testTableIsBuiltOncePerClass(self):
+    DispatchRecorder().walk(_Tree())
+    table = model._DISPATCH_TABLES[DispatchRecorder]
+    DispatchRecorder().walk(_Tree())
+    self.assertIs(model._DISPATCH_TABLES[DispatchRecorder], table)
+    self.assertEqual(table[model.Name], (DispatchRecorder.visit_Name.im_func,
+                                         DispatchRecorder.leave_Name.im_func))
+    self.assertEqual(table[model.Block], (None, None))
+
+  def testDeepChain(self):
+    expression = model.Name('x')
+    depth = sys.getrecursionlimit() + 100
+    for _ in range(depth):
+      expression = model.Additive('+', expression, model.Literal('1'))
+    visitor = DispatchRecorder()
+    visitor.walk(expression)
+    self.assertEqual(visitor.events, ['visit x', 'leave x'])
+
+
+if __name__ == '__main__':
+  unittest.main()